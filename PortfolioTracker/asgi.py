@@ -9,8 +9,25 @@ https://docs.djangoproject.com/en/4.0/howto/deployment/asgi/
 
 import os
 
-from django.core.asgi import get_asgi_application
+import django
+
+from PortfolioTracker.asgi_handler import StreamingASGIHandler
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'PortfolioTracker.settings')
 
-application = get_asgi_application()
+# As `get_asgi_application()`, with parts of streaming responses taken off the event loop
+django.setup(set_prefix=False)
+django_application = StreamingASGIHandler()
+
+# Imported after Django is set up, as it uses models
+from report_generator.live_updates import LIVE_UPDATES_PATH, stream_live_updates  # noqa: E402
+
+
+async def application(scope, receive, send):
+    """Routes the live updates stream to its own application, as it is long-lived,
+    and all other requests to Django.
+    """
+    if scope['type'] == 'http' and scope['path'] == LIVE_UPDATES_PATH:
+        await stream_live_updates(scope, receive, send)
+    else:
+        await django_application(scope, receive, send)
@@ -0,0 +1,51 @@
+"""ASGI handler of Django requests, taking parts of streaming responses off the event loop."""
+
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIHandler
+
+# Returned by `next` when a streaming response has no more parts
+_DONE = object()
+
+
+class StreamingASGIHandler(ASGIHandler):
+    """Django 4.0 iterates streaming responses in the event loop, so rendering their parts
+    stalls every other connection, and parts cannot read DB.
+    This handler takes each part on the thread of the request instead, the same thread
+    that ran the view and holds its DB connection.
+    """
+
+    async def send_response(self, response, send):
+        """Encode and send a response out over ASGI."""
+        if not response.streaming:
+            await super().send_response(response, send)
+            return
+
+        # Headers and cookies as in `ASGIHandler.send_response`
+        response_headers = []
+        for header, value in response.items():
+            if isinstance(header, str):
+                header = header.encode('ascii')
+            if isinstance(value, str):
+                value = value.encode('latin1')
+            response_headers.append((bytes(header), bytes(value)))
+        for cookie in response.cookies.values():
+            response_headers.append(
+                (b'Set-Cookie', cookie.output(header='').encode('ascii').strip())
+            )
+        await send({
+            'type': 'http.response.start',
+            'status': response.status_code,
+            'headers': response_headers,
+        })
+
+        parts = iter(response)
+        take_part = sync_to_async(next, thread_sensitive=True)
+        try:
+            part = await take_part(parts, _DONE)
+            while part is not _DONE:
+                for chunk, _ in self.chunk_bytes(part):
+                    await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+                part = await take_part(parts, _DONE)
+            await send({'type': 'http.response.body'})
+        finally:
+            await sync_to_async(response.close, thread_sensitive=True)()
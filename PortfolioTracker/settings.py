@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/4.0/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -84,6 +85,8 @@ WSGI_APPLICATION = 'PortfolioTracker.wsgi.application'
 
 # CORS
 CORS_ORIGIN_ALLOW_ALL = True
+# Pagination of live portfolio data
+CORS_EXPOSE_HEADERS = ['X-Total-Count', 'ETag', 'Last-Modified']
 # CORS_ALLOW_CREDENTIALS = True
 # CORS_ALLOWED_ORIGINS = [
 #     'http://localhost:8000',
@@ -105,6 +108,62 @@ DATABASES = {
     }
 }
 
+# PRAGMAs applied to every new sqlite3 connection, see `api/db_profile.py`
+# Select with environment variable `DB_PROFILE`, `default` keeps sqlite3 defaults
+DB_PROFILE = os.environ.get('DB_PROFILE', 'performance')
+DB_PROFILES = {
+    'default': {},
+    'performance': {
+        'journal_mode': 'WAL',  # Readers do not block the writer and vice versa
+        'synchronous': 'NORMAL',  # Safe with WAL, no fsync on every commit
+        'cache_size': -64000,  # 64MB of page cache
+        'mmap_size': 268435456,  # 256MB of memory-mapped I/O
+        'temp_store': 'MEMORY',
+        'busy_timeout': 5000,  # Milliseconds to wait for a lock
+    },
+}
+
+
+# Number of events between checkpoints of the portfolio
+# Reports are generated by replaying at most this number of events from a checkpoint
+CHECKPOINT_INTERVAL = 500
+
+# Memory limit of report snapshots and rendered reports cached by the report generator
+REPORT_CACHE_MAX_BYTES = 64 * 1024 * 1024
+
+# Number of threads rendering reports from a snapshot in parallel when outputting all reports
+REPORT_WORKERS = 4
+# Maximum number of event IDs of one export of reports
+EXPORT_MAX_TARGETS = 1000
+
+# Memory limit of responses of live portfolio endpoints, cached until the next event is committed
+LIVE_RESPONSE_CACHE_MAX_BYTES = 16 * 1024 * 1024
+
+# Maximum number of events received ahead of a missing event, held until it arrives
+REORDER_BUFFER_CAPACITY = 10000
+# Seconds an event waits for missing events before `REORDER_GAP_POLICY` applies
+REORDER_GAP_TIMEOUT = 60
+# What to do when events are missing for `REORDER_GAP_TIMEOUT`, or the buffer is full
+# `wait` keeps waiting and rejects new events while full, `alert` also logs a warning
+# and sends signal `event_gap`, `skip` gives up on the missing events
+REORDER_GAP_POLICY = os.environ.get('REORDER_GAP_POLICY', 'wait')
+
+# How `api/events/` applies events, select with environment variable `EVENT_INGESTION_MODE`
+# `sync` applies each event before responding
+# `async` validates and queues each event, applied in order by a background thread
+EVENT_INGESTION_MODE = os.environ.get('EVENT_INGESTION_MODE', 'sync')
+# Maximum number of queued events in `async` mode, further events are rejected with 503
+INGESTION_QUEUE_SIZE = 10000
+# Maximum number of queued events applied in one transaction
+INGESTION_BATCH_SIZE = 500
+# Seconds producers are asked to wait before retrying when the queue is full
+INGESTION_RETRY_AFTER = 1
+# Times a batch failing as a whole, e.g. while DB is locked, is retried before its events are
+# applied one by one, each also retried before it is dropped
+INGESTION_RETRIES = 3
+# Seconds before the first retry, doubled for each further retry
+INGESTION_RETRY_BACKOFF = 0.1
+
 
 # Password validation
 # https://docs.djangoproject.com/en/4.0/ref/settings/#auth-password-validators
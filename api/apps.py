@@ -1,6 +1,9 @@
 from django.apps import AppConfig
+from django.db.backends.signals import connection_created
 from django.db.models.signals import post_migrate
 
+from .db_profile import apply_db_profile
+
 def callback(sender, **kwargs):
     # Need local imports to wait for django apps to finish loading
     from api.populate_db import populate
@@ -15,3 +18,6 @@ class ApiConfig(AppConfig):
         # Runs when migration is done
         post_migrate.connect(callback, dispatch_uid="app_start")
 
+        # Runs on every new DB connection
+        connection_created.connect(apply_db_profile, dispatch_uid="db_profile")
+
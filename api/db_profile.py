@@ -0,0 +1,16 @@
+"""Module to apply the DB performance profile to new connections."""
+
+from django.conf import settings
+from django.db.backends.base.base import BaseDatabaseWrapper
+
+
+def apply_db_profile(sender, connection: BaseDatabaseWrapper, **kwargs) -> None:
+    """Apply PRAGMAs of profile `settings.DB_PROFILE` to a new sqlite3 connection.
+    Receiver of signal `connection_created`, see `api/apps.py`.
+    """
+    if connection.vendor != 'sqlite':
+        return
+    pragmas = settings.DB_PROFILES[settings.DB_PROFILE]
+    with connection.cursor() as cursor:
+        for name, value in pragmas.items():
+            cursor.execute(f'PRAGMA {name} = {value}')
@@ -0,0 +1,25 @@
+# Generated by Django 4.0.6 on 2026-10-18 04:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0002_eventsequence'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='fxeventlog',
+            index=models.Index(fields=['currency', '-event_id'], name='fx_event_log_currency_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='priceeventlog',
+            index=models.Index(fields=['bond', '-event_id'], name='price_event_log_bond_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='bondrecord',
+            constraint=models.UniqueConstraint(fields=('trader', 'book', 'bond'), name='unique_bond_record'),
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 4.0.6 on 2026-10-18 04:05
+
+import django.core.serializers.json
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0003_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StateCheckpoint',
+            fields=[
+                ('event_id', models.PositiveIntegerField(primary_key=True, serialize=False)),
+                ('positions', models.JSONField(encoder=django.core.serializers.json.DjangoJSONEncoder)),
+                ('cash', models.JSONField(encoder=django.core.serializers.json.DjangoJSONEncoder)),
+                ('fx', models.JSONField(encoder=django.core.serializers.json.DjangoJSONEncoder)),
+                ('prices', models.JSONField(encoder=django.core.serializers.json.DjangoJSONEncoder)),
+            ],
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 4.0.6 on 2026-10-18 04:25
+
+import django.core.serializers.json
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0004_statecheckpoint'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PendingEvent',
+            fields=[
+                ('event_id', models.PositiveIntegerField(primary_key=True, serialize=False)),
+                ('event', models.JSONField(encoder=django.core.serializers.json.DjangoJSONEncoder)),
+                ('received_at', models.DateTimeField()),
+            ],
+        ),
+    ]
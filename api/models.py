@@ -1,7 +1,9 @@
 """Module specifying the models of the application."""
 
+from datetime import datetime
 from decimal import Decimal
 
+from django.core.serializers.json import DjangoJSONEncoder
 from django.db import models
 
 
@@ -76,10 +78,41 @@ class BondRecord(models.Model):
 
     class Meta:
         ordering = ['trader', 'book', 'bond']
+        constraints = [
+            # Lookup of a position when selling
+            models.UniqueConstraint(
+                fields=['trader', 'book', 'bond'], name='unique_bond_record'
+            ),
+        ]
 
     def __str__(self):
         return f'by:[{self.trader}] bond:[{self.bond}] at:[{self.position}]'
 
+class EventSequence(models.Model):
+    """Schema for table `event_sequence`.
+    Single row storing the ID of the latest applied event.
+    """
+    SEQUENCE_ID: int = 1
+
+    id: int = models.PositiveSmallIntegerField(primary_key=True, default=SEQUENCE_ID)
+    last_event_id: int = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f'Last applied event {self.last_event_id}'
+
+class PendingEvent(models.Model):
+    """Schema for table `pending_event`
+    that holds events received out of order, until the events before them are applied.
+    """
+
+    event_id: int = models.PositiveIntegerField(primary_key=True)
+    # Event as received, decimals are stored as strings
+    event: dict = models.JSONField(encoder=DjangoJSONEncoder)
+    received_at: datetime = models.DateTimeField()
+
+    def __str__(self):
+        return f'Pending {self.event_id}'
+
 class EventLog(models.Model):
     """Schema for table `event_log`
     that records changes after a trade event
@@ -117,6 +150,12 @@ class FxEventLog(models.Model):
     currency: str = models.ForeignKey(FX, on_delete=models.CASCADE)
     rate: Decimal = models.DecimalField(max_digits=19, decimal_places=5)
 
+    class Meta:
+        indexes = [
+            # Lookup of latest rate of a currency at an event
+            models.Index(fields=['currency', '-event_id'], name='fx_event_log_currency_idx'),
+        ]
+
     def __str__(self):
         return f'FX {self.event_id} {self.currency} {self.rate}'
 
@@ -129,9 +168,34 @@ class PriceEventLog(models.Model):
     bond: str = models.ForeignKey(Bond, on_delete=models.CASCADE)
     price: Decimal = models.DecimalField(max_digits=19, decimal_places=5)
 
+    class Meta:
+        indexes = [
+            # Lookup of latest price of a bond at an event
+            models.Index(fields=['bond', '-event_id'], name='price_event_log_bond_idx'),
+        ]
+
     def __str__(self):
         return f'Price {self.event_id} {self.bond} {self.price}'
 
+class StateCheckpoint(models.Model):
+    """Schema for table `state_checkpoint`
+    that records the portfolio right after an event, every `settings.CHECKPOINT_INTERVAL` events.
+    Decimals are stored as strings.
+    """
+
+    event_id: int = models.PositiveIntegerField(primary_key=True)
+    # List of [desk_id, trader_id, book_id, bond_id, position]
+    positions: list = models.JSONField(encoder=DjangoJSONEncoder)
+    # Maps desk_id to cash
+    cash: dict = models.JSONField(encoder=DjangoJSONEncoder)
+    # Maps currency_id to rate
+    fx: dict = models.JSONField(encoder=DjangoJSONEncoder)
+    # Maps bond_id to price, null if bond does not have a price
+    prices: dict = models.JSONField(encoder=DjangoJSONEncoder)
+
+    def __str__(self):
+        return f'Checkpoint {self.event_id}'
+
 class EventExceptionLog(models.Model):
     """Schema for table `event_exception_log`
     that records exceptions raised during a trade event
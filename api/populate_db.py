@@ -9,12 +9,12 @@ from .models import Bond, Desk, FX
 # directory containing csv files
 DATA_DIR = Path(__file__).absolute().parent.parent / 'data'
 
-def _read_csv(csv_filename: str) -> Union[List[List[str]], str]:
+def _read_csv(csv_filename: str, data_dir: Path = DATA_DIR) -> Union[List[List[str]], str]:
     """Helper function to read csv file and
     return a list containing each row as nested list.
     Headers are ignored.
     """
-    filepath = DATA_DIR / csv_filename
+    filepath = data_dir / csv_filename
     try:
         with open(filepath, 'r', encoding='UTF-8') as file:
             reader = csv.reader(file, skipinitialspace=True)
@@ -22,26 +22,26 @@ def _read_csv(csv_filename: str) -> Union[List[List[str]], str]:
     except FileNotFoundError:
         return f'File {filepath} not found.'
 
-def _add_fx(filename: str = 'initial_fx.csv'):
-    data: List[List[str]] = _read_csv(filename)
+def _add_fx(filename: str = 'initial_fx.csv', data_dir: Path = DATA_DIR):
+    data: List[List[str]] = _read_csv(filename, data_dir)
     for row in data:
         FX.objects.get_or_create(currency_id=row[0], rate=row[1], initial=row[1])
 
-def _add_bonds(filename: str = 'bond_details.csv'):
-    data: List[List[str]] = _read_csv(filename)
+def _add_bonds(filename: str = 'bond_details.csv', data_dir: Path = DATA_DIR):
+    data: List[List[str]] = _read_csv(filename, data_dir)
     for row in data:
         Bond.objects.get_or_create(
             bond_id=row[0], currency=FX.objects.get(currency_id=row[1])
         )
 
-def _add_desks(filename: str = 'initial_cash.csv'):
-    data: List[List[str]] = _read_csv(filename)
+def _add_desks(filename: str = 'initial_cash.csv', data_dir: Path = DATA_DIR):
+    data: List[List[str]] = _read_csv(filename, data_dir)
     for row in data:
         Desk.objects.get_or_create(desk_id=row[0], cash=row[1])
 
 
-def populate():
-    """Populate database with initial data."""
-    _add_fx()
-    _add_bonds()
-    _add_desks()
+def populate(data_dir: Path = DATA_DIR):
+    """Populate database with initial data from csv files in `data_dir`."""
+    _add_fx(data_dir=data_dir)
+    _add_bonds(data_dir=data_dir)
+    _add_desks(data_dir=data_dir)
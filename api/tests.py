@@ -1,6 +1,22 @@
-from django.test import TestCase
+from decimal import Decimal
+import json
+from unittest import mock, skipUnless
 
+from django.conf import settings
+from django.db import OperationalError, connection
+from django.db.models import QuerySet
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from api.models import (
+    Bond, BondRecord, EventExceptionLog, EventSequence, FxEventLog, PendingEvent,
+    PriceEventLog,
+)
 from api.populate_db import _read_csv
+from event_handler.event_handlers import EventHandler
+from event_handler.event_sequencer import EventSequencer
+from event_handler.ingestion import IngestionQueue
+from event_handler.portfolio_state import PortfolioState
 
 class ReadCSVTestCase(TestCase):
     def test_read_csv(self):
@@ -42,3 +58,272 @@ class ReadCSVTestCase(TestCase):
         self.assertEqual(data[1][1], '100000000')
         self.assertEqual(data[-1][0], 'SYD')
         self.assertEqual(data[-1][1], '100000000')
+
+class ProcessEventsTestCase(TestCase):
+    """Uses initial data auto-populated from `data/`."""
+    def setUp(self) -> None:
+        EventSequencer().recover()
+        PortfolioState().load()
+        EventHandler._queue.clear()
+
+    def test_process_events_json_array(self):
+        events = [
+            {'EventID': 1, 'EventType': 'PriceEvent', 'BondID': 'B45193', 'MarketPrice': 1996.52},
+            {
+                'EventID': 3, 'EventType': 'TradeEvent', 'Desk': 'NY', 'Trader': 'T2078717',
+                'Book': 'NY02', 'BuySell': 'sell', 'Quantity': 33, 'BondID': 'B45193',
+            },
+            {
+                'EventID': 2, 'EventType': 'TradeEvent', 'Desk': 'NY', 'Trader': 'T2078717',
+                'Book': 'NY02', 'BuySell': 'buy', 'Quantity': 533, 'BondID': 'B45193',
+            },
+            {'EventID': 5, 'EventType': 'FXEvent', 'ccy': 'AUZ', 'rate': 1.5},
+            {'EventID': 1, 'EventType': 'FXEvent', 'ccy': 'AUZ', 'rate': 1.5},
+        ]
+        response = self.client.post(
+            reverse('api_process_events'), data=json.dumps(events), content_type='application/json'
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertListEqual(response.json(), [
+            {'event_id': 1, 'status': 'applied'},
+            {'event_id': 3, 'status': 'applied'},
+            {'event_id': 2, 'status': 'applied'},
+            {'event_id': 5, 'status': 'queued'},
+            {'event_id': 1, 'status': 'duplicate'},
+        ])
+        self.assertEqual(Bond.objects.get(bond_id='B45193').price, Decimal('1996.52'))
+        self.assertEqual(
+            BondRecord.objects.get(trader='T2078717', book='NY02', bond='B45193').position, 500
+        )
+        self.assertEqual(EventSequence.objects.get().last_event_id, 3)
+
+    def test_process_events_ndjson(self):
+        events = [
+            {
+                'EventID': 1, 'EventType': 'TradeEvent', 'Desk': 'NY', 'Trader': 'T2078717',
+                'Book': 'NY02', 'BuySell': 'buy', 'Quantity': 533, 'BondID': 'B45193',
+            },
+            {'EventID': 2, 'EventType': 'FXEvent', 'ccy': 'AUZ', 'rate': -1},
+        ]
+        response = self.client.post(
+            reverse('api_process_events'),
+            data='\n'.join(json.dumps(event) for event in events),
+            content_type='application/x-ndjson',
+        )
+        self.assertEqual(response.status_code, 200)
+        outcomes = response.json()
+        self.assertDictEqual(outcomes[0], {
+            'event_id': 1, 'status': 'excluded', 'exclusion_type': 'NO_MARKET_PRICE',
+        })
+        self.assertEqual(outcomes[1]['status'], 'error')
+        self.assertEqual(EventExceptionLog.objects.get().event_id, 1)
+        self.assertEqual(EventSequence.objects.get().last_event_id, 1)
+
+    @override_settings(REORDER_BUFFER_CAPACITY=1)
+    def test_process_event_rejected_when_buffer_full(self):
+        responses = [
+            self.client.post(
+                reverse('api_process_event'),
+                data={'EventID': event_id, 'EventType': 'FXEvent', 'ccy': 'AUZ', 'rate': '1.5'},
+            )
+            for event_id in (3, 4)
+        ]
+        self.assertEqual(responses[0].status_code, 204)
+        self.assertEqual(responses[1].status_code, 503)
+        self.assertIn('Retry-After', responses[1])
+        self.assertListEqual(list(PendingEvent.objects.values_list('event_id', flat=True)), [3])
+
+    def test_process_events_rejects_invalid_events(self):
+        response = self.client.post(
+            reverse('api_process_events'),
+            data=json.dumps([{'EventID': 1, 'EventType': 'PriceEvent'}]),
+            content_type='application/json',
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.client.get(reverse('api_process_events')).status_code, 405)
+
+@override_settings(EVENT_INGESTION_MODE='async', INGESTION_QUEUE_SIZE=2, INGESTION_BATCH_SIZE=2)
+@mock.patch.object(IngestionQueue, 'start')
+class IngestionTestCase(TestCase):
+    """Uses initial data auto-populated from `data/`.
+    Queued events are applied in the test thread instead of the applier thread.
+    """
+    def setUp(self) -> None:
+        EventSequencer().recover()
+        PortfolioState().load()
+        EventHandler._queue.clear()
+        IngestionQueue().reset()
+
+    def tearDown(self) -> None:
+        IngestionQueue().reset()
+
+    def test_events_are_queued_and_applied_in_order(self, start):
+        fx_event = {'EventID': 2, 'EventType': 'FXEvent', 'ccy': 'AUZ', 'rate': '1.5'}
+        price_event = {
+            'EventID': 1, 'EventType': 'PriceEvent', 'BondID': 'B45193', 'MarketPrice': '1996.52',
+        }
+        for event in (fx_event, price_event):
+            response = self.client.post(reverse('api_process_event'), data=event)
+            self.assertEqual(response.status_code, 202)
+        start.assert_called()
+        self.assertFalse(EventSequence.objects.exists())
+
+        metrics = self.client.get(reverse('api_ingestion_metrics')).json()
+        self.assertEqual(metrics['depth'], 2)
+        self.assertEqual(metrics['received'], 2)
+        self.assertEqual(metrics['lag_events'], 2)
+        self.assertGreaterEqual(metrics['lag_seconds'], 0)
+
+        IngestionQueue().apply_pending()
+        self.assertEqual(EventSequence.objects.get().last_event_id, 2)
+        self.assertEqual(Bond.objects.get(bond_id='B45193').price, Decimal('1996.52'))
+        metrics = self.client.get(reverse('api_ingestion_metrics')).json()
+        self.assertEqual(metrics['depth'], 0)
+        self.assertEqual(metrics['lag_events'], 0)
+        self.assertEqual(metrics['lag_seconds'], 0)
+        self.assertDictEqual(metrics['outcomes'], {'applied': 2})
+
+    def test_full_queue_is_rejected(self, start):
+        for event_id in range(1, 4):
+            response = self.client.post(
+                reverse('api_process_event'),
+                data={'EventID': event_id, 'EventType': 'FXEvent', 'ccy': 'AUZ', 'rate': '1.5'},
+            )
+        self.assertEqual(response.status_code, 503)
+        self.assertIn('Retry-After', response)
+        metrics = self.client.get(reverse('api_ingestion_metrics')).json()
+        self.assertEqual(metrics['depth'], 2)
+        self.assertEqual(metrics['rejected'], 1)
+
+    def _post_fx_events(self, event_ids):
+        for event_id in event_ids:
+            response = self.client.post(
+                reverse('api_process_event'),
+                data={'EventID': event_id, 'EventType': 'FXEvent', 'ccy': 'AUZ', 'rate': '1.5'},
+            )
+            self.assertEqual(response.status_code, 202)
+
+    def _fail_handle_events(self, should_fail):
+        """Patch `EventHandler.handle_events` to raise while `should_fail(events)`."""
+        handle_events = EventHandler.handle_events
+        calls = []
+
+        def side_effect(handler, events):
+            calls.append([int(event['EventID']) for event in events])
+            if should_fail(calls[-1]):
+                raise OperationalError('database is locked')
+            return handle_events(handler, events)
+
+        patcher = mock.patch.object(
+            EventHandler, 'handle_events', autospec=True, side_effect=side_effect
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        return calls
+
+    @override_settings(INGESTION_RETRY_BACKOFF=0)
+    def test_failed_batch_is_retried(self, start):
+        self._post_fx_events([2, 1])
+        calls = self._fail_handle_events(lambda event_ids: len(calls) == 1)
+        with self.assertLogs('event_handler.ingestion', level='WARNING'):
+            IngestionQueue().apply_pending()
+        self.assertListEqual(calls, [[2, 1], [2, 1]])
+        self.assertEqual(EventSequence.objects.get().last_event_id, 2)
+        self.assertDictEqual(IngestionQueue().get_metrics()['outcomes'], {'applied': 2})
+
+    @override_settings(INGESTION_RETRY_BACKOFF=0, INGESTION_RETRIES=1)
+    def test_event_failing_alone_is_dropped(self, start):
+        self._post_fx_events([1, 2])
+        calls = self._fail_handle_events(lambda event_ids: 2 in event_ids)
+        with self.assertLogs('event_handler.ingestion', level='ERROR') as logs:
+            IngestionQueue().apply_pending()
+        self.assertListEqual(calls, [[1, 2], [1, 2], [1], [2], [2]])
+        self.assertIn('Dropping event', logs.output[-1])
+        self.assertEqual(EventSequence.objects.get().last_event_id, 1)
+        metrics = IngestionQueue().get_metrics()
+        self.assertDictEqual(metrics['outcomes'], {'applied': 1, 'error': 1})
+        self.assertIn('database is locked', metrics['last_error'])
+
+    @override_settings(REORDER_BUFFER_CAPACITY=1)
+    def test_events_rejected_by_full_buffer_are_held(self, start):
+        self._post_fx_events([3, 4])
+        IngestionQueue().apply_pending()
+        self.assertEqual(IngestionQueue().get_metrics()['held'], 1)
+
+        # Held events count against the capacity of the queue
+        self._post_fx_events([1])
+        response = self.client.post(
+            reverse('api_process_event'),
+            data={'EventID': 2, 'EventType': 'FXEvent', 'ccy': 'AUZ', 'rate': '1.5'},
+        )
+        self.assertEqual(response.status_code, 503)
+        IngestionQueue().apply_pending()
+        self.assertEqual(EventSequence.objects.get().last_event_id, 1)
+
+        # Held event is applied once the buffer drains
+        self._post_fx_events([2])
+        IngestionQueue().apply_pending()
+        self.assertEqual(EventSequence.objects.get().last_event_id, 4)
+        metrics = IngestionQueue().get_metrics()
+        self.assertEqual(metrics['held'], 0)
+        self.assertNotIn('rejected', metrics['outcomes'])
+        self.assertEqual(metrics['outcomes']['applied'], 3)
+
+    def test_invalid_event_is_rejected(self, start):
+        response = self.client.post(
+            reverse('api_process_event'), data={'EventID': 1, 'EventType': 'PriceEvent'}
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(IngestionQueue().get_metrics()['received'], 0)
+
+class DBProfileTestCase(TestCase):
+    @skipUnless(settings.DB_PROFILE == 'performance', 'Requires DB profile `performance`')
+    def test_db_profile_is_applied_to_connection(self):
+        # Test connection is created with the profile already applied
+        pragmas = settings.DB_PROFILES['performance']
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA journal_mode')
+            self.assertEqual(cursor.fetchone()[0], 'wal')
+            cursor.execute('PRAGMA busy_timeout')
+            self.assertEqual(cursor.fetchone()[0], pragmas['busy_timeout'])
+            cursor.execute('PRAGMA cache_size')
+            self.assertEqual(cursor.fetchone()[0], pragmas['cache_size'])
+
+class QueryPlanTestCase(TestCase):
+    """Lookups used when handling events and generating reports should seek an index,
+    instead of scanning and sorting the table.
+    """
+    def assertUsesIndex(self, queryset: QuerySet, table: str, constraint: str) -> None:
+        plan = queryset.explain()
+        self.assertRegex(plan, rf'SEARCH {table} USING (COVERING )?INDEX \w+ \({constraint}\)')
+        self.assertNotIn('TEMP B-TREE', plan)
+
+    def test_latest_fx_rate_lookup_uses_index(self):
+        self.assertUsesIndex(
+            FxEventLog.objects
+            .filter(currency__currency_id='SGX')
+            .filter(event_id__lte=100)
+            .order_by('-event_id')[:1],
+            'api_fxeventlog',
+            r'currency_id=\? AND event_id<\?',
+        )
+
+    def test_latest_price_lookup_uses_index(self):
+        self.assertUsesIndex(
+            PriceEventLog.objects
+            .filter(bond__bond_id='B45193')
+            .filter(event_id__lte=100)
+            .order_by('-event_id')[:1],
+            'api_priceeventlog',
+            r'bond_id=\? AND event_id<\?',
+        )
+
+    def test_bond_record_lookup_uses_index(self):
+        self.assertUsesIndex(
+            BondRecord.objects
+            .filter(trader='T2078717', book='NY02', bond='B45193')
+            .order_by()
+            .values_list('position'),
+            'api_bondrecord',
+            r'trader_id=\? AND book_id=\? AND bond_id=\?',
+        )
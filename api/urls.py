@@ -10,9 +10,18 @@ urlpatterns = [
     # Endpoint to receive new events from POST request
     path('events/', api_views.process_event, name='api_process_event'),
 
+    # Endpoint to receive a batch of events as JSON array or NDJSON from POST request
+    path('events/batch/', api_views.process_events, name='api_process_events'),
+
+    # Endpoint to monitor the queue of received events not yet applied
+    path('ingestion_metrics', api_views.get_ingestion_metrics, name='api_ingestion_metrics'),
+
     # Endpoint to generate and output reports to local folder
     path('output_reports', report_views.output_reports, name='api_output_reports'),
 
+    # Endpoint to generate and output reports at many events to local folder
+    path('export_reports', report_views.export_reports, name='api_export_reports'),
+
     # Routes for retrieving newest data for live portfolio dashboard
     path(
         'get_cash_portfolio',
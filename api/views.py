@@ -1,9 +1,17 @@
-from django.http import HttpRequest, HttpResponse, JsonResponse
+from decimal import Decimal
+import json
+from typing import List
+
+from django.conf import settings
+from django.http import HttpRequest, HttpResponse, HttpResponseBadRequest, JsonResponse
 from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_POST
 
 from event_generator.event_generator import EventGenerator
 from event_handler.event_handlers import EventHandler
+from event_handler.ingestion import IngestionQueue
 from util.common_types import Event
+from util import common_fns
 
 def index(request: 'HttpRequest') -> 'HttpResponse':
     return JsonResponse({'message': 'Hello, World!'})
@@ -11,9 +19,66 @@ def index(request: 'HttpRequest') -> 'HttpResponse':
 @csrf_exempt
 def process_event(req: HttpRequest) -> HttpResponse:
     # print(req.body)
-    if req.POST:
+    if not req.POST:
+        return HttpResponse(status=400)
+    if settings.EVENT_INGESTION_MODE != 'async':
         event: Event = req.POST
-        EventHandler().handle_event(event)
+        outcomes = EventHandler().handle_event(event)
+        if outcomes[0]['status'] == 'rejected':
+            # Reorder buffer is full, producer should send the missing events first
+            response = HttpResponse(
+                'Reorder buffer is full', status=503, content_type='text/plain'
+            )
+            response['Retry-After'] = str(settings.INGESTION_RETRY_AFTER)
+            return response
         return HttpResponse(status=204)
+
+    # Validate now, as errors cannot be reported once the event is queued
+    event: Event = req.POST.dict()
+    try:
+        common_fns.validate_event(event)
+    except ValueError as e:
+        return HttpResponseBadRequest(str(e), content_type='text/plain')
+    ingestion_queue = IngestionQueue()
+    ingestion_queue.start()
+    if not ingestion_queue.submit(event):
+        # Producers should back off until the applier catches up
+        response = HttpResponse('Event queue is full', status=503, content_type='text/plain')
+        response['Retry-After'] = str(settings.INGESTION_RETRY_AFTER)
+        return response
+    return HttpResponse(status=202)
+
+def _parse_events(body: bytes) -> List[Event]:
+    """Helper function to parse a JSON array or NDJSON (one event per line) of events.
+    Numbers with decimals are parsed as Decimal to keep their exact values.
+    Raises ValueError if the body or any event is invalid.
+    """
+    text = body.decode('UTF-8')
+    if text.lstrip().startswith('['):
+        events = json.loads(text, parse_float=Decimal)
+        if not isinstance(events, list):
+            raise ValueError('Expected a JSON array of events')
     else:
-        return HttpResponse(status=400)
\ No newline at end of file
+        events = [
+            json.loads(line, parse_float=Decimal)
+            for line in text.splitlines() if line.strip()
+        ]
+    for event in events:
+        common_fns.validate_event(event)
+    return events
+
+@csrf_exempt
+@require_POST
+def process_events(req: HttpRequest) -> HttpResponse:
+    """Process a batch of events sent as a JSON array or NDJSON,
+    and respond with the outcome of each event.
+    """
+    try:
+        events: List[Event] = _parse_events(req.body)
+    except (UnicodeDecodeError, ValueError) as e:
+        return HttpResponseBadRequest(str(e), content_type='text/plain')
+    return JsonResponse(EventHandler().handle_events(events), safe=False)
+
+def get_ingestion_metrics(req: HttpRequest) -> HttpResponse:
+    """Get depth and lag of the queue of events received in `async` mode."""
+    return JsonResponse(IngestionQueue().get_metrics())
@@ -0,0 +1,5 @@
+"""Benchmarks of the portfolio engine, run against temporary sqlite3 databases.
+
+Run a benchmark with, for example:
+    $ python3 -m benchmarks.db_profile
+"""
@@ -0,0 +1,72 @@
+"""Helpers to set up Django and a fresh database for benchmarks."""
+
+from itertools import islice
+import os
+from pathlib import Path
+import tempfile
+import time
+from typing import Callable, List
+
+import django
+from django.conf import settings
+
+from event_generator.event_reader import read_events as read_event_file
+
+DATA_DIR = Path(__file__).absolute().parent.parent / 'data'
+
+# Temporary directory holding benchmark databases, removed on exit
+_TMP_DIR = tempfile.TemporaryDirectory(prefix='portfolio-benchmark-')
+DB_NAME = Path(_TMP_DIR.name) / 'db-benchmark.sqlite3'
+
+
+def setup_django() -> None:
+    """Set up Django to use a temporary database instead of `db.sqlite3`."""
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'PortfolioTracker.settings')
+    settings.DATABASES['default']['NAME'] = DB_NAME
+    django.setup()
+
+
+def reset_db(db_profile: str = None, data_dir: Path = None) -> None:
+    """Create a fresh database populated with initial data,
+    and reset in-memory states of the portfolio engine.
+    @param db_profile: name of profile in `settings.DB_PROFILES` to use from now on.
+    @param data_dir: directory of initial data csv files, `data/` if None.
+    """
+    # Local imports as Django must be set up first
+    from django.core.management import call_command
+    from django.db import connections
+    from api.models import FX, Bond, Desk
+    from api.populate_db import populate
+    from event_handler.event_handlers import EventHandler
+    from event_handler.event_sequencer import EventSequencer
+    from event_handler.portfolio_state import PortfolioState
+
+    connections.close_all()
+    if db_profile is not None:
+        settings.DB_PROFILE = db_profile
+    for suffix in ('', '-wal', '-shm'):
+        Path(f'{DB_NAME}{suffix}').unlink(missing_ok=True)
+
+    call_command('migrate', verbosity=0)
+    if data_dir is not None:
+        # Replace initial data populated from `data/` after migrating
+        Desk.objects.all().delete()
+        Bond.objects.all().delete()
+        FX.objects.all().delete()
+        populate(data_dir)
+    EventSequencer().recover()
+    PortfolioState().load()
+    EventHandler._queue.clear()
+
+
+def read_events(filepath: Path = DATA_DIR / 'events.json', limit: int = None) -> List[dict]:
+    """Read events as they would be received from the form-encoded POST endpoint."""
+    events = islice(read_event_file(filepath), limit)
+    return [{key: str(value) for key, value in event.items()} for event in events]
+
+
+def timed(fn: Callable, *args, **kwargs) -> float:
+    """Call `fn` and return the time taken in seconds."""
+    start = time.perf_counter()
+    fn(*args, **kwargs)
+    return time.perf_counter() - start
@@ -0,0 +1,127 @@
+"""Generate synthetic datasets in the same shape as `data/`.
+
+Usage:
+    $ python3 -m benchmarks.datagen OUT_DIR [--bonds N] [--desks N] [--traders N] [--events N]
+"""
+
+import argparse
+import csv
+import json
+from pathlib import Path
+import random
+from typing import Dict, List, Tuple
+
+# Currencies with their initial rates to USX, as in `data/initial_fx.csv`
+CURRENCIES: Dict[str, str] = {
+    'USX': '1', 'HKX': '7.85', 'AUZ': '1.48', 'SGX': '1.35', 'CNX': '6.71', 'JPX': '136.14',
+}
+
+# Desks of `data/initial_cash.csv`, more desks are named D6, D7, ...
+DESKS: List[str] = ['NY', 'LON', 'TOK', 'HK', 'SG', 'SYD']
+
+INITIAL_CASH = '100000000'
+
+
+def _write_csv(filepath: Path, header: Tuple[str, str], rows: List[Tuple[str, str]]) -> None:
+    with open(filepath, 'w', encoding='UTF-8', newline='') as file:
+        writer = csv.writer(file)
+        writer.writerow(header)
+        writer.writerows(rows)
+
+
+def generate_dataset(
+    out_dir: Path,
+    bonds: int = 30,
+    desks: int = 6,
+    traders: int = 22,
+    events: int = 10000,
+    seed: int = 0,
+) -> Dict[str, int]:
+    """Write `initial_fx.csv`, `bond_details.csv`, `initial_cash.csv` and `events.json`
+    to `out_dir`, and return the size of the dataset.
+    Events are split evenly between trades, FX and price events, with a few more buys
+    than sells, so that most trades are applied as in `data/events.json`.
+    """
+    rng = random.Random(seed)
+    out_dir.mkdir(parents=True, exist_ok=True)
+
+    desk_ids = [DESKS[i] if i < len(DESKS) else f'D{i}' for i in range(desks)]
+    bond_ids = [f'B{i:05d}' for i in range(bonds)]
+    bond_currencies = {bond_id: rng.choice(list(CURRENCIES)) for bond_id in bond_ids}
+    # Each trader trades for one desk, in 1 to 3 books of their own named like `NY02`
+    trader_ids = [f'T{i:07d}' for i in range(traders)]
+    trader_desks = {trader_id: rng.choice(desk_ids) for trader_id in trader_ids}
+    books_per_desk = {desk_id: 0 for desk_id in desk_ids}
+    trader_books: Dict[str, List[str]] = {}
+    for trader_id in trader_ids:
+        desk_id = trader_desks[trader_id]
+        trader_books[trader_id] = []
+        for _ in range(rng.randint(1, 3)):
+            if books_per_desk[desk_id] == 100:
+                raise ValueError('More than 100 books in a desk, use fewer traders or more desks')
+            trader_books[trader_id].append(f'{desk_id}{books_per_desk[desk_id]:02d}')
+            books_per_desk[desk_id] += 1
+
+    _write_csv(out_dir / 'initial_fx.csv', ('Currency', 'Rate'), list(CURRENCIES.items()))
+    _write_csv(out_dir / 'bond_details.csv', ('BondID', 'Currency'), list(bond_currencies.items()))
+    _write_csv(
+        out_dir / 'initial_cash.csv', ('Desk', 'Cash'),
+        [(desk_id, INITIAL_CASH) for desk_id in desk_ids],
+    )
+
+    with open(out_dir / 'events.json', 'w', encoding='UTF-8') as file:
+        file.write('[\n')
+        for event_id in range(1, events + 1):
+            kind = rng.random()
+            if kind < 1 / 3:
+                trader_id = rng.choice(trader_ids)
+                event = {
+                    'EventID': event_id,
+                    'EventType': 'TradeEvent',
+                    'Desk': trader_desks[trader_id],
+                    'Trader': trader_id,
+                    'Book': rng.choice(trader_books[trader_id]),
+                    'BuySell': 'buy' if rng.random() < 0.6 else 'sell',
+                    'Quantity': rng.randint(1, 1000),
+                    'BondID': rng.choice(bond_ids),
+                }
+            elif kind < 2 / 3:
+                currency_id = rng.choice(list(CURRENCIES)[1:])  # USX stays at 1
+                event = {
+                    'EventID': event_id,
+                    'EventType': 'FXEvent',
+                    'ccy': currency_id,
+                    'rate': round(float(CURRENCIES[currency_id]) * rng.uniform(0.9, 1.1), 5),
+                }
+            else:
+                event = {
+                    'EventID': event_id,
+                    'EventType': 'PriceEvent',
+                    'BondID': rng.choice(bond_ids),
+                    'MarketPrice': round(rng.uniform(100, 10000), 2),
+                }
+            file.write(json.dumps(event))
+            file.write(',\n' if event_id < events else '\n')
+        file.write(']\n')
+
+    return {'bonds': bonds, 'desks': desks, 'traders': traders, 'events': events, 'seed': seed}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('out_dir', type=Path)
+    parser.add_argument('--bonds', type=int, default=30)
+    parser.add_argument('--desks', type=int, default=6)
+    parser.add_argument('--traders', type=int, default=22)
+    parser.add_argument('--events', type=int, default=10000)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    generate_dataset(
+        args.out_dir,
+        bonds=args.bonds, desks=args.desks, traders=args.traders,
+        events=args.events, seed=args.seed,
+    )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,47 @@
+"""Benchmark event ingestion throughput of each DB profile in `settings.DB_PROFILES`.
+
+Usage:
+    $ python3 -m benchmarks.db_profile [--events N] [--profiles default performance]
+"""
+
+import argparse
+from typing import List
+
+from benchmarks.common import setup_django, reset_db, read_events, timed
+
+
+def _ingest_one_by_one(events: List[dict]) -> None:
+    """Handle events one transaction at a time, like the `api/events/` endpoint."""
+    from event_handler.event_handlers import EventHandler
+    for event in events:
+        EventHandler().handle_event(event)
+
+
+def _ingest_in_batches(events: List[dict], batch_size: int = 500) -> None:
+    """Handle events in batches, like the `api/events/batch/` endpoint."""
+    from event_handler.event_handlers import EventHandler
+    for i in range(0, len(events), batch_size):
+        EventHandler().handle_events(events[i:i + batch_size])
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--events', type=int, default=2000, help='number of events to ingest')
+    parser.add_argument(
+        '--profiles', nargs='+', default=['default', 'performance'], help='DB profiles to compare'
+    )
+    args = parser.parse_args()
+
+    setup_django()
+    events = read_events(limit=args.events)
+
+    print(f'{"profile":<12} {"mode":<12} {"seconds":>8} {"events/s":>10}')
+    for profile in args.profiles:
+        for mode, ingest in (('one-by-one', _ingest_one_by_one), ('batch', _ingest_in_batches)):
+            reset_db(profile)
+            seconds = timed(ingest, events)
+            print(f'{profile:<12} {mode:<12} {seconds:>8.2f} {len(events) / seconds:>10.0f}')
+
+
+if __name__ == '__main__':
+    main()
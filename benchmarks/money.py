@@ -0,0 +1,76 @@
+"""Microbenchmark of the cash arithmetic of a buy, with `Money` against `Decimal`.
+
+Usage:
+    $ python3 -m benchmarks.money [--trades N] [--repeats N]
+"""
+
+import argparse
+from decimal import Decimal
+import random
+import timeit
+from typing import List, Tuple
+
+from benchmarks.common import setup_django
+
+
+def _decimal_buys(trades: List[Tuple[int, Decimal, Decimal]], cash: Decimal) -> Decimal:
+    """Check and apply buys with Decimal, as the handler did before `Money`."""
+    from util.common_fns import round_to_db_precision
+    for quantity, price, rate in trades:
+        value = Decimal(quantity) * price / rate
+        if cash.compare(value) >= 0:
+            cash = round_to_db_precision(cash - value)
+            round_to_db_precision(value)  # Logged value
+    return cash
+
+
+def _money_buys(trades: List[Tuple[int, 'Money', 'Money']], cash: 'Money') -> 'Money':
+    """Check and apply buys with `Money`, as the handler does."""
+    from util.money import TradeValue
+    for quantity, price, rate in trades:
+        value = TradeValue(quantity, price, rate)
+        if not value.exceeds(cash):
+            cash = value.subtract_from(cash)
+            value.rounded()  # Logged value
+    return cash
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--trades', type=int, default=10000)
+    parser.add_argument('--repeats', type=int, default=5)
+    args = parser.parse_args()
+
+    setup_django()
+    from util.common_fns import round_to_db_precision
+    from util.money import Money
+
+    rng = random.Random(0)
+    decimal_trades = [
+        (
+            rng.randint(1, 1000),
+            round_to_db_precision(Decimal(rng.uniform(100, 10000))),
+            round_to_db_precision(Decimal(rng.choice([1, 1.48, 1.35, 7.85, 6.71, 136.14]))),
+        )
+        for _ in range(args.trades)
+    ]
+    money_trades = [
+        (quantity, Money.from_decimal(price), Money.from_decimal(rate))
+        for quantity, price, rate in decimal_trades
+    ]
+    cash = Decimal(10 ** 12)
+    money_cash = _money_buys(money_trades, Money.from_decimal(cash))
+    if _decimal_buys(decimal_trades, cash) != money_cash.to_decimal():
+        raise AssertionError('Money and Decimal results differ')
+
+    print(f'{"arithmetic":<12} {"ns/trade":>10}')
+    for name, run in (
+        ('Decimal', lambda: _decimal_buys(decimal_trades, cash)),
+        ('Money', lambda: _money_buys(money_trades, Money.from_decimal(cash))),
+    ):
+        seconds = min(timeit.repeat(run, number=1, repeat=args.repeats))
+        print(f'{name:<12} {seconds / args.trades * 1e9:>10.0f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,142 @@
+"""End-to-end benchmark of event ingestion, live portfolio views and report generation
+on a synthetic dataset, with results written to a JSON file.
+
+Usage:
+    $ python3 -m benchmarks.suite [--events N] [--bonds N] [--desks N] [--traders N]
+        [--targets ID ...] [--output FILE]
+"""
+
+import argparse
+from datetime import datetime, timezone
+import json
+from pathlib import Path
+import platform
+import statistics
+import tempfile
+import time
+from typing import Callable, Dict, List
+
+from benchmarks.common import setup_django, reset_db, read_events, timed
+from benchmarks.datagen import generate_dataset
+
+
+def _bench_ingestion(events: List[dict]) -> Dict:
+    """Handle events one at a time, like the `api/events/` endpoint."""
+    from event_handler.event_handlers import EventHandler
+    handler = EventHandler()
+    latencies: List[float] = []
+    start = time.perf_counter()
+    for event in events:
+        latencies.append(timed(handler.handle_event, event))
+    seconds = time.perf_counter() - start
+    return {
+        'events': len(events),
+        'seconds': round(seconds, 3),
+        'events_per_second': round(len(events) / seconds, 1),
+        **_summarize(latencies),
+    }
+
+
+def _bench_views(repeats: int) -> Dict[str, Dict]:
+    """Call each view of the live portfolio `repeats` times, after a first cold call."""
+    from report_generator.portfolio_generator import PortfolioGenerator
+    generator = PortfolioGenerator()
+    views: Dict[str, Callable] = {
+        'cash': generator.generate_cash_level_data,
+        'position': generator.generate_position_level_data,
+        'bond': generator.generate_bond_level_data,
+        'bond_page': lambda: generator.generate_bond_level_data(offset=0, limit=100),
+        'currency': generator.generate_currency_level_data,
+        'exclusion': generator.generate_exclusion_data,
+    }
+    results: Dict[str, Dict] = {}
+    for name, view in views.items():
+        first = timed(view)
+        results[name] = {
+            'first_ms': round(first * 1000, 3),
+            **_summarize([timed(view) for _ in range(repeats)]),
+        }
+    return results
+
+
+def _bench_reports(target_ids: List[int], out_dir: Path) -> List[Dict]:
+    """Output all reports at each target ID, in order, with caches cleared first."""
+    from report_generator.report_generator import ReportGenerator
+    generator = ReportGenerator()
+    generator.OUT_DIR = out_dir
+    generator._reset_states()
+    return [
+        {'target_id': target_id, 'seconds': round(timed(generator.output_reports, target_id), 4)}
+        for target_id in target_ids
+    ]
+
+
+def _summarize(latencies: List[float]) -> Dict:
+    """Helper function to summarize latencies in milliseconds."""
+    latencies = sorted(latencies)
+    return {
+        'mean_ms': round(statistics.fmean(latencies) * 1000, 3),
+        'p50_ms': round(latencies[len(latencies) // 2] * 1000, 3),
+        'p99_ms': round(latencies[min(len(latencies) * 99 // 100, len(latencies) - 1)] * 1000, 3),
+        'max_ms': round(latencies[-1] * 1000, 3),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--events', type=int, default=10000)
+    parser.add_argument('--bonds', type=int, default=30)
+    parser.add_argument('--desks', type=int, default=6)
+    parser.add_argument('--traders', type=int, default=22)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument(
+        '--targets', type=int, nargs='+', default=None,
+        help='event IDs to output reports at, a quarter, half, three quarters and all by default',
+    )
+    parser.add_argument('--view-repeats', type=int, default=20)
+    parser.add_argument('--profile', default='performance', help='DB profile to use')
+    parser.add_argument('--output', type=Path, default=Path('benchmark-results.json'))
+    args = parser.parse_args()
+
+    setup_django()
+    from django.conf import settings
+
+    target_ids = args.targets or [
+        args.events // 4, args.events // 2, args.events * 3 // 4, args.events,
+    ]
+    with tempfile.TemporaryDirectory(prefix='portfolio-dataset-') as tmp_dir:
+        data_dir = Path(tmp_dir) / 'data'
+        dataset = generate_dataset(
+            data_dir,
+            bonds=args.bonds, desks=args.desks, traders=args.traders,
+            events=args.events, seed=args.seed,
+        )
+        reset_db(args.profile, data_dir=data_dir)
+        events = read_events(data_dir / 'events.json')
+
+        print(f'Ingesting {len(events)} events...')
+        ingestion = _bench_ingestion(events)
+        print(f'{ingestion["events_per_second"]} events/s')
+        print('Timing live portfolio views...')
+        views = _bench_views(args.view_repeats)
+        print(f'Outputting reports at {target_ids}...')
+        reports = _bench_reports(target_ids, Path(tmp_dir) / 'out')
+
+    results = {
+        'timestamp': datetime.now(timezone.utc).isoformat(),
+        'environment': {
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'db_profile': settings.DB_PROFILE,
+        },
+        'dataset': dataset,
+        'ingestion': ingestion,
+        'views': views,
+        'reports': reports,
+    }
+    args.output.write_text(json.dumps(results, indent=2))
+    print(f'Results written to {args.output}')
+
+
+if __name__ == '__main__':
+    main()
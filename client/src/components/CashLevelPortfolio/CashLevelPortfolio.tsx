@@ -1,30 +1,14 @@
-import React, { FC, useEffect, useState } from 'react';
+import React, { FC } from 'react';
 import styles from './CashLevelPortfolio.module.css';
 
-import { serverAPI } from '../../utils/serverAPI';
-import { DeskModel } from '../../utils/types';
-import { constants } from 'buffer';
+import { useLiveView } from '../../utils/liveUpdates';
+import { CashLevelResponse } from '../../utils/types';
 
 interface CashLevelPortfolioProps { }
 
 
 const CashLevelPortfolio: FC<CashLevelPortfolioProps> = () => {
-  const [data, setData] = useState<DeskModel[]>([]);
-
-  useEffect(() => {
-    fetchData();
-    const handleScheduledFetching = setInterval(() => {
-      fetchData();
-    }, 5_000);  // every 5 seconds
-
-    return () => clearInterval(handleScheduledFetching);
-  }, []);
-
-  const fetchData = async () => {
-    const result = await serverAPI.get('api/get_cash_portfolio');
-    console.log(result.data);
-    setData(result.data);
-  }
+  const data = useLiveView<CashLevelResponse>('cash');
 
   return (
     <div className={styles.CashLevelPortfolio}>
@@ -33,9 +17,9 @@ const CashLevelPortfolio: FC<CashLevelPortfolioProps> = () => {
           <tbody>
             {data.map(item => {
               return (
-                <td key={item.pk} >
-                  <th>{item.pk}:</th>
-                  <td>{Number(item.fields.cash).toFixed(2)}</td>
+                <td key={item.desk} >
+                  <th>{item.desk}:</th>
+                  <td>{Number(item.cash).toFixed(2)}</td>
                 </td>
               )
             })}
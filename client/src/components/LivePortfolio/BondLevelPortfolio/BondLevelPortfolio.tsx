@@ -1,28 +1,13 @@
-import React, { FC, useEffect, useState } from 'react';
+import React, { FC } from 'react';
 import styles from './BondLevelPortfolio.module.css';
 
-import { serverAPI } from '../../../utils/serverAPI';
+import { useLiveView } from '../../../utils/liveUpdates';
 import { BondRecordResponse } from '../../../utils/types';
 
 interface BondLevelPortfolioProps { }
 
 const BondLevelPortfolio: FC<BondLevelPortfolioProps> = () => {
-  const [data, setData] = useState<BondRecordResponse[]>([]);
-
-  const fetchData = async () => {
-    const result = await serverAPI.get('api/get_bond_portfolio');
-    console.log(result.data);
-    setData(result.data);
-  }
-
-  useEffect(() => {
-    fetchData();
-    const handleScheduledFetching = setInterval(() => {
-      fetchData();
-    }, 5_000);  // every 5 seconds
-
-    return () => clearInterval(handleScheduledFetching);
-  }, []);
+  const data = useLiveView<BondRecordResponse>('bond');
 
   return (
     <div className={styles.BondLevelPortfolio}>
@@ -41,10 +26,10 @@ const BondLevelPortfolio: FC<BondLevelPortfolioProps> = () => {
             {data.map((item, index) => {
               return (
                 <tr key={index} >
-                  <td>{item.desk.pk}</td>
-                  <td>{item.trader.pk}</td>
-                  <td>{item.book.pk}</td>
-                  <td>{item.bond.pk}</td>
+                  <td>{item.desk}</td>
+                  <td>{item.trader}</td>
+                  <td>{item.book}</td>
+                  <td>{item.bond}</td>
                   <td>{item.position}</td>
                   <td>{Number(item.NV).toFixed(2)}</td>
                 </tr>
@@ -1,28 +1,13 @@
-import React, { FC, useEffect, useState } from 'react';
+import React, { FC } from 'react';
 import styles from './CurrencyLevelPortfolio.module.css';
 
-import { serverAPI } from '../../../utils/serverAPI';
+import { useLiveView } from '../../../utils/liveUpdates';
 import { CurrencyLevelResponse } from '../../../utils/types';
 
 interface CurrencyLevelPortfolioProps {}
 
 const CurrencyLevelPortfolio: FC<CurrencyLevelPortfolioProps> = () => {
-  const [data, setData] = useState<CurrencyLevelResponse[]>([]);
-
-  const fetchData = async () => {
-    const result = await serverAPI.get('api/get_currency_portfolio');
-    console.log(result.data);
-    setData(result.data);
-  }
-
-  useEffect(() => {
-    fetchData();
-    const handleScheduledFetching = setInterval(() => {
-      fetchData();
-    }, 5_000);  // every 5 seconds
-
-    return () => clearInterval(handleScheduledFetching);
-  }, []);
+  const data = useLiveView<CurrencyLevelResponse>('currency');
 
   return (
     <div className={styles.CurrencyLevelPortfolio}>
@@ -1,28 +1,13 @@
-import React, { FC, useEffect, useState } from 'react';
+import React, { FC } from 'react';
 import styles from './Exclusions.module.css';
 
-import { serverAPI } from '../../../utils/serverAPI';
-import { ExclusionModel } from '../../../utils/types';
+import { useLiveView } from '../../../utils/liveUpdates';
+import { ExclusionResponse } from '../../../utils/types';
 
 interface ExclusionsProps { }
 
 const Exclusions: FC<ExclusionsProps> = () => {
-  const [data, setData] = useState<ExclusionModel[]>([]);
-
-  useEffect(() => {
-    fetchData();
-    const handleScheduledFetching = setInterval(() => {
-      fetchData();
-    }, 5_000);  // every 5 seconds
-
-    return () => clearInterval(handleScheduledFetching);
-  }, []);
-
-  const fetchData = async () => {
-    const result = await serverAPI.get('api/get_exclusion_data');
-    console.log(result.data);
-    setData(result.data);
-  }
+  const data = useLiveView<ExclusionResponse>('exclusions');
 
   return (
     <div className={styles.Exclusions}>
@@ -43,16 +28,16 @@ const Exclusions: FC<ExclusionsProps> = () => {
             </tr>
             {data.map((item, index) => {
               return (
-                <tr key={index} >
-                  <td>{item.pk}</td>
-                  <td>{item.fields.desk}</td>
-                  <td>{item.fields.trader}</td>
-                  <td>{item.fields.book}</td>
-                  <td>{item.fields.buy_sell}</td>
-                  <td>{item.fields.quantity}</td>
-                  <td>{item.fields.bond}</td>
-                  <td>{item.fields.price ? Number(item.fields.price).toFixed(2) : ''}</td>
-                  <td>{item.fields.exclusion_type}</td>
+                <tr key={item.event_id} >
+                  <td>{item.event_id}</td>
+                  <td>{item.desk}</td>
+                  <td>{item.trader}</td>
+                  <td>{item.book}</td>
+                  <td>{item.buy_sell}</td>
+                  <td>{item.quantity}</td>
+                  <td>{item.bond}</td>
+                  <td>{item.price ? Number(item.price).toFixed(2) : ''}</td>
+                  <td>{item.exclusion_type}</td>
                 </tr>
               )
             })}
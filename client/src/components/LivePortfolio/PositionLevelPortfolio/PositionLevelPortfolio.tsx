@@ -1,28 +1,13 @@
-import React, { FC, useEffect, useState } from 'react';
+import React, { FC } from 'react';
 import styles from './PositionLevelPortfolio.module.css';
 
-import { serverAPI } from '../../../utils/serverAPI';
+import { useLiveView } from '../../../utils/liveUpdates';
 import { PositionLevelResponse } from '../../../utils/types';
 
 interface PositionLevelPortfolioProps { }
 
 const PositionLevelPortfolio: FC<PositionLevelPortfolioProps> = () => {
-  const [data, setData] = useState<PositionLevelResponse[]>([]);
-
-  const fetchData = async () => {
-    const result = await serverAPI.get('api/get_position_portfolio');
-    console.log(result.data);
-    setData(result.data);
-  }
-
-  useEffect(() => {
-    fetchData();
-    const handleScheduledFetching = setInterval(() => {
-      fetchData();
-    }, 5_000);  // every 5 seconds
-
-    return () => clearInterval(handleScheduledFetching);
-  }, []);
+  const data = useLiveView<PositionLevelResponse>('position');
 
   return (
     <div className={styles.PositionLevelPortfolio}>
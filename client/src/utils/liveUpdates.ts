@@ -0,0 +1,113 @@
+import { useEffect, useState } from 'react';
+
+import { API_URL } from './serverAPI';
+
+// Views of the live portfolio pushed by the server, with the fields identifying each row
+const VIEW_KEYS = {
+  cash: ['desk'],
+  position: ['desk', 'trader', 'book'],
+  bond: ['desk', 'trader', 'book', 'bond'],
+  currency: ['desk', 'currency'],
+  exclusions: ['event_id'],
+};
+
+export type ViewName = keyof typeof VIEW_KEYS;
+
+type Row = { [field: string]: any };
+
+interface LiveState {
+  eventId: number;
+  views: Record<ViewName, Map<string, Row>>;
+}
+
+type Listener = (state: LiveState) => void;
+
+const VIEW_NAMES = Object.keys(VIEW_KEYS) as ViewName[];
+
+const keyOf = (view: ViewName, row: Row): string =>
+  JSON.stringify(VIEW_KEYS[view].map((field) => row[field]));
+
+const compareRows = (view: ViewName) => (a: Row, b: Row): number => {
+  for (const field of VIEW_KEYS[view]) {
+    if (a[field] < b[field]) return -1;
+    if (a[field] > b[field]) return 1;
+  }
+  return 0;
+};
+
+const emptyViews = (): Record<ViewName, Map<string, Row>> => {
+  const views = {} as Record<ViewName, Map<string, Row>>;
+  VIEW_NAMES.forEach((view) => { views[view] = new Map(); });
+  return views;
+};
+
+// One stream is shared by all components, and closed when none are listening
+let state: LiveState = { eventId: -1, views: emptyViews() };
+let source: EventSource | null = null;
+const listeners = new Set<Listener>();
+
+const notify = () => listeners.forEach((listener) => listener(state));
+
+const handleSnapshot = (message: MessageEvent) => {
+  const data = JSON.parse(message.data);
+  const views = emptyViews();
+  VIEW_NAMES.forEach((view) => {
+    (data.views[view] as Row[]).forEach((row) => views[view].set(keyOf(view, row), row));
+  });
+  state = { eventId: data.event_id, views };
+  notify();
+};
+
+const handleUpdate = (message: MessageEvent) => {
+  const data = JSON.parse(message.data);
+  const views = { ...state.views };
+  Object.keys(data.views).forEach((name) => {
+    const view = name as ViewName;
+    const rows = new Map(views[view]);
+    data.views[view].remove.forEach((key: any[]) => rows.delete(JSON.stringify(key)));
+    data.views[view].upsert.forEach((row: Row) => rows.set(keyOf(view, row), row));
+    views[view] = rows;
+  });
+  state = { eventId: data.event_id, views };
+  notify();
+};
+
+const subscribe = (listener: Listener): (() => void) => {
+  listeners.add(listener);
+  if (source === null) {
+    // Reconnects automatically, and the server sends a new snapshot on reconnection
+    source = new EventSource(`${API_URL}/api/live_updates`);
+    source.addEventListener('snapshot', handleSnapshot as EventListener);
+    source.addEventListener('update', handleUpdate as EventListener);
+  }
+  listener(state);
+
+  return () => {
+    listeners.delete(listener);
+    if (listeners.size === 0 && source !== null) {
+      source.close();
+      source = null;
+    }
+  };
+};
+
+// Rows of a view, ordered by their key fields, updated as the server pushes changes
+export const useLiveView = <T,>(view: ViewName): T[] => {
+  const [rows, setRows] = useState<T[]>([]);
+
+  useEffect(() => subscribe((liveState) => {
+    const viewRows = Array.from(liveState.views[view].values());
+    setRows(viewRows.sort(compareRows(view)) as unknown as T[]);
+  }), [view]);
+
+  return rows;
+};
+
+// ID of the latest event in the pushed views, -1 until connected
+export const useLatestEventId = (): number => {
+  const [eventId, setEventId] = useState<number>(-1);
+
+  useEffect(() => subscribe((liveState) => setEventId(liveState.eventId)), []);
+
+  return eventId;
+};
@@ -50,12 +50,13 @@ export interface ExclusionModel {
 }
 
 export interface BondRecordResponse {
-  desk: DeskModel;
-  trader: TraderModel;
-  book: BookModel;
-  bond: BondModel;
+  desk: string;
+  trader: string;
+  book: string;
+  bond: string;
+  currency: string;
   position: number;
-  NV: number;
+  NV: number | string;
 }
 
 export interface PositionLevelResponse {
@@ -63,13 +64,30 @@ export interface PositionLevelResponse {
   trader: string;
   book: string
   position: number;
-  NV: number;
+  NV: number | string;
 }
 
 export interface CurrencyLevelResponse {
   desk: string;
   currency: string;
   position: number;
-  NV: number;
+  NV: number | string;
+}
+
+
+export interface CashLevelResponse {
+  desk: string;
+  cash: number | string;
 }
 
+export interface ExclusionResponse {
+  event_id: number;
+  desk: string;
+  trader: string;
+  book: string;
+  buy_sell: string;
+  quantity: number | string;
+  bond: string;
+  price: number | string | null;
+  exclusion_type: string;
+}
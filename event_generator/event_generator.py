@@ -1,22 +1,42 @@
 """Event generator module."""
 
 from pathlib import Path
-import json
-from typing import Deque, List, Union
+from typing import Deque, FrozenSet, Iterator, Union
 from collections import deque
 
 from util.common_types import Event, MarketEvent, TradeEvent
 from util.singleton import Singleton
+from .event_reader import read_events
+
+# Maximum number of events a producer parses ahead of the events it has sent
+READ_AHEAD = 100
+
+MARKET_EVENT_TYPES: FrozenSet[str] = frozenset(('PriceEvent', 'FXEvent'))
+TRADE_EVENT_TYPES: FrozenSet[str] = frozenset(('TradeEvent',))
 
 class _DataProducer:
+    _events: Iterator[Event] = None
     _queue: Deque[Event] = None
 
-    def __init__(self, events: Deque[Event]):
-        self._queue = events
+    def __init__(self, events: Iterator[Event], read_ahead: int = READ_AHEAD):
+        self._events = events
+        self._queue = deque()
+        self._read_ahead = read_ahead
+
+    def _fill(self) -> None:
+        """Helper function to parse up to `read_ahead` events into queue, once it is empty."""
+        if self._queue or self._events is None:
+            return
+        for event in self._events:
+            self._queue.append(event)
+            if len(self._queue) >= self._read_ahead:
+                return
+        self._events = None  # No more events
 
     # API functions
     def has_next(self) -> bool:
         """Check if there is next event in queue."""
+        self._fill()
         return len(self._queue) > 0
 
     def send_next(self) -> Union[Event, None]:
@@ -26,17 +46,20 @@ class _DataProducer:
         return None
 
 class _MarketDataProducer(_DataProducer):
-    def __init__(self, events: Deque[MarketEvent]):
+    def __init__(self, events: Iterator[MarketEvent]):
         super().__init__(events)
 
 class _TradeEventProducer(_DataProducer):
-    def __init__(self, events: Deque[TradeEvent]):
+    def __init__(self, events: Iterator[TradeEvent]):
         super().__init__(events)
 
 
 class EventGenerator(metaclass=Singleton):
     """Class to read events from json file.
     Has API to send next events.
+
+    Events are read lazily from a JSON array or NDJSON file, so memory does not grow
+    with the file. Each producer reads the file on its own, as each publisher only uses one.
     """
 
     DATA_DIR = Path(__file__).absolute().parent.parent / 'data'
@@ -46,43 +69,38 @@ class EventGenerator(metaclass=Singleton):
     _trade_event_producer: _TradeEventProducer = None
 
     def __init__(self, json_filename: str = 'events.json'):
-        events = self._read_json(json_filename)
-        self._enqueue_events(events)
+        self._create_producers(json_filename)
 
     def _reset_for_unittest(self) -> None:
         """Help to set the event_generator for testing purposes."""
         self._market_data_producer = None
         self._trade_event_producer = None
         json_filename = 'example/example_events.json'
-        events = self._read_json(json_filename)
-        self._enqueue_events(events)
+        self._create_producers(json_filename)
 
     # Helper functions
-    def _read_json(self, json_filename: str) -> Union[List[Event], str]:
-        """Helper function to read json file and
-        return a list containing each event as dict.
+    def _read_events(self, json_filename: str, event_types: FrozenSet[str]) -> Iterator[Event]:
+        """Helper function to lazily read events of `event_types` from json file.
+        Yields nothing if the file is not found.
         """
         filepath = self.DATA_DIR / json_filename
-        try:
-            with open(filepath, 'r', encoding='UTF-8') as file:
-                return json.load(file)
-        except FileNotFoundError:
-            return f'File {filepath} not found.'
-
-    def _enqueue_events(self, events: List[Event]):
-        """Helper function to enqueue events."""
-        _market_data_queue: Deque[MarketEvent] = deque(maxlen=None)
-        _trade_event_queue: Deque[TradeEvent] = deque(maxlen=None)
-        for event in events:
+        if not filepath.exists():
+            return
+        for event in read_events(filepath):
             if 'EventType' in event:
-                if event['EventType'] == 'PriceEvent' or event['EventType'] == 'FXEvent':
-                    _market_data_queue.append(event)
-                elif event['EventType'] == 'TradeEvent':
-                    _trade_event_queue.append(event)
-                else:
+                if event['EventType'] in event_types:
+                    yield event
+                elif event['EventType'] not in MARKET_EVENT_TYPES | TRADE_EVENT_TYPES:
                     raise ValueError(f'Unknown event: {event["EventType"]}')
-        self._market_data_producer = _MarketDataProducer(_market_data_queue)
-        self._trade_event_producer = _TradeEventProducer(_trade_event_queue)
+
+    def _create_producers(self, json_filename: str) -> None:
+        """Helper function to create producers of events in json file."""
+        self._market_data_producer = _MarketDataProducer(
+            self._read_events(json_filename, MARKET_EVENT_TYPES)
+        )
+        self._trade_event_producer = _TradeEventProducer(
+            self._read_events(json_filename, TRADE_EVENT_TYPES)
+        )
 
     def send_next_market_data(self) -> Union[MarketEvent, None]:
         """Helper function to get next market data."""
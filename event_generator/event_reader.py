@@ -0,0 +1,131 @@
+"""Module to read events lazily from large JSON array or NDJSON files."""
+
+import json
+from pathlib import Path
+from typing import Iterator, TextIO
+
+from util.common_types import Event
+
+# Number of characters read from file at a time
+READ_CHUNK_SIZE = 64 * 1024
+
+# Maximum number of characters of one event, so that an invalid event does not make
+# the reader buffer the rest of the file
+MAX_EVENT_SIZE = 1024 * 1024
+
+
+def _check_event(event) -> Event:
+    if not isinstance(event, dict):
+        raise ValueError(f'Event is not an object: {event}')
+    return event
+
+
+def _iter_json_array(
+    file: TextIO, buffer: str, offset: int, decoder: json.JSONDecoder, chunk_size: int,
+    max_event_size: int,
+) -> Iterator[Event]:
+    """Helper function to parse elements of a JSON array one at a time.
+    `buffer` holds the text read so far, starting after the opening `[`,
+    which is at character `offset` - 1 of the file.
+    """
+    pos = 0
+    expect_value = True
+    after_comma = False
+    eof = False
+    while True:
+        # Skip whitespace and separators between elements
+        while pos < len(buffer) and (buffer[pos].isspace() or buffer[pos] == ','):
+            if buffer[pos] == ',':
+                if expect_value:
+                    raise ValueError(f'Unexpected "," in JSON array at offset {offset + pos}')
+                expect_value = True
+                after_comma = True
+            pos += 1
+        if pos < len(buffer) and buffer[pos] == ']':
+            if after_comma and expect_value:
+                raise ValueError(f'Trailing "," in JSON array at offset {offset + pos}')
+            return
+
+        if pos < len(buffer):
+            if not expect_value:
+                raise ValueError(f'Expected "," in JSON array at offset {offset + pos}')
+            try:
+                event, end = decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError as e:
+                if eof or len(buffer) - pos > max_event_size:
+                    raise ValueError(
+                        f'Invalid event in JSON array at offset {offset + pos}: {e.msg}'
+                    ) from e
+                # Element continues in the next chunk
+            else:
+                yield _check_event(event)
+                pos = end
+                expect_value = False
+                continue
+        elif eof:
+            raise ValueError('JSON array is not closed')
+
+        # Drop parsed text, then read more
+        chunk = file.read(chunk_size)
+        buffer = buffer[pos:] + chunk
+        offset += pos
+        pos = 0
+        eof = not chunk
+
+
+def _iter_ndjson(
+    file: TextIO, buffer: str, decoder: json.JSONDecoder, chunk_size: int,
+    max_event_size: int,
+) -> Iterator[Event]:
+    """Helper function to parse events one line at a time, skipping blank lines."""
+    while True:
+        lines = buffer.split('\n')
+        buffer = lines.pop()  # Line may continue in the next chunk
+        for line in lines:
+            if line.strip():
+                yield _check_event(decoder.decode(line))
+        if len(buffer) > max_event_size:
+            raise ValueError(f'Line of more than {max_event_size} characters')
+        chunk = file.read(chunk_size)
+        if not chunk:
+            break
+        buffer += chunk
+    if buffer.strip():
+        yield _check_event(decoder.decode(buffer))
+
+
+def iter_events(
+    file: TextIO, chunk_size: int = READ_CHUNK_SIZE, max_event_size: int = MAX_EVENT_SIZE,
+    **kwargs,
+) -> Iterator[Event]:
+    """Parse events lazily from a JSON array or NDJSON (one event per line),
+    reading at most `chunk_size` characters ahead of the last parsed event.
+    `kwargs` are passed to `json.JSONDecoder`, e.g. `parse_float=Decimal`.
+    Raises ValueError if the file or any event is invalid,
+    or an event is longer than `max_event_size` characters.
+    """
+    decoder = json.JSONDecoder(**kwargs)
+    # Number of characters read before `buffer`
+    offset = 0
+    buffer = file.read(chunk_size)
+    while buffer and not buffer.strip():
+        offset += len(buffer)
+        buffer = file.read(chunk_size)
+    stripped = buffer.lstrip()
+    if stripped.startswith('['):
+        offset += len(buffer) - len(stripped) + 1
+        return _iter_json_array(
+            file, stripped[1:], offset, decoder, chunk_size, max_event_size
+        )
+    return _iter_ndjson(file, buffer, decoder, chunk_size, max_event_size)
+
+
+def read_events(
+    filepath: Path, chunk_size: int = READ_CHUNK_SIZE, max_event_size: int = MAX_EVENT_SIZE,
+    **kwargs,
+) -> Iterator[Event]:
+    """Read events lazily from a JSON array or NDJSON file, see `iter_events`.
+    The file is opened on first iteration, and closed once all events are read.
+    """
+    with open(filepath, 'r', encoding='UTF-8') as file:
+        yield from iter_events(file, chunk_size, max_event_size, **kwargs)
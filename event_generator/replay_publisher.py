@@ -0,0 +1,221 @@
+"""Module to replay an event file to the server endpoint as fast as possible, or at a target rate."""
+
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+import json
+import math
+import threading
+import time
+from typing import Dict, Iterable, Iterator, List, Tuple, Union
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from util.common_types import Event
+
+SERVER_URL = 'http://localhost:8000'
+
+# Percentiles of request latency reported
+LATENCY_PERCENTILES = (50, 90, 99)
+
+# Status codes of responses whose events may be accepted if sent again
+RETRY_STATUSES = (429, 502, 503, 504)
+
+
+class ReplayStats:
+    """Thread-safe counts and request latencies of a replay."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.start = time.perf_counter()
+        self._end: Union[float, None] = None
+        self.events: int = 0
+        self.failed_events: int = 0
+        self.retried_events: int = 0
+        self.requests: int = 0
+        self.failed_requests: int = 0
+        self._latencies: List[float] = []
+
+    def record(self, events: int, latency: float, failed_events: int, failed: bool) -> None:
+        """Record a request sending `events` for the first time,
+        of which `failed_events` were not accepted and are not sent again.
+        """
+        with self._lock:
+            self.events += events
+            self.failed_events += failed_events
+            self.requests += 1
+            self.failed_requests += int(failed)
+            self._latencies.append(latency)
+
+    def record_retry(self, events: int) -> None:
+        """Record that `events` not accepted are sent again."""
+        with self._lock:
+            self.retried_events += events
+
+    def finish(self) -> None:
+        self._end = time.perf_counter()
+
+    def report(self) -> Dict:
+        """Get throughput and latency percentiles in milliseconds."""
+        with self._lock:
+            seconds = (self._end or time.perf_counter()) - self.start
+            latencies = sorted(self._latencies)
+            report = {
+                'events': self.events,
+                'failed_events': self.failed_events,
+                'retried_events': self.retried_events,
+                'requests': self.requests,
+                'failed_requests': self.failed_requests,
+                'seconds': round(seconds, 3),
+                'events_per_second': round(self.events / seconds, 1) if seconds else 0,
+            }
+            for percentile in LATENCY_PERCENTILES:
+                report[f'latency_p{percentile}_ms'] = round(
+                    _percentile(latencies, percentile) * 1000, 2
+                )
+            report['latency_max_ms'] = round(latencies[-1] * 1000, 2) if latencies else 0
+            return report
+
+
+def _percentile(values: List[float], percentile: float) -> float:
+    """Helper function to get the nearest-rank percentile of sorted `values`."""
+    if not values:
+        return 0
+    rank = math.ceil(percentile / 100 * len(values))
+    return values[max(rank, 1) - 1]
+
+
+def _batches(events: Iterable[Event], batch_size: int) -> Iterator[List[Event]]:
+    """Helper function to group consecutive events into lists of up to `batch_size`."""
+    events = iter(events)
+    batch = list(islice(events, batch_size))
+    while batch:
+        yield batch
+        batch = list(islice(events, batch_size))
+
+
+def create_session(pool_size: int, retries: int = 3) -> requests.Session:
+    """Create a session keeping up to `pool_size` connections to the server open.
+    Connection errors are retried with exponential backoff, and 503 responses
+    after the time in their `Retry-After` header, as sent while the server's queue is full.
+    """
+    session = requests.Session()
+    adapter = HTTPAdapter(
+        pool_connections=1,
+        pool_maxsize=pool_size,
+        # POST is not idempotent in general, but events are deduplicated by ID on the server
+        max_retries=Retry(
+            total=retries, connect=retries, read=0, status=retries, status_forcelist=(503,),
+            backoff_factor=0.5, allowed_methods=None, raise_on_status=False,
+        ),
+    )
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+
+def _post(session: requests.Session, server_url: str, batch: List[Event]) -> requests.Response:
+    """Helper function to post one event form-encoded, or a batch of events as NDJSON."""
+    if len(batch) == 1:
+        return session.post(f'{server_url}/api/events/', data=batch[0])
+    return session.post(
+        f'{server_url}/api/events/batch/',
+        data='\n'.join(json.dumps(event) for event in batch),
+        headers={'Content-Type': 'application/x-ndjson'},
+    )
+
+
+def _get_unaccepted(response: requests.Response, batch: List[Event]) -> Tuple[List[Event], bool]:
+    """Helper function to get events of `batch` that the server did not accept,
+    and whether they may be accepted if sent again.
+    """
+    if response.status_code >= 400:
+        return batch, response.status_code in RETRY_STATUSES
+    if len(batch) == 1:
+        return [], True
+    # Rejected events wait for missing events, and errors may be transient, e.g. DB locked
+    return [
+        event for event, outcome in zip(batch, response.json())
+        if outcome['status'] in ('error', 'rejected')
+    ], True
+
+
+def _get_retry_after(response: Union[requests.Response, None]) -> float:
+    """Helper function to get seconds in the `Retry-After` header, 0 if there is none."""
+    if response is None:
+        return 0
+    try:
+        return float(response.headers.get('Retry-After', 0))
+    except (TypeError, ValueError):
+        return 0
+
+
+def replay(
+    events: Iterable[Event],
+    server_url: str = SERVER_URL,
+    rate: Union[float, None] = None,
+    concurrency: int = 8,
+    batch_size: int = 1,
+    session: Union[requests.Session, None] = None,
+    max_attempts: int = 5,
+    backoff: float = 0.5,
+) -> Dict:
+    """Post `events` to the server and return the stats of `ReplayStats.report()`.
+    @param rate: target events per second, or None to send as fast as possible.
+    @param concurrency: number of requests in flight, each on a pooled connection.
+    @param batch_size: number of events per request, sent to the batch endpoint if more than 1.
+    @param max_attempts: number of times an event is sent before it is given up,
+    if the server does not accept it, e.g. while its queue or reorder buffer is full.
+    @param backoff: seconds before an event is sent again, doubled for each further attempt,
+    or longer if the server asks to wait with `Retry-After`.
+    Events in flight may arrive out of order, which the server puts back in order.
+    Events not accepted after `max_attempts` are counted in `failed_events`.
+    """
+    session = session or create_session(pool_size=concurrency)
+    stats = ReplayStats()
+    # Bounds requests in flight, so that events are read from `events` only as they are sent
+    in_flight = threading.BoundedSemaphore(concurrency)
+
+    def send(batch: List[Event]) -> None:
+        try:
+            for attempt in range(1, max_attempts + 1):
+                start = time.perf_counter()
+                response: Union[requests.Response, None] = None
+                try:
+                    response = _post(session, server_url, batch)
+                    unaccepted, retryable = _get_unaccepted(response, batch)
+                except Exception as e:  # pylint: disable=broad-except
+                    first_id, last_id = batch[0]['EventID'], batch[-1]['EventID']
+                    print(f'Could not publish events {first_id}-{last_id}: {e}')
+                    unaccepted, retryable = batch, True
+                given_up = unaccepted if not retryable or attempt == max_attempts else []
+                stats.record(
+                    len(batch) if attempt == 1 else 0,
+                    time.perf_counter() - start,
+                    len(given_up),
+                    response is None or response.status_code >= 400,
+                )
+                if given_up:
+                    print(f'Events not accepted: {[event["EventID"] for event in given_up]}')
+                if not unaccepted or given_up:
+                    return
+                stats.record_retry(len(unaccepted))
+                time.sleep(max(_get_retry_after(response), backoff * 2 ** (attempt - 1)))
+                batch = unaccepted
+        finally:
+            in_flight.release()
+
+    sent = 0
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        for batch in _batches(events, batch_size):
+            if rate:
+                # Pace requests so that events are sent at `rate` on average
+                delay = stats.start + sent / rate - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+            in_flight.acquire()
+            executor.submit(send, batch)
+            sent += len(batch)
+    stats.finish()
+    return stats.report()
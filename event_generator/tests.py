@@ -1,4 +1,8 @@
+from decimal import Decimal
+import io
+import json
 import time
+from unittest import mock
 
 from django.test import TestCase, LiveServerTestCase
 
@@ -6,7 +10,9 @@ from api.populate_db import _read_csv
 from api.models import (
     FX, Bond, Desk, Trader, Book, BondRecord, EventLog, EventExceptionLog
 )
-from event_generator.event_generator import EventGenerator
+from event_generator.event_generator import EventGenerator, _DataProducer
+from event_generator.event_reader import iter_events, read_events
+from event_generator.replay_publisher import ReplayStats, replay
 from event_generator.market_data_publisher import _scheduler
 from util.common_types import Event, MarketEvent, TradeEvent, PriceEvent, FXEvent
 
@@ -127,6 +133,133 @@ class EventGeneratorTestCase(TestCase):
             curr = self.generator_a._trade_event_producer.send_next()
         self.assertDictEqual(curr, sample_trade_event_last)
 
+class EventReaderTestCase(TestCase):
+    def setUp(self) -> None:
+        self.filepath = EventGenerator.DATA_DIR / 'events.json'
+        with open(self.filepath, 'r', encoding='UTF-8') as file:
+            self.events = json.load(file)
+
+    def test_reads_json_array_across_chunks(self):
+        self.assertListEqual(list(read_events(self.filepath, chunk_size=7)), self.events)
+
+    def test_reads_ndjson(self):
+        text = '\n'.join(json.dumps(event) for event in self.events[:10]) + '\n\n'
+        self.assertListEqual(list(iter_events(io.StringIO(text), chunk_size=16)), self.events[:10])
+
+    def test_parses_decimals(self):
+        events = iter_events(io.StringIO('  [{"EventID": 1, "rate": 1.57}]'), parse_float=Decimal)
+        self.assertListEqual(list(events), [{'EventID': 1, 'rate': Decimal('1.57')}])
+
+    def test_rejects_invalid_files(self):
+        for text in ('[{"EventID": 1}', '[{"EventID": 1} {"EventID": 2}]', '[1]', '{"EventID": 1'):
+            with self.assertRaises(ValueError):
+                list(iter_events(io.StringIO(text), chunk_size=4))
+
+    def test_rejects_trailing_comma_with_offset(self):
+        with self.assertRaisesMessage(ValueError, 'Trailing "," in JSON array at offset 17'):
+            list(iter_events(io.StringIO('[{"EventID": 1}, ]'), chunk_size=4))
+        self.assertListEqual(list(iter_events(io.StringIO(' [ ]'))), [])
+
+    def test_invalid_event_read_within_bounded_buffer(self):
+        text = '[{"EventID": 1}, {"EventID": x' + ' ' * 10000 + '}]'
+        file = io.StringIO(text)
+        with self.assertRaisesMessage(ValueError, 'Invalid event in JSON array at offset 17'):
+            list(iter_events(file, chunk_size=16, max_event_size=100))
+        self.assertLess(file.tell(), 200)
+
+    def test_reads_lazily(self):
+        file = io.StringIO('\n'.join(json.dumps(event) for event in self.events))
+        producer = _DataProducer(iter_events(file, chunk_size=1024), read_ahead=5)
+        self.assertDictEqual(producer.send_next(), self.events[0])
+        self.assertLess(file.tell(), 2048)
+
+    def test_event_generator_streams_by_type(self):
+        generator = EventGenerator()
+        generator._create_producers('events.json')
+        self.assertDictEqual(generator.send_next_market_data(), self.events[0])
+        self.assertDictEqual(generator.send_next_trade_event(), self.events[1])
+
+
+class ReplayPublisherTestCase(TestCase):
+    def setUp(self) -> None:
+        self.events = [
+            {'EventID': event_id, 'EventType': 'FXEvent', 'ccy': 'AUZ', 'rate': 1.5}
+            for event_id in range(1, 6)
+        ]
+        self.session = mock.Mock()
+
+    def test_replays_single_events(self):
+        self.session.post.return_value = mock.Mock(status_code=204)
+        stats = replay(self.events, server_url='http://server', session=self.session)
+        self.assertEqual(stats['events'], 5)
+        self.assertEqual(stats['requests'], 5)
+        self.assertEqual(stats['failed_events'], 0)
+        self.assertCountEqual(
+            [call.kwargs['data'] for call in self.session.post.call_args_list], self.events
+        )
+        self.session.post.assert_called_with('http://server/api/events/', data=mock.ANY)
+
+    def test_replays_batches(self):
+        response = mock.Mock(status_code=200)
+        response.json.return_value = [{'status': 'applied'}, {'status': 'applied'}]
+        self.session.post.return_value = response
+        stats = replay(self.events[:4], batch_size=2, concurrency=1, session=self.session)
+        self.assertEqual(stats['requests'], 2)
+        self.assertEqual(stats['failed_events'], 0)
+        url = self.session.post.call_args.args[0]
+        self.assertTrue(url.endswith('/api/events/batch/'))
+        body = self.session.post.call_args.kwargs['data']
+        self.assertListEqual([json.loads(line) for line in body.splitlines()], self.events[2:4])
+
+    def test_resends_events_not_accepted(self):
+        rejected = mock.Mock(status_code=200)
+        rejected.json.return_value = [
+            {'status': 'applied'}, {'status': 'rejected'}, {'status': 'error'}
+        ]
+        busy = mock.Mock(status_code=503, headers={'Retry-After': '0.01'})
+        accepted = mock.Mock(status_code=200)
+        accepted.json.return_value = [{'status': 'applied'}, {'status': 'applied'}]
+        self.session.post.side_effect = [rejected, busy, accepted]
+        stats = replay(
+            self.events[:3], batch_size=3, concurrency=1, session=self.session, backoff=0
+        )
+        self.assertEqual(stats['events'], 3)
+        self.assertEqual(stats['requests'], 3)
+        self.assertEqual(stats['retried_events'], 4)
+        self.assertEqual(stats['failed_events'], 0)
+        body = self.session.post.call_args.kwargs['data']
+        self.assertListEqual([json.loads(line) for line in body.splitlines()], self.events[1:3])
+
+    def test_gives_up_events_after_max_attempts(self):
+        self.session.post.return_value = mock.Mock(status_code=503, headers={})
+        stats = replay(
+            self.events[:1], concurrency=1, session=self.session, max_attempts=3, backoff=0
+        )
+        self.assertEqual(stats['requests'], 3)
+        self.assertEqual(stats['failed_events'], 1)
+
+    def test_does_not_resend_invalid_events(self):
+        self.session.post.return_value = mock.Mock(status_code=400, headers={})
+        stats = replay(self.events[:1], concurrency=1, session=self.session, backoff=0)
+        self.assertEqual(stats['requests'], 1)
+        self.assertEqual(stats['failed_events'], 1)
+
+    def test_replays_at_target_rate(self):
+        self.session.post.return_value = mock.Mock(status_code=204)
+        stats = replay(self.events, rate=100, session=self.session)
+        # Last event is sent 4 intervals after the first
+        self.assertGreaterEqual(stats['seconds'], 0.04)
+
+    def test_reports_latency_percentiles(self):
+        stats = ReplayStats()
+        for latency in range(1, 101):
+            stats.record(events=1, latency=latency / 1000, failed_events=0, failed=False)
+        report = stats.report()
+        self.assertEqual(report['latency_p50_ms'], 50)
+        self.assertEqual(report['latency_p99_ms'], 99)
+        self.assertEqual(report['latency_max_ms'], 100)
+
+
 # FIXME: This test is not working.
 class SchedulerTestCase(LiveServerTestCase):
     """Requires changing TEST_URL to point to localhost:8001"""
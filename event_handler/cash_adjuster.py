@@ -2,37 +2,90 @@
 
 from decimal import Decimal
 from locale import currency
+from typing import Any, Dict, List, Set, Type
 
-from django.db import IntegrityError
+from django.db import connection, models
 
 from api.models import (
     FX, Bond, Desk, Trader, Book, BondRecord,
-    EventLog, EventExceptionLog, FxEventLog, PriceEventLog,
+    EventLog, EventExceptionLog, FxEventLog, PriceEventLog, StateCheckpoint,
 )
-from util.common_types import TradeEvent
+from util.common_types import MarketEvent, TradeEvent
+from util.money import Money, TradeValue
 from util.trade_exceptions import TradeException
 from util.singleton import Singleton
+from .portfolio_state import PortfolioState
 
 class CashAdjuster(metaclass=Singleton):
     """Cash Adjuster class that handles cash adjustment and logging of events.
     Singleton implementation so the API functions work like static methods.
+
+    Changes are made to the in-memory `PortfolioState` first,
+    then queued and written behind to DB with bulk queries by `flush()`.
     """
+    # Models in the order they are inserted, so that foreign keys refer to existing entries
+    _INSERT_ORDER: List[Type[models.Model]] = [
+        Trader, Book, BondRecord, EventLog, EventExceptionLog, FxEventLog, PriceEventLog,
+        StateCheckpoint,
+    ]
+
+    # Models of logs, where duplicate entries are ignored
+    _LOG_MODELS: List[Type[models.Model]] = [
+        EventLog, EventExceptionLog, FxEventLog, PriceEventLog, StateCheckpoint,
+    ]
+
+    # Maps model to new instances to insert, keyed by id() so each is inserted once
+    _inserts: Dict[Type[models.Model], Dict[int, models.Model]] = {}
+
+    # Maps model to changed instances to update, keyed by primary key
+    _updates: Dict[Type[models.Model], Dict[Any, models.Model]] = {}
+
+    # Maps model to fields to update
+    _update_fields: Dict[Type[models.Model], Set[str]] = {}
+
     def __init__(self):
         pass
 
-    def _adjust_cash(self, value: Decimal, desk: Desk, event: TradeEvent) -> None:
+    def _save(self, instance: models.Model, update_fields: List[str]) -> None:
+        """Helper function to queue an in-memory model instance to be written to DB,
+        inserting it if it has never been saved.
+        """
+        model = type(instance)
+        if instance._state.adding:
+            self._inserts.setdefault(model, {})[id(instance)] = instance
+        elif update_fields:
+            self._updates.setdefault(model, {})[instance.pk] = instance
+            self._update_fields.setdefault(model, set()).update(update_fields)
+
+    def _fetch_bond_record_ids(self, bond_records: List[BondRecord]) -> None:
+        """Helper function to set IDs of inserted bond records,
+        for DBs that do not return them from bulk inserts.
+        """
+        keys = {
+            (record.trader_id, record.book_id, record.bond_id): record
+            for record in bond_records
+        }
+        inserted = BondRecord.objects.filter(
+            trader__in={record.trader_id for record in bond_records}
+        ).values_list('trader_id', 'book_id', 'bond_id', 'id')
+        for trader_id, book_id, bond_id, record_id in inserted:
+            if (trader_id, book_id, bond_id) in keys:
+                keys[(trader_id, book_id, bond_id)].id = record_id
+
+    def _adjust_cash(self, value: TradeValue, desk: Desk, event: TradeEvent) -> None:
+        state = PortfolioState()
         if event['BuySell'] == 'buy':
-            desk.cash -= value
+            state.set_cash(desk.desk_id, value.subtract_from(state.get_cash(desk.desk_id)))
         elif event['BuySell'] == 'sell':
-            desk.cash += value
-        desk.save()
+            state.set_cash(desk.desk_id, value.add_to(state.get_cash(desk.desk_id)))
+        self._save(desk, update_fields=['cash'])
 
     def _adjust_position(self, event: TradeEvent, bond_record: BondRecord) -> None:
         if event['BuySell'] == 'buy':
             bond_record.position += int(event['Quantity'])
         elif event['BuySell'] == 'sell':
             bond_record.position -= int(event['Quantity'])
-        bond_record.save()
+        self._save(bond_record, update_fields=['position'])
 
     def _log_exception(
         self,
@@ -43,9 +96,9 @@ class CashAdjuster(metaclass=Singleton):
         bond: Bond,
         exclusion_type: str,
     ) -> None:
-        """Log excluded event by creating an entry in DB table `EventExceptionLog`."""
-        try :
-            EventExceptionLog.objects.create(
+        """Log excluded event by queueing an entry for DB table `EventExceptionLog`."""
+        self._save(
+            EventExceptionLog(
                 event_id=int(event['EventID']),
                 desk=desk,
                 trader=trader,
@@ -55,17 +108,15 @@ class CashAdjuster(metaclass=Singleton):
                 bond=bond,
                 price=bond.price,  # None if bond does not have a price
                 exclusion_type=exclusion_type,
-            )
-        except IntegrityError:
-            # TODO: Implement handling of duplicate entries
-            pass
-
+            ),
+            update_fields=[],
+        )
 
 
     def _log_successful_trade_event(
         self,
         event: TradeEvent,
-        trade_value: Decimal,
+        trade_value: Money,
         desk: Desk,
         trader: Trader,
         book: Book,
@@ -73,9 +124,9 @@ class CashAdjuster(metaclass=Singleton):
         bond_record: BondRecord,
         fx: FX,
     ) -> None:
-        """Log event by creating an entry in DB table `EventLog`."""
-        try:
-            EventLog.objects.create(
+        """Log event by queueing an entry for DB table `EventLog`."""
+        self._save(
+            EventLog(
                 event_id=int(event['EventID']),
                 desk=desk,
                 trader=trader,
@@ -86,33 +137,30 @@ class CashAdjuster(metaclass=Singleton):
                 position=bond_record.position,
                 price=bond.price,
                 fx_rate=fx.rate,
-                value=trade_value,
+                value=trade_value.to_decimal(),
                 cash=desk.cash,
-            )
-        except IntegrityError:
-            # TODO: Implement handling of duplicate entries
-            pass
+            ),
+            update_fields=[],
+        )
 
     def _process_log_event(
         self,
         event: TradeEvent,
-        trade_value: Decimal = None,
+        trade_value: Money = None,
         exception: TradeException = None,
     ) -> None:
-        """Helper function to first get necessary model entries,
+        """Helper function to first get necessary model entries from memory,
         then log the trade events.
         """
-        bond: Bond = Bond.objects.get(bond_id=event['BondID'])
+        state = PortfolioState()
+        bond: Bond = state.get_bond(event['BondID'])
         fx: FX = bond.currency
-        desk: Desk = Desk.objects.get(desk_id=event['Desk'])
-        trader: Trader = Trader.objects.get_or_create(
-            trader_id=event['Trader'],
-            desk=desk
-        )[0]
-        book: Book = Book.objects.get_or_create(
-            book_id=event['Book'],
-            trader=trader
-        )[0]
+        desk: Desk = state.get_desk(event['Desk'])
+        trader: Trader = state.get_or_create_trader(event['Trader'], desk=desk)
+        book: Book = state.get_or_create_book(event['Book'], trader=trader)
+        # Inserts trader and book if they are new, otherwise nothing to update
+        self._save(trader, update_fields=[])
+        self._save(book, update_fields=[])
 
         # Logging exception first to reduce the number of database queries
         if exception:
@@ -126,11 +174,11 @@ class CashAdjuster(metaclass=Singleton):
             )
             return
 
-        bond_record: BondRecord = BondRecord.objects.get_or_create(
+        bond_record: BondRecord = state.get_or_create_bond_record(
             trader=trader,
             book=book,
             bond=bond,
-        )[0]
+        )
         self._adjust_position(event=event, bond_record=bond_record)
 
         if trade_value:
@@ -145,30 +193,75 @@ class CashAdjuster(metaclass=Singleton):
                 fx=fx,
             )
 
-    def adjust_cash_and_log_event(self, event: TradeEvent, value: Decimal) -> None:
-        """API function to adjust cash and log the event."""
+    def adjust_cash_and_log_event(self, event: TradeEvent, value: TradeValue) -> None:
+        """API function to adjust cash by the exact trade value, and log the event
+        with the value rounded.
+        """
         self._adjust_cash(
             value=value,
-            desk=Desk.objects.get(desk_id=event['Desk']),
+            desk=PortfolioState().get_desk(event['Desk']),
             event=event,
         )
-        self._process_log_event(event=event, trade_value=value)
+        self._process_log_event(event=event, trade_value=value.rounded())
 
     def log_event_with_exception(self, event: TradeEvent, exception: TradeException) -> None:
         """API function to log event with an exception."""
         self._process_log_event(event=event, exception=exception)
     
-    def log_market_event(self, event: TradeEvent) -> None:
-        """API function to log market event."""
+    def log_market_event(self, event: MarketEvent) -> None:
+        """API function to queue market data change in memory to be written to DB,
+        and log market event.
+        """
+        state = PortfolioState()
         if event['EventType'] == 'FXEvent':
-            FxEventLog.objects.create(
-                event_id=int(event['EventID']),
-                currency=FX.objects.get(currency_id=event['ccy']),
-                rate=Decimal(event['rate']),
+            fx: FX = state.get_fx(event['ccy'])
+            self._save(fx, update_fields=['rate'])
+            self._save(
+                FxEventLog(
+                    event_id=int(event['EventID']),
+                    currency=fx,
+                    rate=Decimal(event['rate']),
+                ),
+                update_fields=[],
             )
         elif event['EventType'] == 'PriceEvent':
-            PriceEventLog.objects.create(
-                event_id=int(event['EventID']),
-                bond=Bond.objects.get(bond_id=event['BondID']),
-                price=Decimal(event['MarketPrice']),
+            bond: Bond = state.get_bond(event['BondID'])
+            self._save(bond, update_fields=['price', 'initial_price'])
+            self._save(
+                PriceEventLog(
+                    event_id=int(event['EventID']),
+                    bond=bond,
+                    price=Decimal(event['MarketPrice']),
+                ),
+                update_fields=[],
             )
+
+    def log_checkpoint(self, checkpoint: StateCheckpoint) -> None:
+        """API function to queue a checkpoint of the portfolio to be written to DB."""
+        self._save(checkpoint, update_fields=[])
+
+    def flush(self) -> None:
+        """API function to write all queued changes to DB with bulk queries.
+        Should be called within the transaction that applies the events.
+        """
+        for model in self._INSERT_ORDER:
+            instances = list(self._inserts.get(model, {}).values())
+            if not instances:
+                continue
+            model.objects.bulk_create(
+                instances, ignore_conflicts=model in self._LOG_MODELS
+            )
+            if model is BondRecord and not connection.features.can_return_rows_from_bulk_insert:
+                self._fetch_bond_record_ids(instances)
+
+        for model, instances in self._updates.items():
+            model.objects.bulk_update(
+                instances.values(), fields=sorted(self._update_fields[model])
+            )
+        self.discard()
+
+    def discard(self) -> None:
+        """API function to drop all queued changes, e.g. after a rollback."""
+        self._inserts = {}
+        self._updates = {}
+        self._update_fields = {}
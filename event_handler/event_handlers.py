@@ -1,100 +1,144 @@
 """Module to process new events."""
 
+from contextlib import contextmanager
 from decimal import Decimal
-import heapq
-from typing import Callable, Dict, List, Tuple
+import logging
+import threading
+from typing import Callable, Dict, Iterator, List, Union
 
-from django.db.models import QuerySet
+from django.conf import settings
+from django.db import transaction
 
-from api.models import FX, Bond, Desk, BondRecord, FxEventLog, PriceEventLog
-from util.common_types import Event, TradeEvent, PriceEvent, FXEvent
+from api.models import Bond, BondRecord
+from util.common_types import Event, EventOutcome, TradeEvent, PriceEvent, FXEvent
+from util.money import Money, TradeValue
 from util.trade_exceptions import (
+    TradeException,
     NoMarketPriceException,
     CashOverlimitException,
     QuantityOverlimitException,
 )
 from util.singleton import Singleton
 from .cash_adjuster import CashAdjuster
-from util import common_fns
+from .event_sequencer import EventSequencer
+from .live_aggregates import LiveAggregates
+from .portfolio_state import PortfolioState
+from .reorder_buffer import ReorderBuffer
+from .signals import event_applied
+
+logger = logging.getLogger(__name__)
 
 
 class EventHandler(metaclass=Singleton):
     """Class to handle events."""
-    _queue: List[Tuple[int, Event]] = []
+    # Events received ahead of the next expected event
+    _queue: ReorderBuffer = ReorderBuffer()
+
+    # Events are handled one request at a time, as states are shared
+    _lock = threading.RLock()
+    _in_unit_of_work: bool = False
 
     def __init__(self):
-        heapq.heapify(self._queue)
+        pass
 
     def _process_fx_event(self, event: FXEvent) -> None:
         """Helper function to process FX event."""
-        fx: FX = FX.objects.get(currency_id=event['ccy'])
-        fx.rate = Decimal(event['rate'])
-        if fx.rate.compare(Decimal(0)) < 0:
-            raise ValueError(f'FX rate is negative: {fx.rate}')
-        fx.save()
+        rate = Decimal(event['rate'])
+        if rate.compare(Decimal(0)) < 0:
+            raise ValueError(f'FX rate is negative: {rate}')
+        PortfolioState().update_fx_rate(event['ccy'], rate)
+        LiveAggregates().apply_fx_change(event['ccy'])
         CashAdjuster().log_market_event(event=event)
 
     def _process_price_event(self, event: PriceEvent) -> None:
         """Helper function to process price event."""
-        bond: Bond = Bond.objects.get(bond_id=event['BondID'])
-        bond.price = Decimal(event['MarketPrice'])
-        if bond.price.compare(Decimal(0)) < 0:
-            raise ValueError(f'Bond price is negative: {bond.price}')
-        if bond.initial_price is None:
-            bond.initial_price = bond.price
-        bond.save()
+        price = Decimal(event['MarketPrice'])
+        if price.compare(Decimal(0)) < 0:
+            raise ValueError(f'Bond price is negative: {price}')
+        PortfolioState().update_bond_price(event['BondID'], price)
+        LiveAggregates().apply_price_change(event['BondID'])
         CashAdjuster().log_market_event(event=event)
 
-    def _process_trade_event(self, event: TradeEvent) -> None:
-        """Helper function to process trade event."""
+    def _process_trade_event(self, event: TradeEvent) -> Union[TradeException, None]:
+        """Helper function to process trade event.
+        Returns the exception if the trade is excluded.
+        """
+        if int(event['Quantity']) < 0:
+            raise ValueError(f'Quantity is negative: {event["Quantity"]}')
         if event['BuySell'] == 'buy':
             try:
                 self._process_buy(event)
             except (CashOverlimitException, NoMarketPriceException) as e:
                 CashAdjuster().log_event_with_exception(event, exception=e)
+                return e
         elif event['BuySell'] == 'sell':
             try:
                 self._process_sell(event)
             except QuantityOverlimitException as e:
                 CashAdjuster().log_event_with_exception(event, exception=e)
+                return e
         else:
             raise ValueError(f'Unknown buy/sell: {event["BuySell"]}')
+        self._update_aggregates(event)
+        return None
+
+    def _update_aggregates(self, event: TradeEvent) -> None:
+        """Helper function to apply successful trade to live aggregates."""
+        bond_record: BondRecord = PortfolioState().get_bond_record(
+            trader_id=event['Trader'],
+            book_id=event['Book'],
+            bond_id=event['BondID'],
+        )
+        quantity = int(event['Quantity'])
+        LiveAggregates().apply_trade(
+            desk_id=bond_record.trader.desk_id,
+            trader_id=bond_record.trader_id,
+            book_id=bond_record.book_id,
+            bond_id=bond_record.bond_id,
+            quantity=quantity if event['BuySell'] == 'buy' else -quantity,
+        )
 
     def _process_buy(self, event: TradeEvent) -> None:
-        bond: Bond = Bond.objects.get(bond_id=event['BondID'])
-        if not bond.price:
+        """Helper function to process buy event. Checks are done against memory."""
+        state = PortfolioState()
+        price: Money = state.get_price(event['BondID'])
+        if not price:
             raise NoMarketPriceException(int(event['EventID']))
 
-        fx: FX = bond.currency
-        desk: Desk = Desk.objects.get(desk_id=event['Desk'])
-        cash_required = Decimal(event['Quantity']) * bond.price / fx.rate
-        if desk.cash.compare(cash_required) < 0:
+        rate: Money = state.get_rate(state.get_bond(event['BondID']).currency_id)
+        cash_required = TradeValue(event['Quantity'], price, rate)
+        if cash_required.exceeds(state.get_cash(event['Desk'])):
             raise CashOverlimitException(event['EventID'])
 
         CashAdjuster().adjust_cash_and_log_event(value=cash_required, event=event)
 
     def _process_sell(self, event: TradeEvent) -> None:
-        """Helper function to process sell event."""
-        bond_records: QuerySet = BondRecord.objects.filter(
-            trader=event['Trader'],
-            book=event['Book'],
-            bond=event['BondID'],
+        """Helper function to process sell event. Checks are done against memory."""
+        state = PortfolioState()
+        bond_record: BondRecord = state.get_bond_record(
+            trader_id=event['Trader'],
+            book_id=event['Book'],
+            bond_id=event['BondID'],
         )
-        if not bond_records.exists():
+        if bond_record is None:
             raise QuantityOverlimitException(event['EventID'])
-        bond_record: BondRecord = bond_records[0]
-        if bond_record.position < Decimal(event['Quantity']):
+        if bond_record.position < int(event['Quantity']):
             raise QuantityOverlimitException(event['EventID'])
 
-        bond: Bond = Bond.objects.get(bond_id=event['BondID'])
-        fx: FX = bond.currency
-        trade_value = Decimal(event['Quantity']) * bond.price / fx.rate
+        bond: Bond = state.get_bond(event['BondID'])
+        trade_value = TradeValue(
+            event['Quantity'], state.get_price(bond.bond_id), state.get_rate(bond.currency_id)
+        )
 
         CashAdjuster().adjust_cash_and_log_event(value=trade_value, event=event)
 
-    def _process_event(self, event: Event) -> None:
+    def _process_event(self, event: Event) -> Union[TradeException, None]:
         """Helper function to process event according to event type.
         Called only after the event sequence has been validated.
+        Returns the exception if the event is an excluded trade.
+
+        All checks that raise are done before any change is made,
+        so an event that raises leaves no changes behind.
         """
         event_to_function_map: Dict[str, Callable] = {
             'FXEvent': self._process_fx_event,
@@ -102,30 +146,190 @@ class EventHandler(metaclass=Singleton):
             'TradeEvent': self._process_trade_event,
         }
         if event['EventType'] in event_to_function_map:
-            event_to_function_map[event['EventType']](event)
+            return event_to_function_map[event['EventType']](event)
         else:
             raise ValueError(f'Unknown event: {event}')
 
-    def _validate_event_sequence(self, event: Event) -> None:
-        if int(event['EventID']) ==  common_fns.get_largest_event_id() + 1:
-            self._process_event(event)
-        else:
-            heapq.heappush(self._queue, (int(event['EventID']), event))
+    @contextmanager
+    def _unit_of_work(self) -> Iterator[None]:
+        """Context manager to apply events as one atomic unit of work.
+        Changes are made in memory first, then written to DB with bulk queries,
+        in one transaction when the outermost unit of work ends.
+        If anything fails, DB is rolled back and in-memory states are reloaded from DB.
+        Signal `event_applied` is sent once the events are committed.
+        """
+        if self._in_unit_of_work:
+            yield
+            return
+
+        sequencer = EventSequencer()
+        start_event_id = sequencer.last_event_id
+        self._in_unit_of_work = True
+        try:
+            with transaction.atomic():
+                yield
+                CashAdjuster().flush()
+                self._queue.flush()
+                sequencer.persist()
+        except Exception:
+            CashAdjuster().discard()
+            self._queue.discard()
+            sequencer.recover()
+            PortfolioState().invalidate()
+            LiveAggregates().invalidate()
+            raise
+        finally:
+            self._in_unit_of_work = False
+
+        if sequencer.last_event_id != start_event_id:
+            # Receivers must not fail the request, as events are already committed
+            event_applied.send_robust(sender=self.__class__, event_id=sequencer.last_event_id)
+
+    def _apply_event(self, event: Event) -> EventOutcome:
+        """Helper function to process event and set it as the latest applied event.
+        Called only within a unit of work.
+        """
+        exception = self._process_event(event)
+        event_id = int(event['EventID'])
+        EventSequencer().advance(event_id)
+        if event_id % settings.CHECKPOINT_INTERVAL == 0:
+            CashAdjuster().log_checkpoint(PortfolioState().to_checkpoint(event_id))
+
+        if exception:
+            return {
+                'event_id': event_id,
+                'status': 'excluded',
+                'exclusion_type': exception.name,
+            }
+        return {'event_id': event_id, 'status': 'applied'}
 
-    def _validate_queue(self) -> None:
-        """Helper function to process first event in queue."""
-        if len(self._queue) > 0:
-            while len(self._queue) > 0 and self._queue[0][0] <= common_fns.get_largest_event_id():
-                # Pop and discard old events that could be sent in from duplicate requests
-                heapq.heappop(self._queue)
-        if len(self._queue) > 0:
-            while len(self._queue) > 0 and self._queue[0][0] == common_fns.get_largest_event_id() + 1:
-                event_id, event = heapq.heappop(self._queue)
-                self._process_event(event)
+    def _validate_event_sequence(self, event: Event) -> EventOutcome:
+        event_id = int(event['EventID'])
+        if event_id <= EventSequencer().last_event_id:
+            # Old event that could be sent in from duplicate requests
+            return {'event_id': event_id, 'status': 'duplicate'}
+        if EventSequencer().is_next(event_id):
+            return self._apply_event(event)
+        if event_id in self._queue:
+            return {'event_id': event_id, 'status': 'queued'}
+        if self._queue.is_full() and settings.REORDER_GAP_POLICY != 'skip':
+            # Producer should send the missing events, then send this event again
+            return {'event_id': event_id, 'status': 'rejected'}
+        self._queue.push(event_id, event)
+        return {'event_id': event_id, 'status': 'queued'}
 
-    def handle_event(self, event: Event) -> None:
-        """API function to handle event."""
-        self._validate_event_sequence(event)
-        self._validate_queue()
+    def _validate_queue(self, outcomes: List[EventOutcome]) -> None:
+        """Helper function to process events in queue that are next in sequence.
+        Each run of consecutive events is taken from the queue at once,
+        and missing events are skipped if the gap policy of the queue says so.
+        Outcomes are appended to `outcomes` as events are applied, so they are kept if
+        a later event raises. The error outcome of the failed event is appended before
+        its error is raised.
+        """
+        sequencer = EventSequencer()
+        while True:
+            run = self._queue.pop_contiguous(sequencer.last_event_id + 1)
+            if not run:
+                last_missing_id = self._queue.resolve_gap(sequencer.last_event_id + 1)
+                if last_missing_id is None:
+                    return
+                sequencer.advance(last_missing_id)
+                continue
+            for index, (event_id, event) in enumerate(run):
+                try:
+                    outcomes.append(self._apply_event(event))
+                except Exception as e:
+                    # Failed event is dropped, events after it wait in the queue again
+                    logger.error('Dropping queued event %d: %s', event_id, e)
+                    outcomes.append({'event_id': event_id, 'status': 'error', 'error': str(e)})
+                    for later_event_id, later_event in run[index + 1:]:
+                        self._queue.push(later_event_id, later_event)
+                    raise
+
+    def handle_event(self, event: Event) -> List[EventOutcome]:
+        """API function to handle event.
+        `event` and any queued events applied after it are written to DB in one transaction.
+        Returns outcomes of `event` and the queued events.
+        A queued event that raises an error is dropped and has status `error`,
+        so that it does not fail `event` and the events applied before it.
+        """
+        with self._lock, self._unit_of_work():
+            outcomes: List[EventOutcome] = [self._validate_event_sequence(event)]
+            try:
+                self._validate_queue(outcomes)
+            except Exception:  # pylint: disable=broad-except
+                # Error of the failed event is the last of `outcomes`
+                pass
+        return outcomes
+
+    def handle_events(self, events: List[Event]) -> List[EventOutcome]:
+        """API function to handle a batch of events in one transaction.
+        Events may be in any order, and are sequenced together with queued events.
+        Returns the final outcome of each event in `events`, in the same order.
+        An event that raises an error is skipped and has status `error`.
+        """
+        outcomes: List[EventOutcome] = []
+        queued: Dict[int, int] = {}  # Maps ID of queued event to its index in `outcomes`
+
+        def resolve(outcome: EventOutcome) -> None:
+            # Queued events from earlier requests are not reported
+            if outcome['event_id'] in queued:
+                outcomes[queued.pop(outcome['event_id'])] = outcome
+
+        with self._lock, self._unit_of_work():
+            for event in events:
+                event_id = int(event['EventID'])
+                try:
+                    outcome = self._validate_event_sequence(event)
+                except Exception as e:  # pylint: disable=broad-except
+                    outcome = {'event_id': event_id, 'status': 'error', 'error': str(e)}
+                if outcome['status'] == 'queued':
+                    queued[event_id] = len(outcomes)
+                outcomes.append(outcome)
 
+                queue_outcomes: List[EventOutcome] = []
+                try:
+                    self._validate_queue(queue_outcomes)
+                except Exception:  # pylint: disable=broad-except
+                    # Failed event is skipped, its error is the last of `queue_outcomes`
+                    pass
+                for outcome in queue_outcomes:
+                    resolve(outcome)
+        return outcomes
 
+    def get_latest_event_id(self) -> int:
+        """API function to get ID of the latest applied event."""
+        return EventSequencer().last_event_id
+
+    def get_queue_stats(self) -> Dict:
+        """API function to get size and oldest wait of the queue of events received out of order."""
+        with self._lock:
+            return self._queue.get_stats()
+
+    def get_position_level_data(self) -> List[Dict]:
+        """API function to get live position and NV by desk, trader and book,
+        as of the latest committed event.
+        """
+        with self._lock:
+            return LiveAggregates().get_position_level_data()
+
+    def get_currency_level_data(self) -> List[Dict]:
+        """API function to get live position and NV by desk and currency,
+        as of the latest committed event.
+        """
+        with self._lock:
+            return LiveAggregates().get_currency_level_data()
+
+    def get_live_data(self) -> Dict:
+        """API function to get all levels of the live portfolio from memory,
+        as of the latest committed event `event_id`.
+        """
+        with self._lock:
+            aggregates = LiveAggregates()
+            return {
+                'event_id': EventSequencer().last_event_id,
+                'cash': aggregates.get_cash_level_data(),
+                'position': aggregates.get_position_level_data(),
+                'bond': aggregates.get_bond_level_data(),
+                'currency': aggregates.get_currency_level_data(),
+            }
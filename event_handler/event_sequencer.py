@@ -0,0 +1,64 @@
+"""Module to keep track of the latest applied event."""
+
+from api.models import EventSequence
+from util.singleton import Singleton
+from util import common_fns
+
+
+class EventSequencer(metaclass=Singleton):
+    """Class holding the high-water-mark of applied events in memory.
+    The ID is recovered from DB once on first use, and persisted in the same
+    transaction as the applied events so that DB and memory agree after every commit.
+    """
+    _last_event_id: int = None
+    _persisted_event_id: int = None
+
+    def __init__(self):
+        pass
+
+    def get_persisted_event_id(self) -> int:
+        """Read the latest applied event ID committed to DB, without changing memory."""
+        sequence: EventSequence = EventSequence.objects.filter(
+            id=EventSequence.SEQUENCE_ID
+        ).first()
+        if sequence is not None:
+            return sequence.last_event_id
+        # DB has not stored a sequence yet, fall back to scanning the logs once
+        return common_fns.get_largest_event_id()
+
+    def recover(self) -> int:
+        """Reload the latest applied event ID from DB and return it."""
+        self._last_event_id = self.get_persisted_event_id()
+        self._persisted_event_id = self._last_event_id
+        return self._last_event_id
+
+    @property
+    def last_event_id(self) -> int:
+        """ID of the latest applied event."""
+        if self._last_event_id is None:
+            self.recover()
+        return self._last_event_id
+
+    def is_next(self, event_id: int) -> bool:
+        """Check if `event_id` is the next event to be applied."""
+        return event_id == self.last_event_id + 1
+
+    def advance(self, event_id: int) -> None:
+        """Set `event_id` as the latest applied event in memory.
+        Should be followed by `persist()` within the transaction that applies the event,
+        or by `recover()` if that transaction is rolled back.
+        """
+        self._last_event_id = event_id
+
+    def persist(self) -> None:
+        """Write the latest applied event ID to DB, if it has changed."""
+        if self.last_event_id == self._persisted_event_id:
+            return
+        updated = EventSequence.objects.filter(
+            id=EventSequence.SEQUENCE_ID
+        ).update(last_event_id=self.last_event_id)
+        if not updated:
+            EventSequence.objects.create(
+                id=EventSequence.SEQUENCE_ID, last_event_id=self.last_event_id
+            )
+        self._persisted_event_id = self.last_event_id
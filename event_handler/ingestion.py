@@ -0,0 +1,210 @@
+"""Module to apply events in the background, after they are received."""
+
+import logging
+import queue
+import threading
+import time
+from typing import Dict, List, Tuple, Union
+
+from django.conf import settings
+from django.db import close_old_connections
+
+from util.common_types import Event, EventOutcome
+from util.singleton import Singleton
+from .event_handlers import EventHandler
+
+logger = logging.getLogger(__name__)
+
+
+class IngestionQueue(metaclass=Singleton):
+    """Bounded in-process queue of received events,
+    drained in order by a single background applier thread.
+    Requests only validate and enqueue events, so that slow DB writes do not block producers.
+    Events are applied in batches with `EventHandler.handle_events`, which sequences them.
+    """
+
+    def __init__(self):
+        self._thread: Union[threading.Thread, None] = None
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        """Discard queued events and metrics, and apply settings again.
+        Should only be called while the applier thread is not running, e.g. in tests.
+        """
+        # Queue of (time received, event)
+        self._queue: 'queue.Queue[Tuple[float, Event]]' = queue.Queue(
+            maxsize=settings.INGESTION_QUEUE_SIZE
+        )
+        self._batch_size: int = settings.INGESTION_BATCH_SIZE
+        # Maps ID to event rejected while the reorder buffer was full, retried once it drains.
+        # Counted with the queue against its capacity, as producers were already answered
+        self._held: Dict[int, Event] = {}
+
+        # Metrics
+        self._received: int = 0
+        self._rejected: int = 0
+        # Maps status of event outcome to number of events, see `EventHandler.handle_events`
+        self._outcomes: Dict[str, int] = {}
+        self._last_error: Union[str, None] = None
+        self._last_received_id: int = 0
+        self._oldest_received_at: Union[float, None] = None
+
+    def start(self) -> None:
+        """Start the applier thread if it is not running."""
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(
+                    target=self._run, name='event-applier', daemon=True
+                )
+                self._thread.start()
+
+    def submit(self, event: Event) -> bool:
+        """Enqueue a validated event to be applied.
+        Returns False without enqueueing if the queue, with the held events, is full.
+        """
+        try:
+            with self._lock:
+                if self._queue.qsize() + len(self._held) >= self._queue.maxsize:
+                    raise queue.Full
+            self._queue.put_nowait((time.monotonic(), event))
+        except queue.Full:
+            with self._lock:
+                self._rejected += 1
+            return False
+        with self._lock:
+            self._received += 1
+            self._last_received_id = max(self._last_received_id, int(event['EventID']))
+        return True
+
+    def _take_batch(self, block: bool) -> List[Tuple[float, Event]]:
+        """Helper function to take up to a batch of events in the order they were received."""
+        batch: List[Tuple[float, Event]] = []
+        try:
+            batch.append(self._queue.get(block=block))
+            while len(batch) < self._batch_size:
+                batch.append(self._queue.get_nowait())
+        except queue.Empty:
+            pass
+        return batch
+
+    def _handle_with_retries(self, events: List[Event]) -> List[EventOutcome]:
+        """Helper function to apply events in one unit of work, retried with backoff
+        if it fails as a whole, e.g. while DB is locked. Raises the error of the last try.
+        """
+        delay = settings.INGESTION_RETRY_BACKOFF
+        for _ in range(settings.INGESTION_RETRIES):
+            try:
+                return EventHandler().handle_events(events)
+            except Exception as e:  # pylint: disable=broad-except
+                logger.warning(
+                    'Applying %d events failed, retrying in %.2fs: %s', len(events), delay, e
+                )
+            time.sleep(delay)
+            delay *= 2
+        return EventHandler().handle_events(events)
+
+    def _apply_events(self, events: List[Event]) -> List[EventOutcome]:
+        """Helper function to apply events in one unit of work.
+        If they keep failing as a whole, they are applied one by one in order,
+        so that only events that keep failing alone are dropped.
+        """
+        try:
+            return self._handle_with_retries(events)
+        except Exception:  # pylint: disable=broad-except
+            outcomes: List[EventOutcome] = []
+            for event in events:
+                try:
+                    outcomes.extend(self._handle_with_retries([event]))
+                except Exception as e:  # pylint: disable=broad-except
+                    logger.exception('Dropping event %s after retries: %s', event, e)
+                    outcomes.append(
+                        {'event_id': int(event['EventID']), 'status': 'error', 'error': str(e)}
+                    )
+            return outcomes
+
+    def _apply_batch(self, batch: List[Tuple[float, Event]]) -> None:
+        """Helper function to apply a batch of events, after the held events.
+        Events rejected as the reorder buffer is full are held, and retried with the next batch,
+        or at once while the latest applied event advances, as it drains the buffer.
+        """
+        with self._lock:
+            self._oldest_received_at = batch[0][0]
+        events = [event for _, event in batch]
+        while True:
+            with self._lock:
+                held = [self._held.pop(event_id) for event_id in sorted(self._held)]
+            latest_event_id = EventHandler().get_latest_event_id()
+            all_events = held + events
+            outcomes = self._apply_events(all_events)
+            advanced = EventHandler().get_latest_event_id() != latest_event_id
+            with self._lock:
+                for event, outcome in zip(all_events, outcomes):
+                    if outcome['status'] == 'rejected':
+                        self._held[outcome['event_id']] = event
+                        continue
+                    self._outcomes[outcome['status']] = (
+                        self._outcomes.get(outcome['status'], 0) + 1
+                    )
+                    if outcome['status'] == 'error':
+                        self._last_error = f'Event {outcome["event_id"]}: {outcome["error"]}'
+                retry = bool(self._held) and advanced
+            if not retry:
+                break
+            events = []
+        with self._lock:
+            self._oldest_received_at = None
+        for _ in batch:
+            self._queue.task_done()
+
+    def _run(self) -> None:
+        while True:
+            batch = self._take_batch(block=True)
+            close_old_connections()
+            self._apply_batch(batch)
+
+    def apply_pending(self) -> None:
+        """Apply all queued events in the calling thread, e.g. when the applier is not running."""
+        batch = self._take_batch(block=False)
+        while batch:
+            self._apply_batch(batch)
+            batch = self._take_batch(block=False)
+
+    def join(self) -> None:
+        """Block until all received events have been applied."""
+        self._queue.join()
+
+    def get_metrics(self) -> Dict:
+        """Get metrics of the queue.
+        `lag_seconds` is how long the oldest event waiting or being applied has waited.
+        `lag_events` is the number of received events after the latest applied event.
+        `outcomes` counts events by status when they were applied, where `queued` events
+        were waiting for an earlier event, and are counted again once applied.
+        `held` is the number of events rejected while the reorder buffer was full,
+        which are retried once it drains.
+        """
+        latest_event_id = EventHandler().get_latest_event_id()
+        reorder_buffer = EventHandler().get_queue_stats()
+        with self._lock:
+            oldest_received_at = self._oldest_received_at
+            if oldest_received_at is None and not self._queue.empty():
+                # Oldest event is at the front of the queue
+                oldest_received_at = self._queue.queue[0][0]
+            return {
+                'depth': self._queue.qsize(),
+                'capacity': self._queue.maxsize,
+                'received': self._received,
+                'rejected': self._rejected,
+                'held': len(self._held),
+                'outcomes': dict(self._outcomes),
+                'last_error': self._last_error,
+                'last_received_event_id': self._last_received_id,
+                'latest_event_id': latest_event_id,
+                'lag_events': max(self._last_received_id - latest_event_id, 0),
+                'lag_seconds': (
+                    time.monotonic() - oldest_received_at if oldest_received_at is not None else 0
+                ),
+                'applier_running': self._thread is not None and self._thread.is_alive(),
+                # Events applied but waiting for missing events
+                'reorder_buffer': reorder_buffer,
+            }
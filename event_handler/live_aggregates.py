@@ -0,0 +1,178 @@
+"""Module holding aggregates of the live portfolio for the dashboard."""
+
+from decimal import Decimal
+from typing import Callable, Dict, List, Set, Tuple
+
+from util.singleton import Singleton
+from .portfolio_state import PortfolioState
+
+
+class Aggregate:
+    """Positions of bond records summed by a key, e.g. (desk_id, trader_id, book_id).
+
+    Position sums are updated on every trade. NV is only recomputed for keys
+    holding a bond whose price or FX rate has changed, and only when read.
+    """
+
+    def __init__(self, fields: Tuple[str, ...]):
+        # Names of the parts of the key in rows
+        self.fields = fields
+
+        # Maps key to a dict mapping bond_id to position
+        self._holdings: Dict[Tuple[str, ...], Dict[str, int]] = {}
+
+        # Maps key to sum of positions
+        self._positions: Dict[Tuple[str, ...], int] = {}
+
+        # Maps key to NV, valid only if key is not in `_stale`
+        self._nv: Dict[Tuple[str, ...], Decimal] = {}
+        self._stale: Set[Tuple[str, ...]] = set()
+
+        # Maps bond_id to keys holding the bond
+        self._keys_by_bond: Dict[str, Set[Tuple[str, ...]]] = {}
+
+    def add(self, key: Tuple[str, ...], bond_id: str, quantity: int) -> None:
+        """Add `quantity` of `bond_id` to the position of `key`."""
+        holdings = self._holdings.setdefault(key, {})
+        holdings[bond_id] = holdings.get(bond_id, 0) + quantity
+        self._positions[key] = self._positions.get(key, 0) + quantity
+        self._keys_by_bond.setdefault(bond_id, set()).add(key)
+        self._stale.add(key)
+
+    def mark_bond_changed(self, bond_id: str) -> None:
+        """Mark NV of keys holding `bond_id` to be recomputed."""
+        self._stale.update(self._keys_by_bond.get(bond_id, ()))
+
+    def rows(self, get_value: Callable[[str, int], Decimal]) -> List[Dict]:
+        """Get rows ordered by key, with `position` and `NV`.
+        NV of stale keys is recomputed from `get_value(bond_id, position)`.
+        """
+        for key in self._stale:
+            self._nv[key] = sum(
+                get_value(bond_id, position) for bond_id, position in self._holdings[key].items()
+            )
+        self._stale.clear()
+
+        res: List[Dict] = []
+        for key in sorted(self._holdings):
+            row = dict(zip(self.fields, key))
+            row['position'] = self._positions[key]
+            row['NV'] = self._nv[key]
+            res.append(row)
+        return res
+
+
+class LiveAggregates(metaclass=Singleton):
+    """Aggregates of the live portfolio by desk, trader and book, and by desk and currency,
+    kept in step with `PortfolioState` so that dashboard reads never query DB.
+    Built from `PortfolioState` on first read, and rebuilt whenever `PortfolioState`
+    has been reloaded since, or after `invalidate()`.
+    """
+    # Generation of `PortfolioState` the aggregates were built from, None if not built
+    _generation: int = None
+
+    # Positions summed by (desk_id, trader_id, book_id)
+    _by_book: Aggregate = None
+
+    # Positions summed by (desk_id, currency_id)
+    _by_currency: Aggregate = None
+
+    def __init__(self):
+        pass
+
+    def load(self) -> None:
+        """Build aggregates from the in-memory portfolio."""
+        self._by_book = Aggregate(('desk', 'trader', 'book'))
+        self._by_currency = Aggregate(('desk', 'currency'))
+        for record in PortfolioState().get_bond_records():
+            self._add(
+                desk_id=record.trader.desk_id,
+                trader_id=record.trader_id,
+                book_id=record.book_id,
+                bond_id=record.bond_id,
+                quantity=record.position,
+            )
+        self._generation = PortfolioState().generation
+
+    def invalidate(self) -> None:
+        """Discard aggregates, e.g. after a failed transaction.
+        Aggregates are built again on next read.
+        """
+        self._generation = None
+
+    def _is_current(self) -> bool:
+        return self._generation is not None and self._generation == PortfolioState().generation
+
+    def _add(
+        self, desk_id: str, trader_id: str, book_id: str, bond_id: str, quantity: int
+    ) -> None:
+        currency_id = PortfolioState().get_bond(bond_id).currency_id
+        self._by_book.add((desk_id, trader_id, book_id), bond_id, quantity)
+        self._by_currency.add((desk_id, currency_id), bond_id, quantity)
+
+    def _get_value(self, bond_id: str, position: int) -> Decimal:
+        bond = PortfolioState().get_bond(bond_id)
+        return Decimal(position) * bond.price / bond.currency.rate
+
+    # Functions that apply changes, called after the change is made to `PortfolioState`
+    def apply_trade(
+        self, desk_id: str, trader_id: str, book_id: str, bond_id: str, quantity: int
+    ) -> None:
+        """Add `quantity` of bond to positions, negative for a sale."""
+        if not self._is_current():
+            # Built with the change on next read
+            return
+        self._add(desk_id, trader_id, book_id, bond_id, quantity)
+
+    def apply_price_change(self, bond_id: str) -> None:
+        """Mark NV of positions in `bond_id` to be recomputed."""
+        if not self._is_current():
+            return
+        self._by_book.mark_bond_changed(bond_id)
+        self._by_currency.mark_bond_changed(bond_id)
+
+    def apply_fx_change(self, currency_id: str) -> None:
+        """Mark NV of positions in bonds of `currency_id` to be recomputed."""
+        if not self._is_current():
+            return
+        for bond_id in PortfolioState().get_bond_ids(currency_id):
+            self.apply_price_change(bond_id)
+
+    # Getters of rows for the dashboard
+    def get_position_level_data(self) -> List[Dict]:
+        """Get position and NV by desk, trader and book."""
+        if not self._is_current():
+            self.load()
+        return self._by_book.rows(self._get_value)
+
+    def get_currency_level_data(self) -> List[Dict]:
+        """Get position and NV by desk and currency."""
+        if not self._is_current():
+            self.load()
+        return self._by_currency.rows(self._get_value)
+
+    def get_cash_level_data(self) -> List[Dict]:
+        """Get cash by desk."""
+        return [
+            {'desk': desk.desk_id, 'cash': desk.cash}
+            for desk in sorted(PortfolioState().get_desks(), key=lambda desk: desk.desk_id)
+        ]
+
+    def get_bond_level_data(self) -> List[Dict]:
+        """Get position and NV by desk, trader, book and bond."""
+        records = sorted(
+            PortfolioState().get_bond_records(),
+            key=lambda record: (record.trader_id, record.book_id, record.bond_id),
+        )
+        return [
+            {
+                'desk': record.trader.desk_id,
+                'trader': record.trader_id,
+                'book': record.book_id,
+                'bond': record.bond_id,
+                'currency': record.bond.currency_id,
+                'position': record.position,
+                'NV': self._get_value(record.bond_id, record.position),
+            }
+            for record in records
+        ]
@@ -0,0 +1,119 @@
+"""Command to rebuild the portfolio by applying an event file in-process, without HTTP."""
+
+from decimal import Decimal
+import heapq
+from itertools import islice
+from pathlib import Path
+import time
+from typing import Dict, Iterator, List
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from event_generator.event_reader import read_events
+from event_handler.event_handlers import EventHandler
+from util.common_types import Event
+from util import common_fns
+
+
+class Command(BaseCommand):
+    help = (
+        'Apply events from a JSON array or NDJSON file straight to the portfolio, '
+        'in large transactions.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'file', nargs='?', type=Path, default=settings.BASE_DIR / 'data' / 'events.json',
+            help='JSON array or NDJSON file of events',
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=5000,
+            help='number of events applied in each transaction',
+        )
+        parser.add_argument(
+            '--resume', action='store_true',
+            help='skip events up to the latest applied event, instead of requiring an empty DB',
+        )
+        parser.add_argument(
+            '--reorder-window', type=int, default=settings.REORDER_BUFFER_CAPACITY,
+            help='number of events read ahead to put events of the file back in order',
+        )
+        parser.add_argument(
+            '--progress-every', type=int, default=50000,
+            help='number of events between progress reports, 0 for none',
+        )
+
+    def _read_new_events(self, filepath: Path, after_event_id: int) -> Iterator[Event]:
+        """Helper function to read valid events after `after_event_id`."""
+        for event in read_events(filepath, parse_float=Decimal):
+            common_fns.validate_event(event)
+            if int(event['EventID']) > after_event_id:
+                yield event
+
+    def _sort_within_window(self, events: Iterator[Event], window: int) -> Iterator[Event]:
+        """Helper function to yield `events` ordered by ID, reading up to `window` events ahead.
+        Events out of order by more than `window` are left to the reorder buffer.
+        """
+        heap: List = []
+        for index, event in enumerate(events):
+            heapq.heappush(heap, (int(event['EventID']), index, event))
+            if len(heap) > window:
+                yield heapq.heappop(heap)[2]
+        while heap:
+            yield heapq.heappop(heap)[2]
+
+    def handle(self, *args, **options):
+        filepath: Path = options['file']
+        if not filepath.exists():
+            raise CommandError(f'File {filepath} not found.')
+        handler = EventHandler()
+        last_event_id = handler.get_latest_event_id()
+        if last_event_id and not options['resume']:
+            raise CommandError(
+                f'Events up to {last_event_id} are already applied, use --resume to continue'
+            )
+
+        events = self._sort_within_window(
+            self._read_new_events(filepath, last_event_id), options['reorder_window']
+        )
+        outcomes: Dict[str, int] = {}
+        rejected_ids: List[int] = []
+        count = 0
+        next_progress = options['progress_every']
+        start = time.perf_counter()
+        try:
+            batch: List[Event] = list(islice(events, options['batch_size']))
+            while batch:
+                # Events are sequenced by ID within and across batches
+                for outcome in handler.handle_events(batch):
+                    outcomes[outcome['status']] = outcomes.get(outcome['status'], 0) + 1
+                    if outcome['status'] == 'rejected':
+                        rejected_ids.append(outcome['event_id'])
+                count += len(batch)
+                if next_progress and count >= next_progress:
+                    self._report(count, start, handler.get_latest_event_id())
+                    next_progress += options['progress_every']
+                batch = list(islice(events, options['batch_size']))
+        except ValueError as e:
+            raise CommandError(f'Invalid event file after {count} events: {e}') from e
+
+        self._report(count, start, handler.get_latest_event_id())
+        if outcomes:
+            self.stdout.write(', '.join(f'{status}: {n}' for status, n in sorted(outcomes.items())))
+        if rejected_ids:
+            # Events are too far out of order for the window and the reorder buffer
+            shown = ', '.join(str(event_id) for event_id in rejected_ids[:20])
+            more = f' and {len(rejected_ids) - 20} more' if len(rejected_ids) > 20 else ''
+            raise CommandError(
+                f'{len(rejected_ids)} events rejected by the full reorder buffer: {shown}{more}. '
+                'Increase --reorder-window or REORDER_BUFFER_CAPACITY, then run again with --resume'
+            )
+
+    def _report(self, count: int, start: float, last_event_id: int) -> None:
+        seconds = time.perf_counter() - start
+        rate = count / seconds if seconds else 0
+        self.stdout.write(
+            f'{count} events in {seconds:.2f}s ({rate:.0f} events/s), '
+            f'latest applied event {last_event_id}'
+        )
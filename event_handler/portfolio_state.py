@@ -0,0 +1,233 @@
+"""Module holding the live portfolio in memory."""
+
+from decimal import Decimal
+from typing import Dict, List, Tuple, Union
+
+from api.models import FX, Bond, Desk, Trader, Book, BondRecord, StateCheckpoint
+from util.money import Money
+from util.singleton import Singleton
+
+
+class PortfolioState(metaclass=Singleton):
+    """Authoritative in-memory copy of the live portfolio.
+    Loaded from DB once on first use, then updated as events are applied,
+    so trade checks never have to query DB.
+
+    Model instances are kept in memory and shared between each other
+    (e.g. `bond.currency` is the same instance as in `_fx`), so that
+    the Cash Adjuster can write the same instances back to DB.
+    Cash, FX rates and prices are also kept as `Money` for trade checks,
+    and must be changed through this class so both stay in step.
+    New traders, books and bond records are created unsaved,
+    with `instance._state.adding` set until they are written to DB.
+    """
+    _loaded: bool = False
+
+    # Incremented on every load, so that state derived from this can tell if it is outdated
+    _generation: int = 0
+
+    # Maps currency_id to FX
+    _fx: Dict[str, FX] = {}
+
+    # Maps bond_id to Bond
+    _bonds: Dict[str, Bond] = {}
+
+    # Maps desk_id to Desk
+    _desks: Dict[str, Desk] = {}
+
+    # Maps trader_id to Trader
+    _traders: Dict[str, Trader] = {}
+
+    # Maps book_id to Book
+    _books: Dict[str, Book] = {}
+
+    # Maps (trader_id, book_id, bond_id) to BondRecord
+    _bond_records: Dict[Tuple[str, str, str], BondRecord] = {}
+
+    # Maps desk_id to cash, currency_id to rate and bond_id to price, as in the models
+    _cash: Dict[str, Money] = {}
+    _rates: Dict[str, Money] = {}
+    _prices: Dict[str, Union[Money, None]] = {}
+
+    def __init__(self):
+        pass
+
+    def load(self) -> None:
+        """Load the live portfolio from DB, discarding any in-memory state."""
+        self._fx = {fx.currency_id: fx for fx in FX.objects.all()}
+
+        self._bonds = {}
+        for bond in Bond.objects.all():
+            bond.currency = self._fx[bond.currency_id]
+            self._bonds[bond.bond_id] = bond
+
+        self._desks = {desk.desk_id: desk for desk in Desk.objects.all()}
+
+        self._traders = {}
+        for trader in Trader.objects.all():
+            trader.desk = self._desks[trader.desk_id]
+            self._traders[trader.trader_id] = trader
+
+        self._books = {}
+        for book in Book.objects.all():
+            book.trader = self._traders[book.trader_id]
+            self._books[book.book_id] = book
+
+        self._bond_records = {}
+        for record in BondRecord.objects.all():
+            record.trader = self._traders[record.trader_id]
+            record.book = self._books[record.book_id]
+            record.bond = self._bonds[record.bond_id]
+            self._bond_records[(record.trader_id, record.book_id, record.bond_id)] = record
+
+        self._cash = {
+            desk_id: Money.from_decimal(desk.cash) for desk_id, desk in self._desks.items()
+        }
+        self._rates = {
+            currency_id: Money.from_decimal(fx.rate) for currency_id, fx in self._fx.items()
+        }
+        self._prices = {
+            bond_id: Money.from_decimal(bond.price) if bond.price is not None else None
+            for bond_id, bond in self._bonds.items()
+        }
+
+        self._loaded = True
+        self._generation += 1
+
+    @property
+    def generation(self) -> int:
+        """Number of times the state has been loaded from DB."""
+        self._ensure_loaded()
+        return self._generation
+
+    def invalidate(self) -> None:
+        """Discard in-memory state, e.g. after a failed transaction.
+        State is loaded from DB again on next use.
+        """
+        self._loaded = False
+
+    def _ensure_loaded(self) -> None:
+        if not self._loaded:
+            self.load()
+
+    # Getters, raising the model's `DoesNotExist` like the ORM would
+    def get_fx(self, currency_id: str) -> FX:
+        """Get FX of `currency_id`."""
+        self._ensure_loaded()
+        if currency_id not in self._fx:
+            raise FX.DoesNotExist(f'Unknown currency: {currency_id}')
+        return self._fx[currency_id]
+
+    def get_bond(self, bond_id: str) -> Bond:
+        """Get Bond of `bond_id`, with its currency."""
+        self._ensure_loaded()
+        if bond_id not in self._bonds:
+            raise Bond.DoesNotExist(f'Unknown bond: {bond_id}')
+        return self._bonds[bond_id]
+
+    def get_desk(self, desk_id: str) -> Desk:
+        """Get Desk of `desk_id`."""
+        self._ensure_loaded()
+        if desk_id not in self._desks:
+            raise Desk.DoesNotExist(f'Unknown desk: {desk_id}')
+        return self._desks[desk_id]
+
+    def get_cash(self, desk_id: str) -> Money:
+        """Get cash of `desk_id`."""
+        self.get_desk(desk_id)
+        return self._cash[desk_id]
+
+    def get_rate(self, currency_id: str) -> Money:
+        """Get rate of `currency_id`."""
+        self.get_fx(currency_id)
+        return self._rates[currency_id]
+
+    def get_price(self, bond_id: str) -> Union[Money, None]:
+        """Get price of `bond_id`, or None if it does not have a price yet."""
+        self.get_bond(bond_id)
+        return self._prices[bond_id]
+
+    def get_bond_record(
+        self, trader_id: str, book_id: str, bond_id: str
+    ) -> Union[BondRecord, None]:
+        """Get BondRecord of bond held by trader in book, or None if never held."""
+        self._ensure_loaded()
+        return self._bond_records.get((trader_id, book_id, bond_id))
+
+    def get_desks(self) -> List[Desk]:
+        """Get all Desks."""
+        self._ensure_loaded()
+        return list(self._desks.values())
+
+    def get_bond_records(self) -> List[BondRecord]:
+        """Get all BondRecords, with their trader, book and bond."""
+        self._ensure_loaded()
+        return list(self._bond_records.values())
+
+    def get_bond_ids(self, currency_id: str) -> List[str]:
+        """Get IDs of bonds in `currency_id`."""
+        self._ensure_loaded()
+        return [bond_id for bond_id, bond in self._bonds.items() if bond.currency_id == currency_id]
+
+    # Functions that create new entries in memory only
+    def get_or_create_trader(self, trader_id: str, desk: Desk) -> Trader:
+        """Get Trader of `trader_id`, creating an unsaved one under `desk` if needed."""
+        self._ensure_loaded()
+        if trader_id not in self._traders:
+            self._traders[trader_id] = Trader(trader_id=trader_id, desk=desk)
+        return self._traders[trader_id]
+
+    def get_or_create_book(self, book_id: str, trader: Trader) -> Book:
+        """Get Book of `book_id`, creating an unsaved one owned by `trader` if needed."""
+        self._ensure_loaded()
+        if book_id not in self._books:
+            self._books[book_id] = Book(book_id=book_id, trader=trader)
+        return self._books[book_id]
+
+    def get_or_create_bond_record(self, trader: Trader, book: Book, bond: Bond) -> BondRecord:
+        """Get BondRecord of bond held by trader in book, creating an unsaved one if needed."""
+        self._ensure_loaded()
+        key = (trader.trader_id, book.book_id, bond.bond_id)
+        if key not in self._bond_records:
+            self._bond_records[key] = BondRecord(trader=trader, book=book, bond=bond)
+        return self._bond_records[key]
+
+    # Functions that apply market data changes
+    def set_cash(self, desk_id: str, cash: Money) -> Desk:
+        """Set cash of `desk_id`."""
+        desk: Desk = self.get_desk(desk_id)
+        self._cash[desk_id] = cash
+        desk.cash = cash.to_decimal()
+        return desk
+
+    def update_fx_rate(self, currency_id: str, rate: Decimal) -> FX:
+        """Set rate of `currency_id`, rounded as it would be in DB."""
+        fx: FX = self.get_fx(currency_id)
+        self._rates[currency_id] = Money.from_decimal(rate)
+        fx.rate = self._rates[currency_id].to_decimal()
+        return fx
+
+    def update_bond_price(self, bond_id: str, price: Decimal) -> Bond:
+        """Set price of `bond_id`, rounded as it would be in DB.
+        The first price received is also recorded as the initial price.
+        """
+        bond: Bond = self.get_bond(bond_id)
+        self._prices[bond_id] = Money.from_decimal(price)
+        bond.price = self._prices[bond_id].to_decimal()
+        if bond.initial_price is None:
+            bond.initial_price = bond.price
+        return bond
+
+    def to_checkpoint(self, event_id: int) -> StateCheckpoint:
+        """Create an unsaved checkpoint of the portfolio as it is after event `event_id`."""
+        self._ensure_loaded()
+        return StateCheckpoint(
+            event_id=event_id,
+            positions=[
+                [record.trader.desk_id, trader_id, book_id, bond_id, record.position]
+                for (trader_id, book_id, bond_id), record in self._bond_records.items()
+            ],
+            cash={desk_id: desk.cash for desk_id, desk in self._desks.items()},
+            fx={currency_id: fx.rate for currency_id, fx in self._fx.items()},
+            prices={bond_id: bond.price for bond_id, bond in self._bonds.items()},
+        )
@@ -0,0 +1,177 @@
+"""Module to hold events received out of order until the events before them are applied."""
+
+from datetime import datetime
+import heapq
+import logging
+from typing import Dict, Iterator, List, Tuple, Union
+
+from django.conf import settings
+from django.utils import timezone
+
+from api.models import PendingEvent
+from util.common_types import Event
+from .signals import event_gap
+
+logger = logging.getLogger(__name__)
+
+
+class ReorderBuffer:
+    """Min-heap of events received ahead of the next expected event, persisted to DB
+    so that a restart does not lose them.
+
+    Changes are made in memory first, and written to DB by `flush()` in the transaction
+    that applies events. Buffered events are loaded from DB on first use, and again
+    after `discard()`.
+
+    When the buffer holds `settings.REORDER_BUFFER_CAPACITY` events, or the oldest buffered
+    event has waited `settings.REORDER_GAP_TIMEOUT` seconds, `settings.REORDER_GAP_POLICY` applies:
+    `wait` keeps waiting for the missing events, and rejects new events while full,
+    `alert` also logs a warning and sends signal `event_gap`,
+    `skip` gives up on the missing events, so that buffered events after them can be applied.
+    """
+
+    def __init__(self):
+        # Heap of (event_id, event)
+        self._heap: List[Tuple[int, Event]] = []
+        # Maps ID of buffered event to time it was received
+        self._received_at: Dict[int, datetime] = {}
+        self._loaded: bool = False
+
+        # Buffered events not yet written to DB, keyed by ID
+        self._inserts: Dict[int, PendingEvent] = {}
+        # Highest ID of events removed from the buffer, which are deleted from DB up to this ID
+        self._max_removed_id: Union[int, None] = None
+
+        # First missing event ID already alerted, so each gap is alerted once
+        self._alerted_gap: Union[int, None] = None
+
+    def _load(self) -> None:
+        if self._loaded:
+            return
+        self._heap = []
+        self._received_at = {}
+        for pending in PendingEvent.objects.order_by('event_id'):
+            self._heap.append((pending.event_id, pending.event))
+            self._received_at[pending.event_id] = pending.received_at
+        self._loaded = True
+
+    def __len__(self) -> int:
+        self._load()
+        return len(self._heap)
+
+    def __iter__(self) -> Iterator[Tuple[int, Event]]:
+        """Iterate over (event_id, event) of buffered events in order."""
+        self._load()
+        return iter(sorted(self._heap, key=lambda item: item[0]))
+
+    def __contains__(self, event_id: int) -> bool:
+        self._load()
+        return event_id in self._received_at
+
+    def is_full(self) -> bool:
+        return len(self) >= settings.REORDER_BUFFER_CAPACITY
+
+    def push(self, event_id: int, event: Event) -> None:
+        """Buffer an event, which should not already be buffered."""
+        self._load()
+        received_at = timezone.now()
+        heapq.heappush(self._heap, (event_id, event))
+        self._received_at[event_id] = received_at
+        self._inserts[event_id] = PendingEvent(
+            event_id=event_id,
+            # QueryDict of a request holds lists of values, keep the last value of each field
+            event={field: event[field] for field in event},
+            received_at=received_at,
+        )
+
+    def pop_contiguous(self, next_event_id: int) -> List[Tuple[int, Event]]:
+        """Remove buffered events before `next_event_id`, as they are old,
+        then remove and return the run of buffered (event_id, event) with consecutive IDs
+        from `next_event_id`, in order.
+        Events of the run that are not applied should be pushed back.
+        """
+        self._load()
+        run: List[Tuple[int, Event]] = []
+        while self._heap and self._heap[0][0] <= next_event_id:
+            event_id, event = heapq.heappop(self._heap)
+            del self._received_at[event_id]
+            self._inserts.pop(event_id, None)
+            self._max_removed_id = max(self._max_removed_id or 0, event_id)
+            if event_id == next_event_id:
+                run.append((event_id, event))
+                next_event_id += 1
+        return run
+
+    def get_gap(self, next_event_id: int) -> Union[Tuple[int, int], None]:
+        """Get the first and last missing event IDs before the oldest buffered event,
+        if the gap policy applies to them, otherwise None.
+        """
+        self._load()
+        if not self._heap or self._heap[0][0] <= next_event_id:
+            return None
+        oldest_id = self._heap[0][0]
+        waited = (timezone.now() - self._received_at[oldest_id]).total_seconds()
+        if waited < settings.REORDER_GAP_TIMEOUT and not self.is_full():
+            return None
+        return next_event_id, oldest_id - 1
+
+    def resolve_gap(self, next_event_id: int) -> Union[int, None]:
+        """Apply the gap policy to missing events before the oldest buffered event.
+        Returns the last missing event ID if the gap should be skipped, otherwise None.
+        """
+        gap = self.get_gap(next_event_id)
+        if gap is None:
+            return None
+        policy = settings.REORDER_GAP_POLICY
+        if policy == 'alert' and self._alerted_gap != gap[0]:
+            self._alerted_gap = gap[0]
+            logger.warning(
+                'Events %d to %d are missing, %d events are waiting for them',
+                gap[0], gap[1], len(self),
+            )
+            event_gap.send_robust(sender=self.__class__, first_event_id=gap[0], last_event_id=gap[1])
+        elif policy == 'skip':
+            logger.warning('Skipping missing events %d to %d', gap[0], gap[1])
+            return gap[1]
+        return None
+
+    def get_stats(self) -> Dict:
+        """Get number of buffered events, and the wait in seconds and ID of the oldest."""
+        self._load()
+        oldest_id = self._heap[0][0] if self._heap else None
+        return {
+            'buffered': len(self._heap),
+            'capacity': settings.REORDER_BUFFER_CAPACITY,
+            'policy': settings.REORDER_GAP_POLICY,
+            'oldest_event_id': oldest_id,
+            'oldest_wait_seconds': (
+                (timezone.now() - self._received_at[oldest_id]).total_seconds()
+                if oldest_id is not None else 0
+            ),
+        }
+
+    def flush(self) -> None:
+        """Write changes of the buffer to DB with bulk queries.
+        Should be called within the transaction that applies the events.
+        """
+        if self._max_removed_id is not None:
+            # Events are removed from the front of the heap, so one query deletes any run of them,
+            # and events pushed back are inserted again below
+            PendingEvent.objects.filter(event_id__lte=self._max_removed_id).delete()
+        if self._inserts:
+            PendingEvent.objects.bulk_create(self._inserts.values(), ignore_conflicts=True)
+        self._inserts = {}
+        self._max_removed_id = None
+
+    def discard(self) -> None:
+        """Drop unwritten changes, e.g. after a rollback. Buffer is reloaded from DB on next use."""
+        self._inserts = {}
+        self._max_removed_id = None
+        self._loaded = False
+
+    def clear(self) -> None:
+        """Forget all buffered events in memory, e.g. after DB is replaced."""
+        self.discard()
+        self._heap = []
+        self._received_at = {}
+        self._alerted_gap = None
@@ -0,0 +1,12 @@
+"""Signals sent by the event handler."""
+
+from django.dispatch import Signal
+
+# Sent after applied events are committed to DB, with `event_id` of the latest applied event.
+# Sent once per transaction, so a batch of events sends one signal.
+event_applied = Signal()
+
+# Sent when events are missing for longer than `settings.REORDER_GAP_TIMEOUT`,
+# or fill the reorder buffer, with IDs `first_event_id` to `last_event_id` of the missing events.
+# Sent once per gap, only with `settings.REORDER_GAP_POLICY` `alert`.
+event_gap = Signal()
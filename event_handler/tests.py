@@ -1,14 +1,30 @@
-from decimal import Decimal
-
-from django.test import TestCase
+from decimal import Decimal, ROUND_CEILING, ROUND_FLOOR
+import io
+import json
+from pathlib import Path
+import random
+import tempfile
+from unittest import mock
+
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import TestCase, override_settings
 from django.forms.models import model_to_dict
 
-from api.populate_db import _read_csv
+from api.populate_db import DATA_DIR, _read_csv
 from api.models import (
-    FX, Bond, Desk, Trader, Book, BondRecord, EventLog, EventExceptionLog
+    FX, Bond, Desk, Trader, Book, BondRecord, EventLog, EventExceptionLog, EventSequence,
+    PendingEvent,
 )
 from event_handler.event_handlers import EventHandler
+from event_handler.event_sequencer import EventSequencer
+from event_handler.live_aggregates import LiveAggregates
+from event_handler.portfolio_state import PortfolioState
+from event_handler.signals import event_gap
 from event_generator.event_generator import EventGenerator
+from event_generator.event_reader import read_events
+from util import common_fns
+from util.money import Money, TradeValue
 
 sample_market_data = [
     {
@@ -315,31 +331,31 @@ class EventHandlerTestCase(TestCase):
         # Event 1
         self.event_handler.handle_event(sample_market_data[0])
         self.assertEqual(self.event_handler.get_latest_event_id(), 1)
-        self.assertEqual(EventHandler()._queue, [])
+        self.assertEqual(list(EventHandler._queue), [])
 
         # Event 3
         self.event_handler.handle_event(sample_market_data[1])
         self.assertEqual(self.event_handler.get_latest_event_id(), 1)
-        self.assertEqual(EventHandler()._queue, [
+        self.assertEqual(list(EventHandler._queue), [
             (3, sample_market_data[1]),
         ])
 
         # Event 2
         self.event_handler.handle_event(sample_trade_events[0])
         self.assertEqual(self.event_handler.get_latest_event_id(), 3)
-        self.assertEqual(EventHandler()._queue, [])
+        self.assertEqual(list(EventHandler._queue), [])
 
         # Event 6
         self.event_handler.handle_event(sample_market_data[3])
         self.assertEqual(self.event_handler.get_latest_event_id(), 3)
-        self.assertEqual(EventHandler()._queue, [
+        self.assertEqual(list(EventHandler._queue), [
             (6, sample_market_data[3]),
         ])
 
         # Event 5
         self.event_handler.handle_event(sample_market_data[2])
         self.assertEqual(EventHandler().get_latest_event_id(), 3)
-        self.assertEqual(EventHandler()._queue, [
+        self.assertEqual(list(EventHandler._queue), [
             (5, sample_market_data[2]),
             (6, sample_market_data[3]),
         ])
@@ -347,9 +363,472 @@ class EventHandlerTestCase(TestCase):
         # Event 4
         self.event_handler.handle_event(sample_trade_events[1])
         self.assertEqual(self.event_handler.get_latest_event_id(), 6)
-        self.assertEqual(EventHandler._queue, [])
+        self.assertEqual(list(EventHandler._queue), [])
         print(EventHandler().get_latest_event_id())
         print(EventHandler()._latest_event_id)
 
 
 
+
+class EventSequencerTestCase(TestCase):
+    """Uses initial data auto-populated from `data/`."""
+    def setUp(self) -> None:
+        self.sequencer = EventSequencer()
+        self.sequencer.recover()
+        PortfolioState().load()
+        EventHandler._queue.clear()
+
+    def test_sequencer_starts_from_logs(self):
+        self.assertEqual(self.sequencer.last_event_id, 0)
+        self.assertFalse(EventSequence.objects.exists())
+
+    def test_sequencer_persists_applied_events(self):
+        EventHandler().handle_event({
+            'EventID': '1', 'EventType': 'PriceEvent', 'BondID': 'B45193', 'MarketPrice': '1996.52',
+        })
+        self.assertEqual(self.sequencer.last_event_id, 1)
+        self.assertEqual(EventSequence.objects.get().last_event_id, 1)
+
+        # Out of order event is not applied
+        EventHandler().handle_event({
+            'EventID': '3', 'EventType': 'FXEvent', 'ccy': 'AUZ', 'rate': '1.5',
+        })
+        self.assertEqual(EventHandler().get_latest_event_id(), 1)
+        self.assertEqual(EventSequence.objects.get().last_event_id, 1)
+
+        EventHandler().handle_event({
+            'EventID': '2', 'EventType': 'FXEvent', 'ccy': 'SGX', 'rate': '1.4',
+        })
+        self.assertEqual(EventHandler().get_latest_event_id(), 3)
+        self.assertEqual(self.sequencer.recover(), 3)
+
+    def test_sequencer_rolls_back_failed_events(self):
+        with self.assertRaises(ValueError):
+            EventHandler().handle_event({
+                'EventID': '1', 'EventType': 'FXEvent', 'ccy': 'SGX', 'rate': '-1',
+            })
+        self.assertEqual(self.sequencer.last_event_id, 0)
+        self.assertEqual(FX.objects.get(currency_id='SGX').rate, Decimal('1.35'))
+        EventHandler._queue.clear()
+
+
+class ReorderBufferTestCase(TestCase):
+    """Uses initial data auto-populated from `data/`."""
+    def setUp(self) -> None:
+        EventSequencer().recover()
+        PortfolioState().load()
+        EventHandler._queue.clear()
+
+    def tearDown(self) -> None:
+        EventHandler._queue.clear()
+
+    def _fx_event(self, event_id):
+        return {'EventID': str(event_id), 'EventType': 'FXEvent', 'ccy': 'AUZ', 'rate': '1.5'}
+
+    def test_buffered_events_survive_restart(self):
+        EventHandler().handle_events([self._fx_event(3), self._fx_event(2)])
+        self.assertListEqual(
+            list(PendingEvent.objects.values_list('event_id', flat=True)), [2, 3]
+        )
+
+        # Buffer in memory is lost, and reloaded from DB
+        EventHandler._queue.clear()
+        outcomes = EventHandler().handle_event(self._fx_event(1))
+        self.assertListEqual([outcome['event_id'] for outcome in outcomes], [1, 2, 3])
+        self.assertEqual(EventHandler().get_latest_event_id(), 3)
+        self.assertFalse(PendingEvent.objects.exists())
+        self.assertEqual(len(EventHandler._queue), 0)
+
+    def test_failed_buffered_event_keeps_outcomes_of_applied_events(self):
+        failing_event = {'EventID': '3', 'EventType': 'FXEvent', 'ccy': 'AUZ', 'rate': '-1'}
+        with self.assertLogs('event_handler.event_handlers', level='ERROR'):
+            outcomes = EventHandler().handle_events([
+                self._fx_event(2), failing_event, self._fx_event(1),
+            ])
+        self.assertEqual(outcomes[0], {'event_id': 2, 'status': 'applied'})
+        self.assertEqual(outcomes[1]['event_id'], 3)
+        self.assertEqual(outcomes[1]['status'], 'error')
+        self.assertEqual(outcomes[2], {'event_id': 1, 'status': 'applied'})
+        self.assertEqual(EventSequence.objects.get().last_event_id, 2)
+        self.assertFalse(PendingEvent.objects.exists())
+
+    def test_failed_buffered_event_does_not_block_next_event(self):
+        failing_event = {'EventID': '3', 'EventType': 'FXEvent', 'ccy': 'AUZ', 'rate': '-1'}
+        EventHandler().handle_event(self._fx_event(1))
+        EventHandler().handle_event(failing_event)
+        with self.assertLogs('event_handler.event_handlers', level='ERROR'):
+            outcomes = EventHandler().handle_event(self._fx_event(2))
+        self.assertEqual(outcomes[0], {'event_id': 2, 'status': 'applied'})
+        self.assertEqual(outcomes[1]['event_id'], 3)
+        self.assertEqual(outcomes[1]['status'], 'error')
+        self.assertEqual(EventSequence.objects.get().last_event_id, 2)
+        self.assertFalse(PendingEvent.objects.exists())
+
+        # Later events wait for event 3 to be sent again
+        self.assertEqual(EventHandler().handle_event(self._fx_event(4))[0]['status'], 'queued')
+        outcomes = EventHandler().handle_event(self._fx_event(3))
+        self.assertListEqual(
+            [(outcome['event_id'], outcome['status']) for outcome in outcomes],
+            [(3, 'applied'), (4, 'applied')],
+        )
+        self.assertEqual(EventSequence.objects.get().last_event_id, 4)
+
+    @override_settings(REORDER_BUFFER_CAPACITY=2)
+    def test_full_buffer_rejects_events(self):
+        outcomes = EventHandler().handle_events([
+            self._fx_event(3), self._fx_event(4), self._fx_event(5), self._fx_event(3),
+        ])
+        self.assertListEqual(
+            [outcome['status'] for outcome in outcomes], ['queued', 'queued', 'rejected', 'queued']
+        )
+        self.assertEqual(PendingEvent.objects.count(), 2)
+
+    @override_settings(REORDER_GAP_POLICY='skip', REORDER_GAP_TIMEOUT=0)
+    def test_skip_policy_skips_missing_events(self):
+        with self.assertLogs('event_handler.reorder_buffer', level='WARNING'):
+            outcomes = EventHandler().handle_event(self._fx_event(3))
+        self.assertListEqual(
+            [(outcome['event_id'], outcome['status']) for outcome in outcomes],
+            [(3, 'queued'), (3, 'applied')],
+        )
+        self.assertEqual(EventSequence.objects.get().last_event_id, 3)
+        self.assertEqual(EventHandler().handle_event(self._fx_event(1))[0]['status'], 'duplicate')
+
+    @override_settings(REORDER_GAP_POLICY='alert', REORDER_GAP_TIMEOUT=0)
+    def test_alert_policy_alerts_once_per_gap(self):
+        receiver = mock.Mock()
+        event_gap.connect(receiver)
+        try:
+            with self.assertLogs('event_handler.reorder_buffer', level='WARNING'):
+                EventHandler().handle_events([self._fx_event(3), self._fx_event(4)])
+        finally:
+            event_gap.disconnect(receiver)
+        receiver.assert_called_once()
+        self.assertEqual(receiver.call_args.kwargs['first_event_id'], 1)
+        self.assertEqual(receiver.call_args.kwargs['last_event_id'], 2)
+        self.assertEqual(EventHandler().get_latest_event_id(), 0)
+        self.assertEqual(EventHandler().get_queue_stats()['buffered'], 2)
+
+
+class PortfolioStateTestCase(TestCase):
+    """Uses initial data auto-populated from `data/`."""
+    def setUp(self) -> None:
+        EventSequencer().recover()
+        PortfolioState().load()
+        EventHandler._queue.clear()
+
+    def test_trades_are_checked_in_memory_and_written_to_db(self):
+        events = [
+            {'EventID': '1', 'EventType': 'PriceEvent', 'BondID': 'B45193', 'MarketPrice': '1996.52'},
+            {'EventID': '2', 'EventType': 'FXEvent', 'ccy': 'AUZ', 'rate': '1.523456789'},
+            {
+                'EventID': '3', 'EventType': 'TradeEvent', 'Desk': 'NY', 'Trader': 'T2078717',
+                'Book': 'NY02', 'BuySell': 'buy', 'Quantity': '533', 'BondID': 'B45193',
+            },
+            {
+                'EventID': '4', 'EventType': 'TradeEvent', 'Desk': 'NY', 'Trader': 'T2078717',
+                'Book': 'NY02', 'BuySell': 'sell', 'Quantity': '600', 'BondID': 'B45193',
+            },
+            {
+                'EventID': '5', 'EventType': 'TradeEvent', 'Desk': 'NY', 'Trader': 'T2078717',
+                'Book': 'NY02', 'BuySell': 'sell', 'Quantity': '33', 'BondID': 'B45193',
+            },
+        ]
+        for event in events:
+            EventHandler().handle_event(event)
+
+        state = PortfolioState()
+        self.assertEqual(state.get_fx('AUZ').rate, Decimal('1.52346'))
+        self.assertEqual(
+            state.get_bond_record('T2078717', 'NY02', 'B45193').position, 500
+        )
+        self.assertEqual(
+            EventExceptionLog.objects.get(event_id=4).exclusion_type, 'QUANTITY_OVERLIMIT'
+        )
+
+        # DB holds the same values as memory
+        cash = state.get_desk('NY').cash
+        self.assertEqual(Desk.objects.get(desk_id='NY').cash, cash)
+        self.assertEqual(EventLog.objects.get(event_id=5).cash, cash)
+        self.assertEqual(
+            BondRecord.objects.get(trader='T2078717', book='NY02', bond='B45193').position, 500
+        )
+        self.assertEqual(Book.objects.get(book_id='NY02').trader_id, 'T2078717')
+
+        # Reloading from DB gives the same values
+        state.load()
+        self.assertEqual(state.get_desk('NY').cash, cash)
+        self.assertEqual(state.get_bond('B45193').price, Decimal('1996.52'))
+
+    def test_failed_unit_of_work_leaves_no_changes(self):
+        events = [
+            {'EventID': 1, 'EventType': 'PriceEvent', 'BondID': 'B45193', 'MarketPrice': '1996.52'},
+            {
+                'EventID': 2, 'EventType': 'TradeEvent', 'Desk': 'NY', 'Trader': 'T2078717',
+                'Book': 'NY02', 'BuySell': 'buy', 'Quantity': '533', 'BondID': 'B45193',
+            },
+        ]
+        with mock.patch.object(EventSequencer, 'persist', side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                EventHandler().handle_events(events)
+
+        self.assertFalse(EventLog.objects.exists())
+        self.assertFalse(BondRecord.objects.exists())
+        self.assertEqual(Desk.objects.get(desk_id='NY').cash, Decimal(100_000_000))
+        self.assertEqual(EventHandler().get_latest_event_id(), 0)
+        self.assertEqual(PortfolioState().get_desk('NY').cash, Decimal(100_000_000))
+        self.assertIsNone(PortfolioState().get_bond('B45193').price)
+
+        # Same events can be applied again
+        outcomes = EventHandler().handle_events(events)
+        self.assertEqual([outcome['status'] for outcome in outcomes], ['applied', 'applied'])
+        self.assertEqual(EventLog.objects.get().position, 533)
+
+
+class LiveAggregatesTestCase(TestCase):
+    """Uses initial data auto-populated from `data/`."""
+    def setUp(self) -> None:
+        EventSequencer().recover()
+        PortfolioState().load()
+        EventHandler._queue.clear()
+        EventHandler().handle_events([
+            {'EventID': 1, 'EventType': 'PriceEvent', 'BondID': 'B45193', 'MarketPrice': '2000'},
+            {'EventID': 2, 'EventType': 'PriceEvent', 'BondID': 'B44611', 'MarketPrice': '100'},
+            {
+                'EventID': 3, 'EventType': 'TradeEvent', 'Desk': 'NY', 'Trader': 'T2078717',
+                'Book': 'NY02', 'BuySell': 'buy', 'Quantity': '10', 'BondID': 'B45193',
+            },
+            {
+                'EventID': 4, 'EventType': 'TradeEvent', 'Desk': 'NY', 'Trader': 'T2078717',
+                'Book': 'NY02', 'BuySell': 'buy', 'Quantity': '20', 'BondID': 'B44611',
+            },
+        ])
+
+    def _apply(self, events):
+        outcomes = EventHandler().handle_events(events)
+        self.assertTrue(all(outcome['status'] == 'applied' for outcome in outcomes))
+
+    def _assert_matches_rebuild(self):
+        position_level_data = EventHandler().get_position_level_data()
+        currency_level_data = EventHandler().get_currency_level_data()
+        LiveAggregates().invalidate()
+        self.assertEqual(EventHandler().get_position_level_data(), position_level_data)
+        self.assertEqual(EventHandler().get_currency_level_data(), currency_level_data)
+
+    def test_aggregates_updated_by_events(self):
+        with self.assertNumQueries(0):
+            self.assertEqual(EventHandler().get_position_level_data(), [{
+                'desk': 'NY', 'trader': 'T2078717', 'book': 'NY02', 'position': 30,
+                'NV': Decimal(10) * 2000 / Decimal('1.48') + Decimal(20) * 100,
+            }])
+
+        self._apply([
+            {'EventID': 5, 'EventType': 'FXEvent', 'ccy': 'AUZ', 'rate': '1.6'},
+            {
+                'EventID': 6, 'EventType': 'TradeEvent', 'Desk': 'NY', 'Trader': 'T2078717',
+                'Book': 'NY02', 'BuySell': 'sell', 'Quantity': '5', 'BondID': 'B44611',
+            },
+            {
+                'EventID': 7, 'EventType': 'TradeEvent', 'Desk': 'LON', 'Trader': 'T1000001',
+                'Book': 'LN01', 'BuySell': 'buy', 'Quantity': '1', 'BondID': 'B45193',
+            },
+        ])
+        self.assertEqual(EventHandler().get_currency_level_data(), [
+            {'desk': 'LON', 'currency': 'AUZ', 'position': 1, 'NV': Decimal(2000) / Decimal('1.6')},
+            {
+                'desk': 'NY', 'currency': 'AUZ', 'position': 10,
+                'NV': Decimal(10) * 2000 / Decimal('1.6'),
+            },
+            {'desk': 'NY', 'currency': 'USX', 'position': 15, 'NV': Decimal(15) * 100},
+        ])
+
+        self._apply([
+            {'EventID': 8, 'EventType': 'PriceEvent', 'BondID': 'B44611', 'MarketPrice': '101.5'},
+        ])
+        self._assert_matches_rebuild()
+
+    def test_failed_unit_of_work_leaves_no_changes(self):
+        position_level_data = EventHandler().get_position_level_data()
+        with mock.patch.object(EventSequencer, 'persist', side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                EventHandler().handle_events([
+                    {
+                        'EventID': 5, 'EventType': 'TradeEvent', 'Desk': 'NY',
+                        'Trader': 'T2078717', 'Book': 'NY02', 'BuySell': 'buy',
+                        'Quantity': '10', 'BondID': 'B45193',
+                    },
+                ])
+        self.assertEqual(EventHandler().get_position_level_data(), position_level_data)
+
+
+class ReplayEventsCommandTestCase(TestCase):
+    """Uses initial data auto-populated from `data/`."""
+    def setUp(self) -> None:
+        EventSequencer().recover()
+        PortfolioState().load()
+        EventHandler._queue.clear()
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.events = [
+            {'EventID': 1, 'EventType': 'PriceEvent', 'BondID': 'B45193', 'MarketPrice': 1996.52},
+            {
+                'EventID': 3, 'EventType': 'TradeEvent', 'Desk': 'NY', 'Trader': 'T2078717',
+                'Book': 'NY02', 'BuySell': 'buy', 'Quantity': 10, 'BondID': 'B45193',
+            },
+            {'EventID': 2, 'EventType': 'FXEvent', 'ccy': 'AUZ', 'rate': 1.57},
+            {'EventID': 4, 'EventType': 'FXEvent', 'ccy': 'AUZ', 'rate': 1.6},
+        ]
+
+    def tearDown(self) -> None:
+        self.tmp_dir.cleanup()
+
+    def _write(self, events) -> Path:
+        filepath = Path(self.tmp_dir.name) / 'events.ndjson'
+        filepath.write_text('\n'.join(json.dumps(event) for event in events))
+        return filepath
+
+    def _replay(self, filepath, *args) -> str:
+        out = io.StringIO()
+        call_command('replay_events', str(filepath), '--batch-size', '2', *args, stdout=out)
+        return out.getvalue()
+
+    def test_replays_events_in_order(self):
+        output = self._replay(self._write(self.events[:3]))
+        self.assertIn('3 events', output)
+        self.assertEqual(EventSequence.objects.get().last_event_id, 3)
+        self.assertEqual(FX.objects.get(currency_id='AUZ').rate, Decimal('1.57'))
+        self.assertEqual(
+            EventLog.objects.get(event_id=3).value,
+            round(Decimal('19965.2') / Decimal('1.57'), 5),
+        )
+
+    def test_resumes_from_latest_applied_event(self):
+        self._replay(self._write(self.events[:1]))
+        filepath = self._write(self.events)
+        with self.assertRaises(CommandError):
+            self._replay(filepath)
+        output = self._replay(filepath, '--resume')
+        self.assertIn('3 events', output)
+        self.assertEqual(EventSequence.objects.get().last_event_id, 4)
+
+    @override_settings(REORDER_BUFFER_CAPACITY=1)
+    def test_sorts_events_within_window(self):
+        events = [self.events[2], self.events[1], self.events[3], self.events[0]]
+        self._replay(self._write(events), '--reorder-window', '3')
+        self.assertEqual(EventSequence.objects.get().last_event_id, 4)
+        self.assertFalse(PendingEvent.objects.exists())
+
+    @override_settings(REORDER_BUFFER_CAPACITY=1)
+    def test_fails_on_events_rejected_by_full_buffer(self):
+        events = [self.events[2], self.events[1], self.events[3], self.events[0]]
+        message = '1 events rejected by the full reorder buffer: 3'
+        with self.assertRaisesMessage(CommandError, message):
+            self._replay(self._write(events), '--reorder-window', '1')
+
+
+class MoneyTestCase(TestCase):
+    """Uses initial data auto-populated from `data/`."""
+    def setUp(self) -> None:
+        EventSequencer().recover()
+        PortfolioState().load()
+        EventHandler._queue.clear()
+
+    def test_rounding(self):
+        self.assertEqual(Money.from_decimal('1.234565').units, 123456)
+        self.assertEqual(Money.from_decimal('1.234575').units, 123458)
+        self.assertEqual(Money.from_decimal('-1.234565').units, -123456)
+        self.assertEqual(Money.from_decimal('1.234561', ROUND_CEILING).units, 123457)
+        self.assertEqual(Money.from_decimal('-1.234569', ROUND_FLOOR).units, -123457)
+        self.assertEqual(Money.from_decimal(Decimal('1.48')).to_decimal(), Decimal('1.48000'))
+        self.assertEqual(f'{Money.from_decimal("0.125")}', '0.12500')
+        self.assertEqual(f'{Money.from_decimal("0.125"):.2f}', '0.12')
+        value = TradeValue(3, Money(1), Money(200000))  # 0.000015
+        self.assertEqual(value.rounded().units, 2)
+        self.assertEqual(value.rounded(ROUND_FLOOR).units, 1)
+        self.assertTrue(value.exceeds(Money(1)))
+        self.assertFalse(value.exceeds(Money(2)))
+        self.assertEqual(value.subtract_from(Money(3)).units, 2)
+        self.assertEqual(value.subtract_from(Money(4)).units, 2)
+        self.assertEqual(value.add_to(Money(1)).units, 2)
+        with self.assertRaises(ValueError):
+            TradeValue(1, Money(1), Money(0))
+
+    def test_matches_decimal_arithmetic(self):
+        rng = random.Random(0)
+        for _ in range(2000):
+            cash = Money(rng.randint(-10 ** 13, 10 ** 13))
+            quantity = rng.randint(0, 10 ** 4)
+            price = Money(rng.randint(1, 10 ** 9))
+            rate = Money(rng.choice([100000, 148000, 200000, 785000, rng.randint(1, 10 ** 8)]))
+            trade_value = TradeValue(quantity, price, rate)
+            value = Decimal(quantity) * price.to_decimal() / rate.to_decimal()
+            self.assertEqual(
+                trade_value.rounded().to_decimal(), common_fns.round_to_db_precision(value)
+            )
+            self.assertEqual(trade_value.exceeds(cash), cash.to_decimal() < value)
+            self.assertEqual(
+                trade_value.add_to(cash).to_decimal(),
+                common_fns.round_to_db_precision(cash.to_decimal() + value),
+            )
+            self.assertEqual(
+                trade_value.subtract_from(cash).to_decimal(),
+                common_fns.round_to_db_precision(cash.to_decimal() - value),
+            )
+
+    def test_matches_decimal_results_of_sample_events(self):
+        """Apply `data/events.json`, and check every trade against the Decimal arithmetic
+        the handler used before `Money`.
+        """
+        rates = dict(FX.objects.values_list('currency_id', 'rate'))
+        prices = dict(Bond.objects.values_list('bond_id', 'price'))
+        currencies = dict(Bond.objects.values_list('bond_id', 'currency_id'))
+        cash = dict(Desk.objects.values_list('desk_id', 'cash'))
+        positions = {}
+
+        events = list(read_events(DATA_DIR / 'events.json', parse_float=Decimal))
+        for i in range(0, len(events), 1000):
+            EventHandler().handle_events(events[i:i + 1000])
+
+        logs = {}
+        for event in events:
+            if event['EventType'] == 'FXEvent':
+                rates[event['ccy']] = common_fns.round_to_db_precision(Decimal(event['rate']))
+            elif event['EventType'] == 'PriceEvent':
+                prices[event['BondID']] = common_fns.round_to_db_precision(
+                    Decimal(event['MarketPrice'])
+                )
+            else:
+                key = (event['Trader'], event['Book'], event['BondID'])
+                quantity = event['Quantity']
+                price = prices[event['BondID']]
+                if event['BuySell'] == 'buy':
+                    if not price:
+                        continue
+                    value = Decimal(quantity) * price / rates[currencies[event['BondID']]]
+                    if cash[event['Desk']] < value:
+                        continue
+                    cash[event['Desk']] = common_fns.round_to_db_precision(
+                        cash[event['Desk']] - value
+                    )
+                    positions[key] = positions.get(key, 0) + quantity
+                else:
+                    if positions.get(key, 0) < quantity:
+                        continue
+                    value = Decimal(quantity) * price / rates[currencies[event['BondID']]]
+                    cash[event['Desk']] = common_fns.round_to_db_precision(
+                        cash[event['Desk']] + value
+                    )
+                    positions[key] -= quantity
+                logs[event['EventID']] = (
+                    common_fns.round_to_db_precision(value), cash[event['Desk']]
+                )
+
+        self.assertDictEqual(
+            {
+                event_id: (value, desk_cash)
+                for event_id, value, desk_cash in EventLog.objects.values_list(
+                    'event_id', 'value', 'cash'
+                )
+            },
+            logs,
+        )
+        self.assertDictEqual(dict(Desk.objects.values_list('desk_id', 'cash')), cash)
@@ -0,0 +1,42 @@
+"""Replay an event file to the server as fast as possible, or at a target rate."""
+
+import argparse
+import json
+from pathlib import Path
+import sys
+
+from event_generator.event_reader import read_events
+from event_generator.replay_publisher import SERVER_URL, replay
+
+parser = argparse.ArgumentParser(description=__doc__)
+parser.add_argument(
+    '--file', type=Path, default=Path(__file__).absolute().parent / 'data' / 'events.json',
+    help='JSON array or NDJSON file of events',
+)
+parser.add_argument('--server-url', default=SERVER_URL)
+parser.add_argument(
+    '--rate', type=float, default=None,
+    help='target events per second, as fast as possible if not given',
+)
+parser.add_argument('--concurrency', type=int, default=8, help='number of requests in flight')
+parser.add_argument(
+    '--batch-size', type=int, default=1,
+    help='number of events per request, sent to the batch endpoint if more than 1',
+)
+parser.add_argument(
+    '--max-attempts', type=int, default=5,
+    help='number of times an event is sent before it is given up, if the server does not accept it',
+)
+args = parser.parse_args()
+
+stats = replay(
+    read_events(args.file),
+    server_url=args.server_url,
+    rate=args.rate,
+    concurrency=args.concurrency,
+    batch_size=args.batch_size,
+    max_attempts=args.max_attempts,
+)
+print(json.dumps(stats, indent=2))
+if stats['failed_events']:
+    sys.exit(1)
@@ -4,3 +4,17 @@ from django.apps import AppConfig
 class ReportGeneratorConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'report_generator'
+
+    def ready(self) -> None:
+        # Need local imports to wait for django apps to finish loading
+        from event_handler.signals import event_applied
+        from .live_responses import LiveResponses
+        from .live_updates import LiveUpdates
+
+        # Runs after applied events are committed
+        event_applied.connect(
+            LiveResponses().on_event_applied, weak=False, dispatch_uid="live_responses"
+        )
+        event_applied.connect(
+            LiveUpdates().on_event_applied, weak=False, dispatch_uid="live_updates"
+        )
@@ -0,0 +1,165 @@
+"""Module to aggregate positions of a report snapshot as columns of NumPy arrays."""
+
+from decimal import Decimal
+import sys
+from typing import Iterator, List, Mapping, NamedTuple, Sequence, Tuple, Union
+
+import numpy as np
+
+from util.money import Money
+
+# Fields of a position key, in order
+KEY_FIELDS: Tuple[str, ...] = ('desk', 'trader', 'book', 'bond')
+
+# Relative rounding error of one float64 operation
+_EPSILON = sys.float_info.epsilon
+
+
+class PositionColumns(NamedTuple):
+    """Positions as columns, one row per (desk_id, trader_id, book_id, bond_id),
+    in the order of the snapshot's positions.
+    IDs are coded as integers, in the sorted order of their labels, so sorting codes sorts IDs.
+    Prices and rates are integer `Money.units`.
+    """
+    # Maps field in `KEY_FIELDS` and `currency` to its labels, indexed by code
+    labels: Mapping[str, List[str]]
+
+    # Maps field in `KEY_FIELDS` and `currency` to codes of each row
+    codes: Mapping[str, np.ndarray]
+
+    position: np.ndarray
+
+    # Scaled price of each bond and rate of each currency, indexed by code
+    bond_price: np.ndarray
+    currency_rate: np.ndarray
+
+    # Whether every price and rate was scaled exactly, otherwise values are computed with Decimal
+    is_exact: bool
+
+
+def _encode(values: Sequence[str]) -> Tuple[List[str], np.ndarray]:
+    """Helper function to code `values` by the sorted order of their labels."""
+    labels = sorted(set(values))
+    index = {label: code for code, label in enumerate(labels)}
+    codes = np.fromiter((index[value] for value in values), dtype=np.int64, count=len(values))
+    return labels, codes
+
+
+def _scale(value: Union[Decimal, None]) -> Tuple[int, bool]:
+    """Helper function to convert a price or rate to units of `Money`, and tell if it is exact."""
+    if value is None:
+        return 0, False
+    money = Money.from_decimal(value)
+    return money.units, money.to_decimal() == value
+
+
+def to_columns(
+    positions: Mapping[Tuple[str, str, str, str], int],
+    fx: Mapping[str, Decimal],
+    bonds: Mapping[str, Mapping[str, Union[str, Decimal]]],
+) -> PositionColumns:
+    """Convert positions of a snapshot to columns."""
+    keys = list(positions)
+    labels = {}
+    codes = {}
+    for i, field in enumerate(KEY_FIELDS):
+        labels[field], codes[field] = _encode([key[i] for key in keys])
+
+    bond_labels = labels['bond']
+    labels['currency'], bond_currency = _encode(
+        [bonds[bond_id]['currency'] for bond_id in bond_labels]
+    )
+    codes['currency'] = bond_currency[codes['bond']] if keys else np.zeros(0, dtype=np.int64)
+
+    is_exact = True
+    bond_price = np.zeros(len(bond_labels), dtype=np.int64)
+    for code, bond_id in enumerate(bond_labels):
+        bond_price[code], exact = _scale(bonds[bond_id]['price'])
+        is_exact = is_exact and exact
+    currency_rate = np.zeros(len(labels['currency']), dtype=np.int64)
+    for code, currency_id in enumerate(labels['currency']):
+        currency_rate[code], exact = _scale(fx[currency_id])
+        is_exact = is_exact and exact and currency_rate[code] != 0
+
+    return PositionColumns(
+        labels=labels,
+        codes=codes,
+        position=np.fromiter(positions.values(), dtype=np.int64, count=len(keys)),
+        bond_price=bond_price,
+        currency_rate=currency_rate,
+        is_exact=is_exact,
+    )
+
+
+def aggregate(
+    columns: PositionColumns,
+    fields: Sequence[str],
+    fx: Mapping[str, Decimal],
+    bonds: Mapping[str, Mapping[str, Union[str, Decimal]]],
+    order_by: Sequence[str] = None,
+) -> Iterator[Tuple[Tuple[str, ...], int, str]]:
+    """Sum positions and NV grouped by `fields`, in the sorted order of `fields`.
+    Yields (labels of `fields`, position, NV formatted to 2 decimal places) of each group.
+    Rows are sorted by `order_by` if given, which should start with `fields`,
+    otherwise by `fields` and then by their order in the snapshot.
+
+    NV is summed in float64 from the exact scaled integers. Groups whose sum is too close
+    to a rounding boundary of the second decimal place to round the same way as the exact
+    sum are summed again with Decimal in the same row order, so output is identical
+    to summing every row with Decimal.
+    """
+    n = len(columns.position)
+    if n == 0:
+        return
+    # Stable sort, first field last for lexsort
+    order = np.lexsort([columns.codes[field] for field in reversed(order_by or fields)])
+    sorted_codes = [columns.codes[field][order] for field in fields]
+    is_start = np.zeros(n, dtype=bool)
+    is_start[0] = True
+    for codes in sorted_codes:
+        is_start[1:] |= codes[1:] != codes[:-1]
+    starts = np.flatnonzero(is_start)
+    counts = np.diff(np.append(starts, n))
+
+    position = columns.position[order]
+    positions = np.add.reduceat(position, starts)
+    # Products of positions and scaled prices are exact in float64 below 2^53
+    is_vectorized = columns.is_exact and (
+        int(np.abs(position).max()) * int(columns.bond_price.max(initial=0)) < 2 ** 53
+    )
+    if is_vectorized:
+        # Each value is one correctly rounded division
+        numerator = position * columns.bond_price[columns.codes['bond'][order]]
+        values = numerator / columns.currency_rate[columns.codes['currency'][order]]
+        nvs = np.add.reduceat(values, starts)
+        # Bound on the error of each sum in cents, compared with its distance from a boundary
+        error = 100 * (counts + 3) * _EPSILON * np.add.reduceat(np.abs(values), starts)
+        cents = nvs * 100
+        is_close = np.abs(cents - np.floor(cents) - 0.5) <= error + 1e-6
+    else:
+        nvs = np.zeros(len(starts))
+        is_close = np.ones(len(starts), dtype=bool)
+
+    for group, start in enumerate(starts):
+        group_labels = tuple(
+            columns.labels[field][codes[start]] for field, codes in zip(fields, sorted_codes)
+        )
+        if is_close[group]:
+            nv = _sum_exact(columns, order[start:start + counts[group]], fx, bonds)
+            yield group_labels, int(positions[group]), f'{nv:.2f}'
+        else:
+            yield group_labels, int(positions[group]), f'{nvs[group]:.2f}'
+
+
+def _sum_exact(
+    columns: PositionColumns,
+    rows: np.ndarray,
+    fx: Mapping[str, Decimal],
+    bonds: Mapping[str, Mapping[str, Union[str, Decimal]]],
+) -> Decimal:
+    """Helper function to sum NV of `rows` with Decimal, in order."""
+    nv = 0
+    for row in rows:
+        bond = bonds[columns.labels['bond'][columns.codes['bond'][row]]]
+        nv += Decimal(int(columns.position[row])) * bond['price'] / fx[bond['currency']]
+    return nv
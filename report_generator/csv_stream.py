@@ -0,0 +1,38 @@
+"""Module to render csv reports in chunks as they are sent, optionally compressed with gzip."""
+
+import csv
+import io
+from itertools import islice
+from typing import Iterable, Iterator, List
+import zlib
+
+# Number of rows rendered into each chunk
+CHUNK_ROWS = 1000
+
+# Compression level of gzip, lower is faster
+GZIP_LEVEL = 6
+
+
+def iter_csv_chunks(rows: Iterable[List], chunk_rows: int = CHUNK_ROWS) -> Iterator[bytes]:
+    """Render `rows` to csv lazily, as UTF-8 encoded chunks of up to `chunk_rows` rows."""
+    rows = iter(rows)
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    batch = list(islice(rows, chunk_rows))
+    while batch:
+        writer.writerows(batch)
+        yield buffer.getvalue().encode('UTF-8')
+        buffer.seek(0)
+        buffer.truncate()
+        batch = list(islice(rows, chunk_rows))
+
+
+def gzip_chunks(chunks: Iterable[bytes], level: int = GZIP_LEVEL) -> Iterator[bytes]:
+    """Compress `chunks` into one gzip stream lazily.
+    Each chunk is flushed as it is compressed, so that it can be sent without waiting
+    for the compressor to fill its buffer.
+    """
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        yield compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+    yield compressor.flush()
@@ -0,0 +1,106 @@
+"""Module to cache responses of live portfolio endpoints until the next event is committed."""
+
+from datetime import datetime
+from functools import wraps
+import threading
+from typing import Callable, Dict, Tuple, Union
+
+from django.conf import settings
+from django.http import HttpRequest, HttpResponse
+from django.utils import timezone
+from django.views.decorators.http import condition
+
+from event_handler.event_sequencer import EventSequencer
+from util.singleton import Singleton
+from .report_cache import ReportCache
+
+# Headers of a view's response that are cached with its content
+CACHED_HEADERS = ('Content-Type', 'X-Total-Count')
+
+
+class LiveResponses(metaclass=Singleton):
+    """Class holding responses of live portfolio endpoints as of the latest committed event.
+    Cleared by signal `event_applied` after every commit, so responses are never stale.
+    """
+    _lock = threading.Lock()
+
+    # Maps request path to (content, headers) of responses
+    _cache = ReportCache(max_bytes=settings.LIVE_RESPONSE_CACHE_MAX_BYTES)
+
+    # Latest committed event and the time it was committed, unknown before the first commit
+    _event_id: Union[int, None] = None
+    _last_modified: Union[datetime, None] = None
+
+    def __init__(self):
+        pass
+
+    @property
+    def event_id(self) -> int:
+        """ID of the latest committed event."""
+        with self._lock:
+            if self._event_id is None:
+                self._event_id = EventSequencer().get_persisted_event_id()
+            return self._event_id
+
+    @property
+    def last_modified(self) -> Union[datetime, None]:
+        """Time the latest event was committed, None if not committed since startup."""
+        return self._last_modified
+
+    def get(self, path: str) -> Union[Tuple[bytes, Dict[str, str]], None]:
+        """Get content and headers of the cached response to `path`, or None."""
+        return self._cache.get(path)
+
+    def put(self, path: str, response: HttpResponse, event_id: int) -> None:
+        """Cache `response` to `path`, if it was made after event `event_id`
+        and no event has been committed since.
+        """
+        headers = {header: response[header] for header in CACHED_HEADERS if header in response}
+        with self._lock:
+            if event_id == self._event_id:
+                self._cache.put(path, (response.content, headers))
+
+    def on_event_applied(self, sender, event_id: int, **kwargs) -> None:
+        """Receiver of signal `event_applied`, clearing cached responses."""
+        with self._lock:
+            self._cache.clear()
+            self._event_id = event_id
+            self._last_modified = timezone.now()
+
+    def reset(self) -> None:
+        """Clear cached responses and forget the latest event, e.g. after DB is replaced."""
+        with self._lock:
+            self._cache.clear()
+            self._event_id = None
+            self._last_modified = None
+
+
+def live_response(view: Callable) -> Callable:
+    """Decorator for views of the live portfolio.
+    Adds ETag keyed on the latest committed event and Last-Modified, so that
+    conditional requests get 304 if no event has been committed since,
+    and serves responses from `LiveResponses` until the next event is committed.
+    """
+    @condition(
+        etag_func=lambda request, *args, **kwargs: f'"{LiveResponses().event_id}"',
+        last_modified_func=lambda request, *args, **kwargs: LiveResponses().last_modified,
+    )
+    @wraps(view)
+    def wrapper(request: HttpRequest, *args, **kwargs) -> HttpResponse:
+        responses = LiveResponses()
+        path = request.get_full_path()
+        cached = responses.get(path)
+        if cached is not None:
+            content, headers = cached
+            response = HttpResponse(content)
+            for header, value in headers.items():
+                response[header] = value
+            return response
+
+        # Read before the view, so data in the response is at least as new as the event
+        event_id = responses.event_id
+        response = view(request, *args, **kwargs)
+        if response.status_code == 200 and not response.streaming:
+            responses.put(path, response, event_id)
+        return response
+    return wrapper
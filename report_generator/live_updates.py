@@ -0,0 +1,264 @@
+"""Module to push live portfolio updates to the client UI with Server-Sent Events."""
+
+import asyncio
+import json
+import logging
+import threading
+from typing import Dict, List, Set, Tuple, Union
+
+from asgiref.sync import sync_to_async
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import close_old_connections
+
+from api.models import EventExceptionLog
+from event_handler.event_handlers import EventHandler
+from util.singleton import Singleton
+
+logger = logging.getLogger(__name__)
+
+# Path of the stream, served by the ASGI application in `PortfolioTracker/asgi.py`
+LIVE_UPDATES_PATH = '/api/live_updates'
+
+# Seconds between comments sent to keep idle streams open
+KEEPALIVE_SECONDS = 15
+
+# Maps view name to the fields of its rows that identify each row
+VIEW_KEYS: Dict[str, Tuple[str, ...]] = {
+    'cash': ('desk',),
+    'position': ('desk', 'trader', 'book'),
+    'bond': ('desk', 'trader', 'book', 'bond'),
+    'currency': ('desk', 'currency'),
+    'exclusions': ('event_id',),
+}
+
+# Maps view name to rows keyed by their key fields
+Views = Dict[str, Dict[Tuple, Dict]]
+
+
+def _format_message(message_type: str, event_id: int, data: Dict) -> bytes:
+    """Helper function to format a Server-Sent Event."""
+    payload = json.dumps({'event_id': event_id, **data}, cls=DjangoJSONEncoder)
+    return f'id: {event_id}\nevent: {message_type}\ndata: {payload}\n\n'.encode('UTF-8')
+
+
+def _format_snapshot(event_id: int, views: Views) -> bytes:
+    """Helper function to format all rows of all views."""
+    return _format_message('snapshot', event_id, {
+        'views': {name: list(rows.values()) for name, rows in views.items()},
+    })
+
+
+def _diff(old_rows: Dict[Tuple, Dict], new_rows: Dict[Tuple, Dict]) -> Dict[str, List]:
+    """Helper function to get rows added or changed in `new_rows`,
+    and keys of rows removed from `old_rows`.
+    """
+    return {
+        'upsert': [row for key, row in new_rows.items() if old_rows.get(key) != row],
+        'remove': [list(key) for key in old_rows if key not in new_rows],
+    }
+
+
+class Subscriber:
+    """Stream subscribed to live updates, with a bounded queue of messages on its event loop.
+    Should be created in its event loop.
+    """
+
+    def __init__(self, max_messages: int = 100):
+        self.loop = asyncio.get_running_loop()
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=max_messages)
+
+    def publish(self, message: bytes, event_id: int, views: Views) -> None:
+        """Queue `message` from any thread.
+        `views` are the views after the message, sent instead if the stream has fallen behind.
+        """
+        try:
+            self.loop.call_soon_threadsafe(self._put, message, event_id, views)
+        except RuntimeError:
+            # Event loop is closed, stream is being unsubscribed
+            pass
+
+    def _put(self, message: bytes, event_id: int, views: Views) -> None:
+        if self.queue.full():
+            # Too far behind to catch up with diffs, replace queued diffs with a snapshot
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            message = _format_snapshot(event_id, views)
+        self.queue.put_nowait(message)
+
+
+class LiveUpdates(metaclass=Singleton):
+    """Class to push live portfolio views to subscribed streams.
+    A new stream gets a snapshot of all views, then diffs of the views
+    each time applied events are committed.
+    Views are only kept and diffed while there are subscribers.
+    Views are rebuilt and diffed by a publisher thread, outside the lock of the event handler,
+    so that commits made while it works are merged into one diff.
+    """
+    _lock = threading.Lock()
+    _subscribers: Set[Subscriber] = set()
+
+    # Event ID and views last pushed to subscribers, None if there are no subscribers
+    _event_id: int = 0
+    _views: Union[Views, None] = None
+
+    # Set when events are committed, cleared by the publisher thread before it reads views
+    _changed = threading.Event()
+    _thread: Union[threading.Thread, None] = None
+
+    def __init__(self):
+        pass
+
+    def _read_views(self, exclusions: Dict[Tuple, Dict]) -> Tuple[int, Views]:
+        """Helper function to read all views, as of the latest committed event.
+        Only exclusions after those in `exclusions` are read from DB.
+        """
+        data = EventHandler().get_live_data()
+        event_id = data.pop('event_id')
+        views: Views = {
+            name: {tuple(row[field] for field in VIEW_KEYS[name]): row for row in rows}
+            for name, rows in data.items()
+        }
+
+        # Exclusions never change once logged
+        last_exclusion_id = max(exclusions)[0] if exclusions else 0
+        new_exclusions = (
+            EventExceptionLog.objects
+            .filter(event_id__gt=last_exclusion_id, event_id__lte=event_id)
+            .order_by('event_id')
+            .values(
+                'event_id', 'desk_id', 'trader_id', 'book_id', 'buy_sell', 'quantity',
+                'bond_id', 'price', 'exclusion_type',
+            )
+        )
+        views['exclusions'] = dict(exclusions)
+        for exclusion in new_exclusions:
+            views['exclusions'][(exclusion['event_id'],)] = {
+                'event_id': exclusion['event_id'],
+                'desk': exclusion['desk_id'],
+                'trader': exclusion['trader_id'],
+                'book': exclusion['book_id'],
+                'buy_sell': exclusion['buy_sell'],
+                'quantity': exclusion['quantity'],
+                'bond': exclusion['bond_id'],
+                'price': exclusion['price'],
+                'exclusion_type': exclusion['exclusion_type'],
+            }
+        return event_id, views
+
+    def start(self) -> None:
+        """Start the publisher thread if it is not running."""
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(
+                    target=self._run, name='live-updates', daemon=True
+                )
+                self._thread.start()
+
+    def subscribe(self, subscriber: Subscriber) -> bytes:
+        """Subscribe a stream to live updates, and return the snapshot to send first.
+        Diffs pushed later are relative to this snapshot.
+        """
+        self.start()
+        read: Union[Tuple[int, Views], None] = None
+        while True:
+            with self._lock:
+                if self._views is None and read is not None:
+                    self._event_id, self._views = read
+                if self._views is not None:
+                    self._subscribers.add(subscriber)
+                    return _format_snapshot(self._event_id, self._views)
+            # Read without holding `_lock`, so subscribing does not wait for the publisher,
+            # then checked again, as views may have been set or dropped meanwhile
+            read = self._read_views(exclusions={})
+
+    def unsubscribe(self, subscriber: Subscriber) -> None:
+        """Stop pushing live updates to a stream."""
+        with self._lock:
+            self._subscribers.discard(subscriber)
+            if not self._subscribers:
+                self._views = None
+
+    def on_event_applied(self, sender, event_id: int, **kwargs) -> None:
+        """Receiver of signal `event_applied`, waking the publisher thread.
+        Views are not read here, as the event handler still holds its lock.
+        """
+        self._changed.set()
+
+    def _run(self) -> None:
+        while True:
+            self._changed.wait()
+            self._changed.clear()
+            close_old_connections()
+            try:
+                self.publish_changes()
+            except Exception:  # pylint: disable=broad-except
+                logger.exception('Failed to push live updates')
+
+    def publish_changes(self) -> None:
+        """Push diffs of views since they were last pushed to subscribers,
+        so all events committed in between are in one diff.
+        """
+        with self._lock:
+            if not self._subscribers:
+                return
+            old_views = self._views
+            event_id, views = self._read_views(exclusions=old_views['exclusions'])
+            if event_id == self._event_id:
+                return
+            self._event_id, self._views = event_id, views
+
+            diffs = {}
+            for name, rows in self._views.items():
+                diff = _diff(old_views[name], rows)
+                if diff['upsert'] or diff['remove']:
+                    diffs[name] = diff
+            message = _format_message('update', self._event_id, {'views': diffs})
+            for subscriber in self._subscribers:
+                subscriber.publish(message, self._event_id, self._views)
+
+
+async def _wait_for_disconnect(receive) -> None:
+    while (await receive())['type'] != 'http.disconnect':
+        pass
+
+
+async def stream_live_updates(scope, receive, send) -> None:
+    """ASGI application streaming live updates as Server-Sent Events.
+    Sends event `snapshot` with all rows of all views, then event `update` with
+    rows to upsert and keys of rows to remove from each changed view.
+    """
+    subscriber = Subscriber()
+    snapshot = await sync_to_async(LiveUpdates().subscribe)(subscriber)
+    disconnected = asyncio.ensure_future(_wait_for_disconnect(receive))
+    try:
+        await send({
+            'type': 'http.response.start',
+            'status': 200,
+            'headers': [
+                (b'content-type', b'text/event-stream'),
+                (b'cache-control', b'no-cache'),
+                # Not served by Django, so CORS headers are set here
+                (b'access-control-allow-origin', b'*'),
+            ],
+        })
+        await send({'type': 'http.response.body', 'body': snapshot, 'more_body': True})
+
+        next_message = asyncio.ensure_future(subscriber.queue.get())
+        while not disconnected.done():
+            await asyncio.wait(
+                {next_message, disconnected},
+                timeout=KEEPALIVE_SECONDS,
+                return_when=asyncio.FIRST_COMPLETED,
+            )
+            if next_message.done():
+                body = next_message.result()
+                next_message = asyncio.ensure_future(subscriber.queue.get())
+            elif not disconnected.done():
+                body = b': keepalive\n\n'
+            else:
+                break
+            await send({'type': 'http.response.body', 'body': body, 'more_body': True})
+        next_message.cancel()
+    finally:
+        disconnected.cancel()
+        await sync_to_async(LiveUpdates().unsubscribe, thread_sensitive=False)(subscriber)
@@ -0,0 +1,45 @@
+"""Command to output reports at many events to files in one sweep, without HTTP."""
+
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from event_handler.event_handlers import EventHandler
+from report_generator.report_generator import ReportGenerator
+from util.common_fns import parse_target_ids
+
+
+class Command(BaseCommand):
+    help = (
+        'Output the reports at each of many events to `out/output_<id>/`, '
+        'replaying the event logs once forward.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'target_ids',
+            help='comma separated event IDs and inclusive ranges, e.g. 5,100-1000:100',
+        )
+        parser.add_argument(
+            '--max-ids', type=int, default=settings.EXPORT_MAX_TARGETS,
+            help='maximum number of event IDs',
+        )
+
+    def handle(self, *args, **options):
+        try:
+            target_ids = parse_target_ids(
+                options['target_ids'],
+                last_event_id=EventHandler().get_latest_event_id(),
+                max_ids=options['max_ids'],
+            )
+        except ValueError as e:
+            raise CommandError(str(e)) from e
+
+        start = time.perf_counter()
+        ReportGenerator().export_reports(target_ids)
+        seconds = time.perf_counter() - start
+        self.stdout.write(
+            f'Reports for {len(target_ids)} events from {target_ids[0]} to {target_ids[-1]} '
+            f'in {seconds:.2f}s, written to {ReportGenerator.OUT_DIR}'
+        )
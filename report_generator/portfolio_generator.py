@@ -9,6 +9,7 @@ from django.db.models import QuerySet
 from api.models import (
     FX, Bond, Desk, Trader, Book, BondRecord, EventLog, EventExceptionLog
 )
+from event_handler.event_handlers import EventHandler
 from util.singleton import Singleton
 
 
@@ -26,82 +27,78 @@ class PortfolioGenerator(metaclass=Singleton):
         return serializers.serialize('json', Desk.objects.all())
 
     def generate_position_level_data(self) -> List[Dict]:
-        """Generate newest position level portfolio data."""
-        query_results = BondRecord.objects.raw(
-            """
-            SELECT
-                id,
-                api_desk.desk_id,
-                api_trader.trader_id,
-                api_book.book_id,
-                sum(api_bondrecord.position) AS position,
-                sum(api_bondrecord.position * api_bond.price / api_fx.rate) AS NV
-            FROM api_bondrecord, api_bond, api_fx, api_desk, api_trader, api_book
-            WHERE api_bondrecord.bond_id = api_bond.bond_id
-            AND api_bondrecord.book_id = api_book.book_id
-            AND api_bondrecord.trader_id = api_trader.trader_id
-            AND api_trader.desk_id = api_desk.desk_id
-            AND api_bond.currency_id = api_fx.currency_id
-            GROUP BY api_desk.desk_id, api_trader.trader_id, api_book.book_id
-            ORDER BY api_desk.desk_id, api_trader.trader_id, api_book.book_id;
-            """
-        )
-        res: List = []
-        for record in query_results:
-            res.append({
-                'desk': record.desk_id,
-                'trader': record.trader_id,
-                'book': record.book_id,
-                'position': record.position,
-                'NV': record.NV,
-            })
-        return res
+        """Generate newest position level portfolio data,
+        from aggregates maintained in memory as events are applied.
+        """
+        return EventHandler().get_position_level_data()
 
-    def generate_bond_level_data(self) -> List[Dict]:
-        """Generate newest position level portfolio data."""
-        bond_records: QuerySet = BondRecord.objects.all().order_by('trader', 'book', 'bond')
-        res: List = []
-        for record in bond_records:
-            res.append({
-                'desk': serializers.serialize('python', [record.trader.desk])[0],
-                'trader': serializers.serialize('python', [record.trader])[0],
-                'book': serializers.serialize('python', [record.book])[0],
-                'bond': serializers.serialize('python', [record.bond])[0],
-                'position': record.position,
-                'NV': Decimal(record.position) * record.bond.price  / record.bond.currency.rate,
-            })
-        return res
+    def get_bond_records(
+        self,
+        desk_id: str = None,
+        trader_id: str = None,
+        book_id: str = None,
+    ) -> QuerySet:
+        """Get bond records, optionally filtered by desk, trader and book,
+        ordered by trader, book and bond.
+        """
+        bond_records: QuerySet = BondRecord.objects.all()
+        if desk_id:
+            bond_records = bond_records.filter(trader__desk_id=desk_id)
+        if trader_id:
+            bond_records = bond_records.filter(trader_id=trader_id)
+        if book_id:
+            bond_records = bond_records.filter(book_id=book_id)
+        return bond_records.order_by('trader', 'book', 'bond')
 
-    def generate_currency_level_data(self) -> List[Dict]:
-        """Generate newest currency level portfolio data."""
-        query_results = BondRecord.objects.raw(
-            """
-            SELECT
-                id,
-                api_desk.desk_id, api_fx.currency_id,
-                sum(api_bondrecord.position) AS position,
-                sum(api_bondrecord.position * api_bond.price / api_fx.rate) AS NV
-            FROM api_bondrecord, api_bond, api_fx, api_desk, api_trader, api_book
-            WHERE api_bondrecord.bond_id = api_bond.bond_id
-            AND api_bondrecord.book_id = api_book.book_id
-            AND api_bondrecord.trader_id = api_trader.trader_id
-            AND api_trader.desk_id = api_desk.desk_id
-            AND api_bond.currency_id = api_fx.currency_id
-            GROUP BY api_desk.desk_id, api_fx.currency_id
-            ORDER BY api_desk.desk_id, api_fx.currency_id;
-            """
+    def generate_bond_level_data(
+        self,
+        desk_id: str = None,
+        trader_id: str = None,
+        book_id: str = None,
+        offset: int = 0,
+        limit: int = None,
+    ) -> List[Dict]:
+        """Generate newest bond level portfolio data with one query,
+        optionally filtered by desk, trader and book, and paginated by `offset` and `limit`.
+        """
+        bond_records: QuerySet = self.get_bond_records(
+            desk_id=desk_id, trader_id=trader_id, book_id=book_id
+        ).values_list(
+            'trader__desk_id',
+            'trader_id',
+            'book_id',
+            'bond_id',
+            'bond__currency_id',
+            'position',
+            'bond__price',
+            'bond__currency__rate',
         )
+        if limit is not None:
+            bond_records = bond_records[offset:offset + limit]
+        elif offset:
+            bond_records = bond_records[offset:]
 
         res: List = []
-        for record in query_results:
+        for (
+            desk, trader, book, bond, currency, position, price, rate
+        ) in bond_records:
             res.append({
-                'desk': record.desk_id,
-                'currency': record.currency_id,
-                'position': record.position,
-                'NV': record.NV,
+                'desk': desk,
+                'trader': trader,
+                'book': book,
+                'bond': bond,
+                'currency': currency,
+                'position': position,
+                'NV': Decimal(position) * price / rate,
             })
         return res
 
+    def generate_currency_level_data(self) -> List[Dict]:
+        """Generate newest currency level portfolio data,
+        from aggregates maintained in memory as events are applied.
+        """
+        return EventHandler().get_currency_level_data()
+
     def generate_exclusion_data(self) -> List[Dict]:
         """Generate newest exclusion data."""
         exclusions = EventExceptionLog.objects.all()
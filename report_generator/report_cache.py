@@ -0,0 +1,71 @@
+"""Module to cache report snapshots and rendered reports in memory."""
+
+from collections import OrderedDict
+from collections.abc import Mapping
+import sys
+import threading
+from typing import Any, Hashable, Tuple, Union
+
+
+def estimate_size(value: Any) -> int:
+    """Helper function to estimate memory used by `value` in bytes,
+    including the contents of mappings, lists and tuples.
+    """
+    size = sys.getsizeof(value)
+    if isinstance(value, Mapping):
+        size += sum(estimate_size(k) + estimate_size(v) for k, v in value.items())
+    elif isinstance(value, (list, tuple)):
+        size += sum(estimate_size(item) for item in value)
+    return size
+
+
+class ReportCache:
+    """Thread-safe LRU cache, bounded by the estimated memory of its values.
+    Cached values are shared between readers and must never be changed.
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+
+        # Maps key to (value, size), from least to most recently used
+        self._entries: 'OrderedDict[Hashable, Tuple[Any, int]]' = OrderedDict()
+        self._size: int = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @property
+    def size(self) -> int:
+        """Estimated memory used by cached values in bytes."""
+        return self._size
+
+    def get(self, key: Hashable) -> Union[Any, None]:
+        """Get value of `key` and mark it as most recently used, or None if not cached."""
+        with self._lock:
+            if key not in self._entries:
+                return None
+            self._entries.move_to_end(key)
+            return self._entries[key][0]
+
+    def put(self, key: Hashable, value: Any) -> None:
+        """Cache `value` under `key`, evicting least recently used values to stay within
+        `max_bytes`. Values larger than `max_bytes` are not cached.
+        """
+        size = estimate_size(value)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._size -= self._entries.pop(key)[1]
+            self._entries[key] = (value, size)
+            self._size += size
+            while self._size > self.max_bytes:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self._size -= evicted_size
+
+    def clear(self) -> None:
+        """Remove all cached values."""
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
@@ -1,27 +1,91 @@
 """Module to generate reports."""
 
 
+from concurrent.futures import Future, ThreadPoolExecutor
 from pathlib import Path
 import csv
 from decimal import Decimal
-from typing import Callable, Dict, List, Tuple, Union
-from itertools import groupby
+import io
+import threading
+from types import MappingProxyType
+from typing import Callable, Dict, Iterable, Iterator, List, Mapping, NamedTuple, Tuple, Type, Union
 
-from django.http import HttpResponse
+from django.conf import settings
+from django.db import models, transaction
+from django.db.models import Max
+from django.http import HttpResponse, StreamingHttpResponse
+from django.utils.cache import patch_vary_headers
 
 from api.models import (
     FX, Bond, Desk, BondRecord, EventLog, EventExceptionLog, FxEventLog, PriceEventLog,
+    StateCheckpoint,
 )
+from event_handler.event_sequencer import EventSequencer
+from util.money import Money
 from util.singleton import Singleton
-from util import common_fns
+from .columnar import KEY_FIELDS, PositionColumns, aggregate, to_columns
+from .csv_stream import CHUNK_ROWS, gzip_chunks, iter_csv_chunks
+from .report_cache import ReportCache
+
+
+class ReportSnapshot(NamedTuple):
+    """Read-only state of data at event `event_id`, from which reports are written."""
+    event_id: int
+
+    # Maps (desk_id, trader_id, book_id, bond_id) to position
+    positions: Mapping[Tuple[str, str, str, str], int]
+
+    # Maps desk_id to cash
+    cash: Mapping[str, Money]
+
+    # Maps currency to rate
+    fx: Mapping[str, Decimal]
+
+    # Maps bond_id to a mapping with keys 'currency', 'price'
+    bonds: Mapping[str, Mapping[str, Union[str, Decimal]]]
+
+    # Positions as columns, aggregated by the report writers
+    columns: PositionColumns
 
 
 class ReportGenerator(metaclass=Singleton):
-    """Class to generate reports."""
+    """Class to generate reports.
+
+    Data is moved through events in one working state, from which read-only snapshots are
+    taken. Snapshots and rendered reports of applied events never change, so they are kept in
+    an LRU cache shared by all requests.
+    """
     OUT_DIR = Path(__file__).absolute().parent.parent / 'out'
 
+    _REPORT_TYPES: Tuple[str, ...] = (
+        'cash_level_portfolio',
+        'position_level_portfolio',
+        'bond_level_portfolio',
+        'currency_level_portfolio',
+        'exclusions',
+    )
+
+    # Reports that read DB as well as the snapshot, so are rendered on the requesting thread
+    _DB_REPORT_TYPES: Tuple[str, ...] = ('exclusions',)
+
+    # Working state is moved by one request at a time
+    _lock = threading.RLock()
+
+    # Maps event ID to ReportSnapshot, and (event ID, report type) to rendered report
+    _cache = ReportCache(max_bytes=settings.REPORT_CACHE_MAX_BYTES)
+
+    # Renders reports from snapshots for `output_reports`, with threads started on first use
+    _executor = ThreadPoolExecutor(
+        max_workers=settings.REPORT_WORKERS, thread_name_prefix='report-writer'
+    )
+
+    # Latest event ID known to be committed to DB
+    _committed_event_id: int = 0
+
+    # Number of rows fetched at a time when streaming logs and records from DB
+    _CHUNK_SIZE: int = 2000
+
     # Stores states of data at event_id = `_state_id`
-    # Singleton implementation means only 1 state is stored at a time
     _state_id: int = 0
 
     # Maps (desk_id, trader_id, book_id, bond_id) to position
@@ -31,7 +95,7 @@ class ReportGenerator(metaclass=Singleton):
     _fx: Dict[str, Decimal] = {}
 
     # Maps desk_id to cash
-    _desks: Dict[str, Decimal] = {}
+    _desks: Dict[str, Money] = {}
 
     # Maps bond_id to a dict with keys 'currency', 'price'
     _bonds: Dict[str, Dict[str, Union[str, Decimal]]] = {}
@@ -47,59 +111,110 @@ class ReportGenerator(metaclass=Singleton):
         bonds: List[Bond] = Bond.objects.all()
         for bond in bonds:
             self._bonds[bond.bond_id] = {
-                'currency': bond.currency.currency_id,
+                'currency': bond.currency_id,
                 'price': bond.price,
             }
 
         desks: List[Desk] = Desk.objects.all()
         for desk in desks:
-            self._desks[desk.desk_id] = desk.cash
+            self._desks[desk.desk_id] = Money.from_decimal(desk.cash)
 
     def _get_curr_bond_records(self) -> None:
-        """Helper function to get and reformat current bond records."""
-        curr_bond_records: List[BondRecord] = BondRecord.objects.all().order_by('trader', 'book')
+        """Helper function to get and reformat current bond records,
+        streamed as tuples of IDs and position with one query.
+        """
+        curr_bond_records = (
+            BondRecord.objects
+            .order_by('trader', 'book')
+            .values_list('trader__desk_id', 'trader_id', 'book_id', 'bond_id', 'position')
+            .iterator(chunk_size=self._CHUNK_SIZE)
+        )
 
         # Unpacking current bond records for further manipulation
         records: Dict[Tuple[str, str, str, str], Decimal]= {}
-        for record in curr_bond_records:
-            bond: Bond = record.bond
-            desk: Desk = record.trader.desk
-
-            desk_id = desk.desk_id
-            trader_id = record.trader.trader_id
-            book_id = record.book.book_id
-            bond_id = bond.bond_id
-            key: Tuple[str, str, str, str] = (
-                desk_id, trader_id, book_id, bond_id,
-            )
-
-            value: Decimal = record.position
-
-            records[key] = value
+        for desk_id, trader_id, book_id, bond_id, position in curr_bond_records:
+            records[(desk_id, trader_id, book_id, bond_id)] = position
 
         self._state_data = records
 
     def _reset_states(self) -> None:
-        """Helper function to reset current data."""
+        """Helper function to reset current data and cached reports."""
+        self._cache.clear()
+        self._committed_event_id = 0
         self._state_id = 0
         self._state_data = {}
         self._fx = {}
         self._bonds = {}
         self._desks = {}
 
-    def _set_up(self) -> None:
-        """Helper function to set up data for report generation."""
-        if self._state_id <= 0:
+    def _load_live_state(self) -> None:
+        """Helper function to load the live state from DB.
+        Read in one transaction so that the records match the event ID.
+        """
+        with transaction.atomic():
             self._get_curr_bonds_fx_desk_records()
             self._get_curr_bond_records()
-            self._state_id = common_fns.get_largest_event_id()
+            self._state_id = EventSequencer().get_persisted_event_id()
+
+    def _load_checkpoint(self, checkpoint_id: int) -> None:
+        """Helper function to load the state from the checkpoint of event `checkpoint_id`."""
+        checkpoint: StateCheckpoint = StateCheckpoint.objects.get(event_id=checkpoint_id)
+        currencies: Dict[str, str] = dict(Bond.objects.values_list('bond_id', 'currency_id'))
+
+        self._state_data = {
+            (desk_id, trader_id, book_id, bond_id): position
+            for desk_id, trader_id, book_id, bond_id, position in checkpoint.positions
+        }
+        self._desks = {
+            desk_id: Money.from_decimal(cash) for desk_id, cash in checkpoint.cash.items()
+        }
+        self._fx = {currency_id: Decimal(rate) for currency_id, rate in checkpoint.fx.items()}
+        self._bonds = {
+            bond_id: {
+                'currency': currencies[bond_id],
+                'price': Decimal(price) if price is not None else None,
+            }
+            for bond_id, price in checkpoint.prices.items()
+        }
+        self._state_id = checkpoint.event_id
+
+    def _set_up(self, target_id: int) -> None:
+        """Helper function to set up data for report generation,
+        starting from whichever state needs the fewest events replayed to reach `target_id`:
+        the current state, the latest checkpoint on or before `target_id`, or the live state.
+        """
+        # List of (number of events to replay, function to load the state)
+        starts: List[Tuple[int, Union[Callable, None]]] = []
+        if self._state_id > 0:
+            starts.append((abs(target_id - self._state_id), None))
+
+        checkpoint_id: Union[int, None] = (
+            StateCheckpoint.objects
+            .filter(event_id__lte=target_id)
+            .order_by('-event_id')
+            .values_list('event_id', flat=True)
+            .first()
+        )
+        if checkpoint_id is not None:
+            starts.append((
+                target_id - checkpoint_id, lambda: self._load_checkpoint(checkpoint_id)
+            ))
+
+        starts.append((
+            abs(EventSequencer().last_event_id - target_id), self._load_live_state
+        ))
+
+        # Current state is kept on ties, as it needs no loading
+        _, load = min(starts, key=lambda start: start[0])
+        if load is not None:
+            load()
 
     def _move_to_target_state(self, target_id: int) -> None:
         """Helper function to move to target state."""
         if self._state_id == target_id:
             return
 
-        self._set_up()
+        self._set_up(target_id)
         if self._state_id < target_id:
             self._advance_events(target_id)
         elif self._state_id > target_id:
@@ -108,255 +223,285 @@ class ReportGenerator(metaclass=Singleton):
         self._move_fx_bonds_states(target_id)
         self._state_id = target_id
 
+    def _get_trade_logs(self, start_id: int, end_id: int, newest_first: bool):
+        """Helper function to stream logs of trade events from `start_id` to `end_id`
+        (inclusive) with one query, as tuples of
+        (desk_id, trader_id, book_id, bond_id, buy_sell, quantity, value).
+        """
+        return (
+            EventLog.objects
+            .filter(event_id__range=(start_id, end_id))
+            .order_by('-event_id' if newest_first else 'event_id')
+            .values_list(
+                'desk_id', 'trader_id', 'book_id', 'bond_id', 'buy_sell', 'quantity', 'value'
+            )
+            .iterator(chunk_size=self._CHUNK_SIZE)
+        )
+
     def _advance_events(self, target_id: int) -> None:
         """Query DB for logs of events strictly after state_id
         and before target_id (inclusive), and apply them.
         """
 
         # Logs are ordered from oldest to newest
-        logs: List[EventLog] = (
-            EventLog.objects
-            .filter(event_id__range=(self._state_id + 1, target_id))
-            .order_by('event_id')
-        )
-
-        if logs.exists():
-            for log in logs:
-                key = (
-                    log.desk.desk_id,
-                    log.trader.trader_id,
-                    log.book.book_id,
-                    log.bond.bond_id,
-                )
-                if key not in self._state_data:
-                    # Can safely set position to 0 because current log is a buy event
-                    self._state_data[key] = 0
-
-                # Applying value changes from buy/sell trade events
-                if log.buy_sell == 'buy':
-                    self._desks[log.desk.desk_id] -= log.value
-                    self._state_data[key] += log.quantity
-                elif log.buy_sell == 'sell':
-                    self._desks[log.desk.desk_id] += log.value
-                    self._state_data[key] -= log.quantity
+        logs = self._get_trade_logs(self._state_id + 1, target_id, newest_first=False)
+        cash_changes: Dict[str, Decimal] = {}
+        for desk_id, trader_id, book_id, bond_id, buy_sell, quantity, value in logs:
+            key = (desk_id, trader_id, book_id, bond_id)
+            if key not in self._state_data:
+                # Can safely set position to 0 because current log is a buy event
+                self._state_data[key] = 0
+
+            # Applying value changes from buy/sell trade events
+            if buy_sell == 'buy':
+                cash_changes[desk_id] = cash_changes.get(desk_id, 0) - value
+                self._state_data[key] += quantity
+            elif buy_sell == 'sell':
+                cash_changes[desk_id] = cash_changes.get(desk_id, 0) + value
+                self._state_data[key] -= quantity
+        self._apply_cash_changes(cash_changes)
 
     def _backtrack_events(self, target_id: int) -> None:
         """Query DB for logs of events strictly after target_id, and reverse them."""
 
         # Logs are ordered from newest to oldest
-        logs: List[EventLog] = (
-            EventLog.objects
-            .filter(event_id__range=(target_id + 1, self._state_id))
-            .order_by('-event_id')
+        logs = self._get_trade_logs(target_id + 1, self._state_id, newest_first=True)
+        cash_changes: Dict[str, Decimal] = {}
+        for desk_id, trader_id, book_id, bond_id, buy_sell, quantity, value in logs:
+            key = (desk_id, trader_id, book_id, bond_id)
+
+            # Undoing value changes from buy/sell trade events
+            if buy_sell == 'buy':
+                cash_changes[desk_id] = cash_changes.get(desk_id, 0) + value
+                self._state_data[key] -= quantity
+            elif buy_sell == 'sell':
+                cash_changes[desk_id] = cash_changes.get(desk_id, 0) - value
+                self._state_data[key] += quantity
+        self._apply_cash_changes(cash_changes)
+
+    def _apply_cash_changes(self, cash_changes: Dict[str, Decimal]) -> None:
+        """Helper function to add the total change of cash of each desk to its cash.
+        Logged values have at most `DB_DECIMAL_PLACES` decimal places, so their totals
+        are exact and are converted to `Money` once per desk rather than once per log.
+        """
+        for desk_id, change in cash_changes.items():
+            self._desks[desk_id] += Money.from_decimal(change)
+
+    def _get_values_as_of(
+        self, log_model: Type[models.Model], key: str, value: str, target_id: int
+    ) -> Dict[str, Decimal]:
+        """Helper function to get the latest `value` of every `key` logged in `log_model`
+        on or before `target_id`, with one query.
+        """
+        latest_event_ids = (
+            log_model.objects
+            .filter(event_id__lte=target_id)
+            .order_by()
+            .values(key)
+            .annotate(latest_event_id=Max('event_id'))
+            .values('latest_event_id')
+        )
+        return dict(
+            log_model.objects
+            .filter(event_id__in=latest_event_ids)
+            .values_list(key, value)
         )
-
-        if logs.exists():
-        # Logs are ordered from newest to oldest
-            for log in logs:
-                key = (
-                    log.desk.desk_id,
-                    log.trader.trader_id,
-                    log.book.book_id,
-                    log.bond.bond_id,
-                )
-
-                # Undoing value changes from buy/sell trade events
-                if log.buy_sell == 'buy':
-                    self._desks[log.desk.desk_id] += log.value
-                    self._state_data[key] -= log.quantity
-                elif log.buy_sell == 'sell':
-                    self._desks[log.desk.desk_id] -= log.value
-                    self._state_data[key] += log.quantity
 
     def _move_fx_bonds_states(self, target_id: int) -> None:
-        """Helper function to update fx and bonds state."""
-        # Iterate to update any unreflected fx changes
-        for currency_id, _ in self._fx.items():
-            # Retrieve latest fx change for `currency_id` that happened on or before `target_id`
-            fx_log = (
-                FxEventLog.objects
-                .filter(currency__currency_id=currency_id)
-                .filter(event_id__lte=target_id)
-                .order_by('-event_id')
-            )
-            if fx_log.exists():
-                self._fx[currency_id] = fx_log.first().rate
-            else:
-                # No fx change for `currency_id` happened on or before `target_id`
-                self._fx[currency_id] = FX.objects.get(currency_id=currency_id).initial
-
-        # Iterate to update any unreflected price changes
+        """Helper function to update fx and bonds state,
+        with a constant number of queries regardless of the number of currencies and bonds.
+        """
+        # Currencies and bonds without changes on or before `target_id` are at initial values
+        rates: Dict[str, Decimal] = dict(FX.objects.values_list('currency_id', 'initial'))
+        rates.update(self._get_values_as_of(FxEventLog, 'currency', 'rate', target_id))
+        for currency_id in self._fx:
+            self._fx[currency_id] = rates[currency_id]
+
+        prices: Dict[str, Decimal] = dict(Bond.objects.values_list('bond_id', 'initial_price'))
+        prices.update(self._get_values_as_of(PriceEventLog, 'bond', 'price', target_id))
         for bond_id, fields in self._bonds.items():
-            # Retrieve latest price change for `bond_id` that happened on or before `target_id`
-            price_log = (
-                PriceEventLog.objects
-                .filter(bond__bond_id=bond_id)
-                .filter(event_id__lte=target_id)
-                .order_by('-event_id')
-            )
-            if price_log.exists():
-                fields['price'] = price_log.first().price
-                self._bonds[bond_id] = fields
+            fields['price'] = prices[bond_id]
+
+    def _is_committed(self, target_id: int) -> bool:
+        """Helper function to check if all events up to `target_id` are committed to DB,
+        so that data at `target_id` can no longer change.
+        """
+        if target_id > self._committed_event_id:
+            self._committed_event_id = EventSequencer().get_persisted_event_id()
+        return target_id <= self._committed_event_id
+
+    def _take_snapshot(self) -> ReportSnapshot:
+        """Helper function to copy the working state into a read-only snapshot."""
+        positions = MappingProxyType(dict(self._state_data))
+        fx = MappingProxyType(dict(self._fx))
+        bonds = MappingProxyType({
+            bond_id: MappingProxyType(dict(fields))
+            for bond_id, fields in self._bonds.items()
+        })
+        return ReportSnapshot(
+            event_id=self._state_id,
+            positions=positions,
+            cash=MappingProxyType(dict(self._desks)),
+            fx=fx,
+            bonds=bonds,
+            columns=to_columns(positions, fx, bonds),
+        )
+
+    def _get_snapshot(self, target_id: int) -> ReportSnapshot:
+        """Helper function to get the snapshot at event `target_id`, from cache if possible."""
+        snapshot: Union[ReportSnapshot, None] = self._cache.get(target_id)
+        if snapshot is not None:
+            return snapshot
+
+        with self._lock:
+            # Checked before reading DB, so a cached snapshot never misses later commits
+            is_committed = self._is_committed(target_id)
+            self._move_to_target_state(target_id)
+            snapshot = self._take_snapshot()
+            if is_committed:
+                self._cache.put(target_id, snapshot)
             else:
-                # No price change for `bond_id` happened on or before `target_id`
-                self._bonds[bond_id]['price'] = Bond.objects.get(bond_id=bond_id).initial_price
+                # Working state misses events applied later, so it is not reused
+                self._state_id = 0
+        return snapshot
+
+    def _render_report(self, target_id: int, report_type: str) -> bytes:
+        """Helper function to render report of `report_type` at event `target_id` to csv,
+        from cache if possible.
+        """
+        if report_type not in self._REPORT_TYPES:
+            raise ValueError(f'Unknown report type: {report_type}')
 
+        content: Union[bytes, None] = self._cache.get((target_id, report_type))
+        if content is not None:
+            return content
 
-    def _write_cash_level_data(self, destination, target_id):
-        """Helper to write cash level data to file or stream. Then return the same object.
-        @ignored_param:` target_id`
+        is_committed = self._is_committed(target_id)
+        return self._render_snapshot(self._get_snapshot(target_id), report_type, is_committed)
+
+    def _render_snapshot(
+        self, snapshot: ReportSnapshot, report_type: str, is_committed: bool
+    ) -> bytes:
+        """Helper function to render report of `report_type` from `snapshot` to csv,
+        from cache if possible. Only reports of `_DB_REPORT_TYPES` read DB.
+        @param is_committed: whether the snapshot's event was committed before it was taken,
+        in which case the report is cached.
         """
+        content: Union[bytes, None] = self._cache.get((snapshot.event_id, report_type))
+        if content is not None:
+            return content
+
+        destination = io.StringIO()
+        csv.writer(destination).writerows(self._iter_rows(snapshot, report_type))
+        content = destination.getvalue().encode('UTF-8')
+        if is_committed:
+            self._cache.put((snapshot.event_id, report_type), content)
+        return content
+
+    def _iter_rows(self, snapshot: ReportSnapshot, report_type: str) -> Iterator[List]:
+        """Helper function to get rows of report of `report_type` from `snapshot`, header first."""
+        type_to_fn_mapping: Dict[str, Callable] = {
+            'cash_level_portfolio': self._iter_cash_level_rows,
+            'position_level_portfolio': self._iter_position_level_rows,
+            'bond_level_portfolio': self._iter_bond_level_rows,
+            'currency_level_portfolio': self._iter_currency_level_rows,
+            'exclusions': self._iter_exclusion_rows,
+        }
+        return type_to_fn_mapping[report_type](snapshot)
 
-        writer = csv.writer(destination)
-        writer.writerow([
+    def _iter_cash_level_rows(self, snapshot: ReportSnapshot) -> Iterator[List]:
+        """Helper to get rows of cash level data, header first."""
+        yield [
             'Desk',
             'Cash',
-        ])
-        for desk_id, cash in self._desks.items():
-            writer.writerow([
+        ]
+        for desk_id, cash in snapshot.cash.items():
+            yield [
                 desk_id,
                 f'{cash:.2f}',
-            ])
-        return destination
+            ]
 
-    def _write_position_level_data(self, destination, target_id):
-        """Helper to write position level data to file or stream. Then return the same object.
-        @ignored_param:` target_id`
-        """
-
-        # Sort before groupby
-        sorted_items = sorted(self._state_data.items(), key=lambda x: x[0])
-
-        temp = []
-        # Group by [desk, trader, book] and storing the groups in temp for further manipulation
-        for key, group in groupby(sorted_items, key=lambda x: x[0][0:3]):
-            temp.append((key, list(group)))
-
-        data = []
-        for key, group in temp:
-            position = sum(x[1] for x in group)
-            NV = sum(
-                Decimal(x[1]) * self._bonds[x[0][3]]['price'] \
-                    / self._fx[self._bonds[x[0][3]]['currency']] for x in group
-            )
-            data.append((key, position, NV))
-
-        writer = csv.writer(destination)
-        writer.writerow([
+    def _iter_position_level_rows(self, snapshot: ReportSnapshot) -> Iterator[List]:
+        """Helper to get rows of position level data, header first."""
+        yield [
             'Desk',
             'Trader',
             'Book',
             'Position',
             'Value',
-        ])
-        for key, position, NV in data:
+        ]
+        # Group by [desk, trader, book], with bonds of each group in order
+        for key, position, NV in aggregate(
+            snapshot.columns, KEY_FIELDS[:3], snapshot.fx, snapshot.bonds, order_by=KEY_FIELDS
+        ):
             if position > 0:
-                writer.writerow([
+                yield [
                     key[0],
                     key[1],
                     key[2],
                     position,
-                    f'{NV:.2f}',
-                ])
-        return destination
+                    NV,
+                ]
 
-    def _write_bond_level_data(self, destination, target_id):
-        """Helper to write bond level data to file or stream. Then return the same object.
-        @ignored_param:` target_id`
-        """
-
-        # Sort before groupby
-        sorted_items = sorted(self._state_data.items(), key=lambda x: x[0])
-
-        temp = []
-        # Group by [desk, trader, book, bond] and store the groups in temp for further manipulation
-        for key, group in groupby(sorted_items, key=lambda x: x[0]):
-            temp.append((key, list(group)))
-
-        data = []
-        for key, group in temp:
-            position = sum(x[1] for x in group)
-            NV = sum(
-                Decimal(x[1]) * self._bonds[x[0][3]]['price'] \
-                    / self._fx[self._bonds[x[0][3]]['currency']] for x in group
-            )
-            data.append((key, position, NV))
-
-        writer = csv.writer(destination)
-        writer.writerow([
+    def _iter_bond_level_rows(self, snapshot: ReportSnapshot) -> Iterator[List]:
+        """Helper to get rows of bond level data, header first."""
+        yield [
             'Desk',
             'Trader',
             'Book',
             'BondID',
             'Position',
             'Value',
-        ])
-        for key, position, NV in data:
+        ]
+        # Group by [desk, trader, book, bond]
+        for key, position, NV in aggregate(
+            snapshot.columns, KEY_FIELDS, snapshot.fx, snapshot.bonds
+        ):
             if position > 0:
-                writer.writerow([
+                yield [
                     key[0],
                     key[1],
                     key[2],
                     key[3],
                     position,
-                    f'{NV:.2f}',
-                ])
-        return destination
+                    NV,
+                ]
 
-    def _write_currency_level_data(self, destination, target_id):
-        """Helper to write currency level data to file or stream. Then return the same object.
-        @ignored_param:` target_id`
-        """
-
-        def get_key(x):
-            # x is a tuple-like of ((desk_id, trader_id, book_id, bond_id), position)
-            desk_id = x[0][0]
-            ccy_id = self._bonds[x[0][3]]['currency']
-            return (desk_id, ccy_id)
-
-        # Sort before groupby
-        sorted_items = sorted(self._state_data.items(), key=get_key)
-
-        temp = []
-        # Group by [desk, currency] and storing the groups in temp for further manipulation
-        for key, group in groupby(sorted_items, key=get_key):
-            temp.append((key, list(group)))
-
-        data = []
-        for key, group in temp:
-            position = sum(x[1] for x in group)
-            NV = sum(
-                Decimal(x[1]) * self._bonds[x[0][3]]['price'] \
-                    / self._fx[self._bonds[x[0][3]]['currency']] for x in group
-            )
-            data.append((key, position, NV))
-
-        writer = csv.writer(destination)
-        writer.writerow([
+    def _iter_currency_level_rows(self, snapshot: ReportSnapshot) -> Iterator[List]:
+        """Helper to get rows of currency level data, header first."""
+        yield [
             'Desk',
             'Currency',
             'Position',
             'Value',
-        ])
-        for key, position, NV in data:
+        ]
+        # Group by [desk, currency]
+        for key, position, NV in aggregate(
+            snapshot.columns, ('desk', 'currency'), snapshot.fx, snapshot.bonds
+        ):
             if position > 0:
-                writer.writerow([
+                yield [
                     key[0],
                     key[1],
                     position,
-                    f'{NV:.2f}',
-                ])
-        return destination
+                    NV,
+                ]
 
-    def _write_exclusion_data(self, destination, target_id: int):
-        """Helper to write exclusion data to file or stream. Then return the same object.
-        Data required for exclusions output are read from DB and not from state_data.
+    def _iter_exclusion_rows(self, snapshot: ReportSnapshot) -> Iterator[List]:
+        """Helper to get rows of exclusion data, header first.
+        Data required for exclusions output are read from DB and not from the snapshot,
+        streamed from a DB cursor as rows are taken.
         """
-        exclusions: List[EventExceptionLog] = (
-            EventExceptionLog.objects.filter(event_id__lte=target_id)
+        exclusions = (
+            EventExceptionLog.objects
+            .filter(event_id__lte=snapshot.event_id)
+            .values_list(
+                'event_id', 'desk_id', 'trader_id', 'book_id', 'buy_sell', 'quantity',
+                'bond_id', 'price', 'exclusion_type',
+            )
+            .iterator(chunk_size=self._CHUNK_SIZE)
         )
-        writer = csv.writer(destination)
-        writer.writerow([
+        yield [
             'EventID',
             'Desk',
             'Trader',
@@ -366,21 +511,22 @@ class ReportGenerator(metaclass=Singleton):
             'BondID',
             'Price',
             'ExclusionType',
-        ])
-        for exclusion in exclusions:
-            price = f'{exclusion.price:.2f}' if exclusion.price else ''
-            writer.writerow([
-                exclusion.event_id,
-                exclusion.desk.desk_id,
-                exclusion.trader.trader_id,
-                exclusion.book.book_id,
-                exclusion.buy_sell,
-                exclusion.quantity,
-                exclusion.bond.bond_id,
-                price,
-                exclusion.exclusion_type,
-            ])
-        return destination
+        ]
+        for (
+            event_id, desk_id, trader_id, book_id, buy_sell, quantity,
+            bond_id, price, exclusion_type,
+        ) in exclusions:
+            yield [
+                event_id,
+                desk_id,
+                trader_id,
+                book_id,
+                buy_sell,
+                quantity,
+                bond_id,
+                f'{price:.2f}' if price else '',
+                exclusion_type,
+            ]
 
     def generate_report(
         self, target_id: int, report_type: str, to_http_response=False
@@ -389,45 +535,122 @@ class ReportGenerator(metaclass=Singleton):
         @param to_http_response: return HttpResponse with csv data if True,
         otherwise write to file and return None.
         """
-        type_to_fn_mapping: Dict[str, Callable] = {
-            'cash_level_portfolio': self._write_cash_level_data,
-            'position_level_portfolio': self._write_position_level_data,
-            'bond_level_portfolio': self._write_bond_level_data,
-            'currency_level_portfolio': self._write_currency_level_data,
-            'exclusions': self._write_exclusion_data,
-        }
-        if report_type not in type_to_fn_mapping:
-            raise ValueError(f'Unknown report type: {report_type}')
-
-        # Ensure data is at the state of event `target_id`
-        self._move_to_target_state(target_id)
+        content = self._render_report(target_id, report_type)
 
         if to_http_response:
-            # Write to HttpResponse and return the response
+            # Return HttpResponse with the csv data
             csv_filename = f'{report_type}_{target_id}.csv'
-            response = HttpResponse(
+            return HttpResponse(
+                content,
                 content_type='text/csv',
                 headers={
                     'Content-Disposition': f'attachment; filename={csv_filename}'
                 },
             )
-            return type_to_fn_mapping[report_type](destination=response, target_id=target_id)
 
         # Else write to file and return None
+        self._write_file(target_id, report_type, content)
+        return None
+
+    def stream_report(
+        self, target_id: int, report_type: str, chunk_rows: int = CHUNK_ROWS
+    ) -> Iterator[bytes]:
+        """Generate report of `report_type` at event `target_id` as csv chunks of up to
+        `chunk_rows` rows, rendered as they are taken, so the whole report is never in memory.
+        The snapshot is taken before returning, so later events do not change the report.
+        Chunks of reports of `_DB_REPORT_TYPES` read DB, so they should be taken on the
+        thread that called this function.
+        """
+        if report_type not in self._REPORT_TYPES:
+            raise ValueError(f'Unknown report type: {report_type}')
+
+        content: Union[bytes, None] = self._cache.get((target_id, report_type))
+        if content is not None:
+            return iter((content,))
+
+        rows = self._iter_rows(self._get_snapshot(target_id), report_type)
+        return iter_csv_chunks(rows, chunk_rows)
+
+    def generate_streaming_response(
+        self, target_id: int, report_type: str, compress: bool = False
+    ) -> StreamingHttpResponse:
+        """Generate StreamingHttpResponse with csv data of `stream_report`.
+        @param compress: compress the csv data with gzip on the fly if True.
+        """
+        chunks = self.stream_report(target_id, report_type)
+        if compress:
+            chunks = gzip_chunks(chunks)
+        csv_filename = f'{report_type}_{target_id}.csv'
+        response = StreamingHttpResponse(
+            chunks,
+            content_type='text/csv',
+            headers={
+                'Content-Disposition': f'attachment; filename={csv_filename}'
+            },
+        )
+        if compress:
+            response['Content-Encoding'] = 'gzip'
+        patch_vary_headers(response, ('Accept-Encoding',))
+        return response
+
+    def _write_file(self, target_id: int, report_type: str, content: bytes) -> None:
+        """Helper function to write rendered report to `OUT_DIR/output_<target_id>/`."""
         filename = self.OUT_DIR / f'output_{target_id}' / f'{report_type}_{target_id}.csv'
         filename.parent.mkdir(exist_ok=True, parents=True)
-        with open(filename, 'w', encoding='UTF-8') as file:
-            type_to_fn_mapping[report_type](destination=file, target_id=target_id)
-        return None
+        with open(filename, 'wb') as file:
+            file.write(content)
 
     def output_reports(self, target_id: int):
-        """Output the 5 types of reports to files."""
-        report_types = [
-            'cash_level_portfolio',
-            'position_level_portfolio',
-            'bond_level_portfolio',
-            'currency_level_portfolio',
-            'exclusions',
+        """Output the 5 types of reports to files.
+        The snapshot at `target_id` is taken once, then reports that only need the snapshot
+        are rendered and written by the worker threads of `_executor`, while reports that
+        read DB are rendered on this thread, on its own DB connection.
+        """
+        is_committed = self._is_committed(target_id)
+        snapshot = self._get_snapshot(target_id)
+        self._wait_for(self._output_snapshot(target_id, snapshot, is_committed))
+
+    def export_reports(self, target_ids: Iterable[int]) -> List[int]:
+        """Output the 5 types of reports at each of `target_ids` to files, in one forward sweep.
+        IDs are sorted, so each ID is reached from the state at the previous ID by replaying
+        only the events in between, unless `_set_up` finds a nearer starting state.
+        Reports of each ID are written by `_executor` while events up to the next ID are
+        replayed, with at most one ID's reports pending.
+        @return: the sorted unique IDs whose reports were output.
+        """
+        target_ids = sorted(set(target_ids))
+        pending: List[Future] = []
+        for target_id in target_ids:
+            is_committed = self._is_committed(target_id)
+            snapshot = self._get_snapshot(target_id)
+            self._wait_for(pending)
+            pending = self._output_snapshot(target_id, snapshot, is_committed)
+        self._wait_for(pending)
+        return target_ids
+
+    def _output_snapshot(
+        self, target_id: int, snapshot: ReportSnapshot, is_committed: bool
+    ) -> List[Future]:
+        """Helper function to output the 5 types of reports from `snapshot` to files.
+        Reports of `_DB_REPORT_TYPES` are output before returning,
+        the others are submitted to `_executor`.
+        @return: futures of the submitted reports.
+        """
+        def output(report_type: str) -> None:
+            content = self._render_snapshot(snapshot, report_type, is_committed)
+            self._write_file(target_id, report_type, content)
+
+        futures = [
+            self._executor.submit(output, report_type)
+            for report_type in self._REPORT_TYPES
+            if report_type not in self._DB_REPORT_TYPES
         ]
-        for report_type in report_types:
-            self.generate_report(target_id, report_type, to_http_response=False)
+        for report_type in self._DB_REPORT_TYPES:
+            output(report_type)
+        return futures
+
+    @staticmethod
+    def _wait_for(futures: List[Future]) -> None:
+        """Helper function to wait for `futures`, raising the first error of them, if any."""
+        for future in futures:
+            future.result()
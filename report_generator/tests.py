@@ -1,3 +1,657 @@
-from django.test import TestCase
+import asyncio
+from decimal import Decimal
+import gzip
+import json
+from pathlib import Path
+import random
+import tempfile
+import threading
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import async_to_sync, sync_to_async
+
+from django.core.signals import request_finished, request_started
+from django.db import close_old_connections, connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from PortfolioTracker.asgi_handler import StreamingASGIHandler
+from api.models import StateCheckpoint
+from event_handler.event_handlers import EventHandler
+from event_handler.event_sequencer import EventSequencer
+from event_handler.portfolio_state import PortfolioState
+from report_generator.columnar import KEY_FIELDS, aggregate, to_columns
+from report_generator.live_responses import LiveResponses
+from report_generator.live_updates import LiveUpdates, Subscriber, stream_live_updates
+from report_generator.portfolio_generator import PortfolioGenerator
+from report_generator.report_cache import ReportCache, estimate_size
+from report_generator.report_generator import ReportGenerator
+from util import common_fns
+
+sample_events = [
+    {'EventID': 1, 'EventType': 'PriceEvent', 'BondID': 'B45193', 'MarketPrice': '1996.52'},
+    {'EventID': 2, 'EventType': 'FXEvent', 'ccy': 'AUZ', 'rate': '1.5'},
+    {
+        'EventID': 3, 'EventType': 'TradeEvent', 'Desk': 'NY', 'Trader': 'T2078717',
+        'Book': 'NY02', 'BuySell': 'buy', 'Quantity': '533', 'BondID': 'B45193',
+    },
+    {'EventID': 4, 'EventType': 'PriceEvent', 'BondID': 'B45193', 'MarketPrice': '2000'},
+    {'EventID': 5, 'EventType': 'FXEvent', 'ccy': 'AUZ', 'rate': '1.6'},
+    {'EventID': 6, 'EventType': 'PriceEvent', 'BondID': 'B44611', 'MarketPrice': '100.5'},
+    {
+        'EventID': 7, 'EventType': 'TradeEvent', 'Desk': 'NY', 'Trader': 'T2078717',
+        'Book': 'NY02', 'BuySell': 'sell', 'Quantity': '33', 'BondID': 'B45193',
+    },
+]
+
+class ReportGeneratorTestCase(TestCase):
+    """Uses initial data auto-populated from `data/`."""
+    def setUp(self) -> None:
+        EventSequencer().recover()
+        PortfolioState().load()
+        EventHandler._queue.clear()
+        EventHandler().handle_events(sample_events)
+        self.report_generator = ReportGenerator()
+        self.report_generator._reset_states()
+
+    def test_fx_and_prices_as_of_event(self):
+        report_generator = self.report_generator
+        report_generator._get_curr_bonds_fx_desk_records()
+
+        # Constant number of queries regardless of number of currencies and bonds
+        with self.assertNumQueries(4):
+            report_generator._move_fx_bonds_states(4)
+        self.assertEqual(report_generator._fx['AUZ'], Decimal('1.5'))
+        self.assertEqual(report_generator._fx['SGX'], Decimal('1.35'))
+        self.assertEqual(report_generator._bonds['B45193']['price'], Decimal('2000'))
+        # Bonds without price changes yet are at their initial price
+        self.assertEqual(report_generator._bonds['B44611']['price'], Decimal('100.5'))
+        self.assertIsNone(report_generator._bonds['B05609']['price'])
+
+        report_generator._move_fx_bonds_states(0)
+        self.assertEqual(report_generator._fx['AUZ'], Decimal('1.48'))
+        self.assertEqual(report_generator._bonds['B45193']['price'], Decimal('1996.52'))
+
+        report_generator._move_fx_bonds_states(7)
+        self.assertEqual(report_generator._fx['AUZ'], Decimal('1.6'))
+        self.assertEqual(report_generator._bonds['B44611']['price'], Decimal('100.5'))
+
+    def test_replay_streams_logs_with_one_query(self):
+        report_generator = self.report_generator
+        with CaptureQueriesContext(connection) as context:
+            report_generator._move_to_target_state(7)
+            report_generator._move_to_target_state(1)
+            report_generator._move_to_target_state(3)
+        # One query for bond records, and one per replay regardless of number of logs
+        self.assertEqual(
+            sum('"api_bondrecord"' in query['sql'] for query in context.captured_queries), 1
+        )
+        self.assertEqual(
+            sum('FROM "api_eventlog"' in query['sql'] for query in context.captured_queries), 2
+        )
+        self.assertEqual(
+            report_generator._state_data, {('NY', 'T2078717', 'NY02', 'B45193'): 533}
+        )
+
+    def test_reports_cached_for_applied_events(self):
+        report_generator = self.report_generator
+        content = report_generator.generate_report(
+            3, 'bond_level_portfolio', to_http_response=True
+        ).content
+        with self.assertNumQueries(0):
+            self.assertEqual(
+                report_generator.generate_report(
+                    3, 'bond_level_portfolio', to_http_response=True
+                ).content,
+                content,
+            )
+        # Other reports of the same event are written from the cached snapshot
+        report_generator._move_to_target_state(7)
+        with self.assertNumQueries(0):
+            report_generator.generate_report(3, 'cash_level_portfolio', to_http_response=True)
+        self.assertEqual(report_generator._state_id, 7)
+
+    def test_reports_not_cached_after_latest_event(self):
+        report_generator = self.report_generator
+        report_generator.generate_report(8, 'cash_level_portfolio', to_http_response=True)
+        self.assertIsNone(report_generator._cache.get(8))
+        self.assertIsNone(report_generator._cache.get((8, 'cash_level_portfolio')))
+
+        EventHandler().handle_event({
+            'EventID': 8, 'EventType': 'TradeEvent', 'Desk': 'NY', 'Trader': 'T2078717',
+            'Book': 'NY02', 'BuySell': 'sell', 'Quantity': '500', 'BondID': 'B45193',
+        })
+        report_generator.generate_report(8, 'cash_level_portfolio', to_http_response=True)
+        self.assertEqual(report_generator._cache.get(8).positions[
+            ('NY', 'T2078717', 'NY02', 'B45193')
+        ], 0)
+
+    def test_output_reports_from_one_snapshot(self):
+        report_generator = self.report_generator
+        with tempfile.TemporaryDirectory() as out_dir, mock.patch.object(
+            ReportGenerator, 'OUT_DIR', Path(out_dir)
+        ), mock.patch.object(
+            ReportGenerator, '_take_snapshot', autospec=True,
+            side_effect=ReportGenerator._take_snapshot,
+        ) as take_snapshot:
+            # Event 8 is not applied yet, so neither the snapshot nor reports are cached
+            report_generator.output_reports(8)
+            take_snapshot.assert_called_once()
+
+            files = sorted(Path(out_dir, 'output_8').iterdir())
+            self.assertEqual(len(files), 5)
+            for file in files:
+                report_type = file.name[:-len('_8.csv')]
+                self.assertEqual(
+                    file.read_bytes(),
+                    report_generator.generate_report(
+                        8, report_type, to_http_response=True
+                    ).content,
+                )
+
+
+    def test_export_reports_in_one_sweep(self):
+        report_generator = self.report_generator
+        with tempfile.TemporaryDirectory() as out_dir, mock.patch.object(
+            ReportGenerator, 'OUT_DIR', Path(out_dir)
+        ), mock.patch.object(
+            ReportGenerator, '_backtrack_events', autospec=True,
+            side_effect=ReportGenerator._backtrack_events,
+        ) as backtrack_events:
+            self.assertEqual(report_generator.export_reports([7, 3, 5, 3]), [3, 5, 7])
+            # Only the first ID may be reached backwards, from the live state
+            self.assertLessEqual(backtrack_events.call_count, 1)
+
+            self.assertEqual(
+                sorted(path.name for path in Path(out_dir).iterdir()),
+                ['output_3', 'output_5', 'output_7'],
+            )
+            for target_id in (3, 5, 7):
+                for report_type in ReportGenerator._REPORT_TYPES:
+                    self.assertEqual(
+                        Path(
+                            out_dir, f'output_{target_id}', f'{report_type}_{target_id}.csv'
+                        ).read_bytes(),
+                        report_generator.generate_report(
+                            target_id, report_type, to_http_response=True
+                        ).content,
+                    )
+
+    def test_parse_target_ids(self):
+        parse = common_fns.parse_target_ids
+        self.assertEqual(parse('5, 2-8:3,1-2', last_event_id=10, max_ids=10), [1, 2, 5, 8])
+        # Ranges end at the latest event, without building the whole range
+        self.assertEqual(parse('6-1000000000', last_event_id=8, max_ids=10), [6, 7, 8])
+        for spec, message in (
+            ('', 'Invalid'), ('a', 'Invalid'), ('0-3', 'positive'), ('5-3', 'Empty range'),
+            ('1-10:0', 'Empty range'), ('9-12', 'after the latest event'),
+            ('1-8,20', 'More than 8'),
+        ):
+            with self.assertRaisesMessage(ValueError, message):
+                parse(spec, last_event_id=8, max_ids=8)
+
+    @override_settings(EXPORT_MAX_TARGETS=2)
+    def test_export_reports_view_limits_ids(self):
+        with tempfile.TemporaryDirectory() as out_dir, mock.patch.object(
+            ReportGenerator, 'OUT_DIR', Path(out_dir)
+        ):
+            response = self.client.get(
+                reverse('api_export_reports'), {'target_ids': '1-1000000000'}
+            )
+            self.assertEqual(response.status_code, 400)
+            response = self.client.get(reverse('api_export_reports'), {'target_ids': '6-100'})
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(
+                sorted(path.name for path in Path(out_dir).iterdir()), ['output_6', 'output_7']
+            )
+
+    def test_streamed_reports_match(self):
+        report_generator = self.report_generator
+        for report_type in ReportGenerator._REPORT_TYPES:
+            # Event 8 is not applied yet, so reports are rendered from rows
+            chunks = list(report_generator.stream_report(8, report_type, chunk_rows=2))
+            self.assertTrue(all(chunk.count(b'\r\n') <= 2 for chunk in chunks))
+            self.assertEqual(
+                b''.join(chunks),
+                report_generator.generate_report(8, report_type, to_http_response=True).content,
+            )
+
+    def test_streamed_through_asgi_off_event_loop(self):
+        iter_rows = ReportGenerator._iter_rows
+        row_threads = set()
+
+        def record_thread(report_generator, snapshot, report_type):
+            for row in iter_rows(report_generator, snapshot, report_type):
+                row_threads.add(threading.get_ident())
+                yield row
+
+        async def get(path, query_string):
+            sent = []
+
+            async def receive():
+                return {'type': 'http.request', 'body': b'', 'more_body': False}
+
+            async def send(message):
+                sent.append(message)
+
+            scope = {
+                'type': 'http', 'method': 'GET', 'path': path,
+                'query_string': query_string,
+                'headers': [(b'host', b'testserver'), (b'accept-encoding', b'gzip')],
+            }
+            # Called without the thread sensitive context of `__call__`, so the request's thread
+            # is the test thread, and with its DB connection kept open as by the test client,
+            # so that it sees the data of the test transaction
+            request_started.disconnect(close_old_connections)
+            request_finished.disconnect(close_old_connections)
+            try:
+                await StreamingASGIHandler().handle(scope, receive, send)
+            finally:
+                request_started.connect(close_old_connections)
+                request_finished.connect(close_old_connections)
+            return sent
+
+        with mock.patch.object(
+            ReportGenerator, '_iter_rows', autospec=True, side_effect=record_thread
+        ):
+            for path, report_type in (
+                ('/api/get_bond_report', 'bond_level_portfolio'),
+                ('/api/get_exclusion_report', 'exclusions'),
+            ):
+                sent = async_to_sync(get)(path, b'target_id=7&stream=1')
+                self.assertEqual(sent[0]['status'], 200)
+                self.assertIn((b'Content-Encoding', b'gzip'), sent[0]['headers'])
+                self.assertFalse(sent[-1].get('more_body', False))
+                self.assertEqual(
+                    gzip.decompress(b''.join(message.get('body', b'') for message in sent[1:])),
+                    self.report_generator.generate_report(
+                        7, report_type, to_http_response=True
+                    ).content,
+                )
+        # Rows were taken on the request's thread, not in the event loop
+        self.assertEqual(row_threads, {threading.get_ident()})
+
+    def test_streamed_response_gzipped(self):
+        response = self.client.get(
+            reverse('get_bond_report'), {'target_id': 7, 'stream': 1},
+            HTTP_ACCEPT_ENCODING='gzip, deflate',
+        )
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertIn('Accept-Encoding', response['Vary'])
+        self.assertEqual(
+            gzip.decompress(b''.join(response.streaming_content)),
+            self.report_generator.generate_report(
+                7, 'bond_level_portfolio', to_http_response=True
+            ).content,
+        )
+
+        response = self.client.get(reverse('get_bond_report'), {'target_id': 7, 'stream': 1})
+        self.assertFalse(response.has_header('Content-Encoding'))
+
+
+class ReportCacheTestCase(TestCase):
+    def test_least_recently_used_evicted(self):
+        cache = ReportCache(max_bytes=3 * estimate_size(b'x' * 100))
+        for key in 'abc':
+            cache.put(key, b'x' * 100)
+        self.assertIsNotNone(cache.get('a'))
+        cache.put('d', b'x' * 100)
+
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual([key for key in 'acd' if cache.get(key)], ['a', 'c', 'd'])
+        self.assertLessEqual(cache.size, cache.max_bytes)
+
+    def test_value_larger_than_limit_not_cached(self):
+        cache = ReportCache(max_bytes=100)
+        cache.put('a', b'x' * 100)
+        self.assertIsNone(cache.get('a'))
+        self.assertEqual(len(cache), 0)
+
+
+class ColumnarAggregationTestCase(TestCase):
+    def _aggregate_with_decimal(self, positions, fx, bonds, get_key):
+        """Sum NV of each row with Decimal, as the report writers did before columns."""
+        sums = {}
+        for key, position in sorted(positions.items(), key=lambda item: get_key(item[0])):
+            bond = bonds[key[3]]
+            total = sums.setdefault(get_key(key), [0, 0])
+            total[0] += position
+            total[1] += Decimal(position) * bond['price'] / fx[bond['currency']]
+        return [(key, position, f'{nv:.2f}') for key, (position, nv) in sums.items()]
+
+    def test_matches_decimal_aggregation(self):
+        rng = random.Random(0)
+        fx = {'USX': Decimal('1'), 'AUZ': Decimal('1.48'), 'JPX': Decimal('136.14')}
+        bonds = {
+            f'B{i}': {
+                'currency': rng.choice(list(fx)),
+                'price': Decimal(rng.choice(['0.005', '0.015', f'{rng.uniform(1, 10000):.5f}'])),
+            }
+            for i in range(20)
+        }
+        positions = {
+            (desk, f'T{rng.randint(0, 5)}', f'{desk}0{rng.randint(0, 2)}', rng.choice(list(bonds))):
+                rng.choice([1, rng.randint(1, 100000)])
+            for desk in ('NY', 'LON', 'TOK') for _ in range(300)
+        }
+        columns = to_columns(positions, fx, bonds)
+        self.assertListEqual(
+            list(aggregate(columns, KEY_FIELDS[:3], fx, bonds, order_by=KEY_FIELDS)),
+            self._aggregate_with_decimal(positions, fx, bonds, lambda key: key[:3]),
+        )
+        self.assertListEqual(
+            list(aggregate(columns, ('desk', 'currency'), fx, bonds)),
+            self._aggregate_with_decimal(
+                positions, fx, bonds, lambda key: (key[0], bonds[key[3]]['currency'])
+            ),
+        )
+
+    def test_rounds_ties_like_decimal(self):
+        # 0.005 rounds half to even with Decimal, but up as float
+        fx = {'USX': Decimal('1')}
+        bonds = {'B1': {'currency': 'USX', 'price': Decimal('0.005')}}
+        columns = to_columns({('NY', 'T1', 'NY01', 'B1'): 1}, fx, bonds)
+        self.assertListEqual(
+            list(aggregate(columns, KEY_FIELDS, fx, bonds)),
+            [(('NY', 'T1', 'NY01', 'B1'), 1, '0.00')],
+        )
+
+class BondLevelDataTestCase(TestCase):
+    """Uses initial data auto-populated from `data/`."""
+    def setUp(self) -> None:
+        EventSequencer().recover()
+        PortfolioState().load()
+        EventHandler._queue.clear()
+        EventHandler().handle_events(sample_events + [
+            {'EventID': 8, 'EventType': 'PriceEvent', 'BondID': 'B05609', 'MarketPrice': '99'},
+            {
+                'EventID': 9, 'EventType': 'TradeEvent', 'Desk': 'NY', 'Trader': 'T2078717',
+                'Book': 'NY03', 'BuySell': 'buy', 'Quantity': '10', 'BondID': 'B05609',
+            },
+            {
+                'EventID': 10, 'EventType': 'TradeEvent', 'Desk': 'LON', 'Trader': 'T1000001',
+                'Book': 'LN01', 'BuySell': 'buy', 'Quantity': '20', 'BondID': 'B44611',
+            },
+        ])
+
+    def test_flat_records_with_one_query(self):
+        with self.assertNumQueries(1):
+            data = PortfolioGenerator().generate_bond_level_data()
+        self.assertEqual(data, [
+            {
+                'desk': 'LON', 'trader': 'T1000001', 'book': 'LN01', 'bond': 'B44611',
+                'currency': 'USX', 'position': 20, 'NV': Decimal(20) * Decimal('100.5'),
+            },
+            {
+                'desk': 'NY', 'trader': 'T2078717', 'book': 'NY02', 'bond': 'B45193',
+                'currency': 'AUZ', 'position': 500,
+                'NV': Decimal(500) * Decimal('2000') / Decimal('1.6'),
+            },
+            {
+                'desk': 'NY', 'trader': 'T2078717', 'book': 'NY03', 'bond': 'B05609',
+                'currency': 'JPX', 'position': 10,
+                'NV': Decimal(10) * Decimal('99') / Decimal('136.14'),
+            },
+        ])
+
+    def test_filter_and_paginate(self):
+        response = self.client.get('/api/get_bond_portfolio', {'desk': 'NY'})
+        self.assertEqual([record['book'] for record in response.json()], ['NY02', 'NY03'])
+        self.assertNotIn('X-Total-Count', response)
+
+        response = self.client.get('/api/get_bond_portfolio', {'book': 'LN01'})
+        self.assertEqual([record['book'] for record in response.json()], ['LN01'])
+
+        response = self.client.get('/api/get_bond_portfolio', {'offset': 1, 'limit': 1})
+        self.assertEqual([record['book'] for record in response.json()], ['NY02'])
+        self.assertEqual(response['X-Total-Count'], '3')
+
+        response = self.client.get('/api/get_bond_portfolio', {'limit': 'all'})
+        self.assertEqual(response.status_code, 400)
+
+
+@override_settings(CHECKPOINT_INTERVAL=2)
+class CheckpointTestCase(TestCase):
+    """Uses initial data auto-populated from `data/`."""
+    report_types = [
+        'cash_level_portfolio',
+        'position_level_portfolio',
+        'bond_level_portfolio',
+        'currency_level_portfolio',
+    ]
+
+    def setUp(self) -> None:
+        EventSequencer().recover()
+        PortfolioState().load()
+        EventHandler._queue.clear()
+        EventHandler().handle_events(sample_events)
+        self.report_generator = ReportGenerator()
+        self.report_generator._reset_states()
+
+    def _get_reports(self, target_id):
+        self.report_generator._reset_states()
+        return [
+            self.report_generator.generate_report(
+                target_id, report_type, to_http_response=True
+            ).content
+            for report_type in self.report_types
+        ]
+
+    def test_checkpoints_written_every_interval(self):
+        self.assertEqual(
+            list(StateCheckpoint.objects.values_list('event_id', flat=True).order_by('event_id')),
+            [2, 4, 6],
+        )
+        checkpoint = StateCheckpoint.objects.get(event_id=4)
+        self.assertEqual(checkpoint.positions, [['NY', 'T2078717', 'NY02', 'B45193', 533]])
+        self.assertEqual(Decimal(checkpoint.fx['AUZ']), Decimal('1.5'))
+        self.assertEqual(Decimal(checkpoint.prices['B45193']), Decimal('2000'))
+        self.assertIsNone(checkpoint.prices['B44611'])
+        self.assertEqual(
+            Decimal(checkpoint.cash['NY']),
+            common_fns.round_to_db_precision(
+                Decimal('100000000') - Decimal('533') * Decimal('1996.52') / Decimal('1.5')
+            ),
+        )
+
+    def test_starts_from_nearest_checkpoint(self):
+        report_generator = self.report_generator
+        report_generator._set_up(3)
+        self.assertEqual(report_generator._state_id, 2)
+
+        # Current state is nearer than any checkpoint
+        report_generator._move_to_target_state(3)
+        report_generator._set_up(1)
+        self.assertEqual(report_generator._state_id, 3)
+
+        # Live state is nearer than any checkpoint
+        report_generator._reset_states()
+        report_generator._set_up(7)
+        self.assertEqual(report_generator._state_id, 7)
+
+    def test_reports_match_without_checkpoints(self):
+        from_checkpoints = {target_id: self._get_reports(target_id) for target_id in range(8)}
+        StateCheckpoint.objects.all().delete()
+        for target_id in range(8):
+            self.assertEqual(self._get_reports(target_id), from_checkpoints[target_id])
+
+
+@mock.patch.object(LiveUpdates, 'start')
+class LiveUpdatesTestCase(TestCase):
+    """Uses initial data auto-populated from `data/`.
+    Changes are published in the test thread instead of the publisher thread.
+    """
+    def setUp(self) -> None:
+        EventSequencer().recover()
+        PortfolioState().load()
+        EventHandler._queue.clear()
+        EventHandler().handle_events(sample_events[:3])
+
+    def _parse(self, message: bytes):
+        lines = message.decode('UTF-8').strip().split('\n')
+        self.assertEqual(lines[0], f'id: {json.loads(lines[2][len("data: "):])["event_id"]}')
+        return lines[1][len('event: '):], json.loads(lines[2][len('data: '):])
+
+    def test_stream_sends_snapshot_then_diffs(self, start):
+        sent = []
+
+        async def stream():
+            disconnect = asyncio.Event()
+
+            async def receive():
+                await disconnect.wait()
+                return {'type': 'http.disconnect'}
+
+            async def send(message):
+                sent.append(message)
+
+            task = asyncio.ensure_future(stream_live_updates({'type': 'http'}, receive, send))
+            while len(sent) < 2:
+                await asyncio.sleep(0.01)
+            await sync_to_async(EventHandler().handle_events)(sample_events[3:])
+            await sync_to_async(LiveUpdates().publish_changes)()
+            while len(sent) < 3:
+                await asyncio.sleep(0.01)
+            disconnect.set()
+            await asyncio.wait_for(task, timeout=1)
+
+        async_to_sync(stream)()
+        self.assertEqual(sent[0]['status'], 200)
+        self.assertIn((b'content-type', b'text/event-stream'), sent[0]['headers'])
+
+        message_type, snapshot = self._parse(sent[1]['body'])
+        self.assertEqual(message_type, 'snapshot')
+        self.assertEqual(snapshot['event_id'], 3)
+        self.assertEqual(snapshot['views']['position'], [{
+            'desk': 'NY', 'trader': 'T2078717', 'book': 'NY02', 'position': 533,
+            'NV': str(Decimal(533) * Decimal('1996.52') / Decimal('1.5')),
+        }])
+        self.assertEqual(len(snapshot['views']['cash']), 6)
+
+        message_type, update = self._parse(sent[2]['body'])
+        self.assertEqual(message_type, 'update')
+        self.assertEqual(update['event_id'], 7)
+        self.assertEqual(
+            [row['position'] for row in update['views']['bond']['upsert']], [500]
+        )
+        self.assertEqual([row['desk'] for row in update['views']['cash']['upsert']], ['NY'])
+        self.assertNotIn('exclusions', update['views'])
+
+        # Views are dropped once there are no subscribers
+        self.assertIsNone(LiveUpdates()._views)
+        start.assert_called()
+
+    def test_commits_merged_outside_handler_lock(self, start):
+        async def stream():
+            subscriber = Subscriber()
+            await sync_to_async(LiveUpdates().subscribe)(subscriber)
+            LiveUpdates._changed.clear()
+            with mock.patch.object(
+                LiveUpdates, '_read_views', autospec=True, side_effect=LiveUpdates._read_views
+            ) as read_views:
+                for event in sample_events[3:5]:
+                    await sync_to_async(EventHandler().handle_event)(event)
+                # Commits only wake the publisher
+                read_views.assert_not_called()
+                self.assertTrue(LiveUpdates._changed.is_set())
+                await sync_to_async(LiveUpdates().publish_changes)()
+                read_views.assert_called_once()
+            await asyncio.sleep(0)
+            messages = []
+            while not subscriber.queue.empty():
+                messages.append(subscriber.queue.get_nowait())
+            await sync_to_async(LiveUpdates().unsubscribe)(subscriber)
+            return messages
+
+        messages = async_to_sync(stream)()
+        self.assertEqual(len(messages), 1)
+        message_type, update = self._parse(messages[0])
+        self.assertEqual(message_type, 'update')
+        self.assertEqual(update['event_id'], 5)
+
+    def test_subscribe_while_last_subscriber_leaves(self, start):
+        first, second = mock.Mock(), mock.Mock()
+        LiveUpdates().subscribe(first)
+        lock = LiveUpdates._lock
+        left = []
+
+        class LeaveOnFirstRelease:
+            """Lock on which the first subscriber leaves once the lock is first released."""
+            def __enter__(self):
+                lock.acquire()
+
+            def __exit__(self, *exc_info):
+                lock.release()
+                if not left:
+                    left.append(first)
+                    LiveUpdates().unsubscribe(first)
+
+        with mock.patch.object(LiveUpdates, '_lock', LeaveOnFirstRelease()):
+            message_type, snapshot = self._parse(LiveUpdates().subscribe(second))
+        self.assertEqual(left, [first])
+        self.assertEqual(message_type, 'snapshot')
+        self.assertEqual(snapshot['event_id'], 3)
+        self.assertEqual(LiveUpdates._subscribers, {second})
+        self.assertIsNotNone(LiveUpdates()._views)
+        LiveUpdates().unsubscribe(second)
+
+    def test_snapshot_sent_when_stream_falls_behind(self, start):
+        async def stream():
+            subscriber = Subscriber(max_messages=1)
+            await sync_to_async(LiveUpdates().subscribe)(subscriber)
+            for event in sample_events[3:5]:
+                await sync_to_async(EventHandler().handle_event)(event)
+                await sync_to_async(LiveUpdates().publish_changes)()
+            await asyncio.sleep(0)
+            message = subscriber.queue.get_nowait()
+            await sync_to_async(LiveUpdates().unsubscribe)(subscriber)
+            return message
+
+        message_type, snapshot = self._parse(async_to_sync(stream)())
+        self.assertEqual(message_type, 'snapshot')
+        self.assertEqual(snapshot['event_id'], 5)
+
+
+class LiveResponsesTestCase(TestCase):
+    """Uses initial data auto-populated from `data/`."""
+    def setUp(self) -> None:
+        EventSequencer().recover()
+        PortfolioState().load()
+        EventHandler._queue.clear()
+        LiveResponses().reset()
+        EventHandler().handle_events(sample_events[:3])
+
+    def test_not_modified_until_next_event(self):
+        response = self.client.get('/api/get_cash_portfolio')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['ETag'], '"3"')
+        self.assertIn('Last-Modified', response)
+        content = response.content
+
+        # Served from cache
+        with self.assertNumQueries(0):
+            response = self.client.get('/api/get_cash_portfolio')
+        self.assertEqual(response.content, content)
+        self.assertEqual(response['Content-Type'], 'application/json')
+
+        response = self.client.get('/api/get_cash_portfolio', HTTP_IF_NONE_MATCH='"3"')
+        self.assertEqual(response.status_code, 304)
+
+        EventHandler().handle_events(sample_events[3:])
+        response = self.client.get('/api/get_cash_portfolio', HTTP_IF_NONE_MATCH='"3"')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['ETag'], '"7"')
+        self.assertNotEqual(response.content, content)
+
+    def test_cached_by_query(self):
+        response = self.client.get('/api/get_bond_portfolio', {'offset': 0, 'limit': 1})
+        self.assertEqual(response['X-Total-Count'], '1')
+        with self.assertNumQueries(0):
+            cached = self.client.get('/api/get_bond_portfolio', {'offset': 0, 'limit': 1})
+        self.assertEqual(cached.content, response.content)
+        self.assertEqual(cached['X-Total-Count'], '1')
+
+        response = self.client.get('/api/get_bond_portfolio', {'desk': 'LON'})
+        self.assertEqual(response.json(), [])
@@ -1,13 +1,31 @@
 """Route handlers for the UI."""
 
 import csv
+import re
 
+from django.conf import settings
 from django.http import HttpRequest, HttpResponse, HttpResponseBadRequest, JsonResponse
 
-from util import common_fns
+from event_handler.event_handlers import EventHandler
+from util.common_fns import parse_target_ids
+from .live_responses import live_response
 from .portfolio_generator import PortfolioGenerator
 from .report_generator import ReportGenerator
 
+ACCEPTS_GZIP = re.compile(r'\bgzip\b')
+
+def _report_response(req: HttpRequest, target_id: int, report_type: str) -> HttpResponse:
+    """Helper function to generate response with report in csv.
+    Streamed in chunks if `stream` is set, compressed with gzip if the client accepts it.
+    """
+    if req.GET.get('stream') not in (None, '', '0'):
+        return ReportGenerator().generate_streaming_response(
+            target_id,
+            report_type,
+            compress=bool(ACCEPTS_GZIP.search(req.headers.get('Accept-Encoding', ''))),
+        )
+    return ReportGenerator().generate_report(target_id, report_type, to_http_response=True)
+
 def output_reports(req: HttpRequest) -> HttpResponse:
     """Generate reports for all users."""
     if req.GET:
@@ -19,6 +37,23 @@ def output_reports(req: HttpRequest) -> HttpResponse:
                 content_type='text/plain',
             )
 
+def export_reports(req: HttpRequest) -> HttpResponse:
+    """Generate reports at many events, e.g. `target_ids=5,100-1000:100`, in one sweep."""
+    try:
+        target_ids = parse_target_ids(
+            req.GET.get('target_ids', ''),
+            last_event_id=EventHandler().get_latest_event_id(),
+            max_ids=settings.EXPORT_MAX_TARGETS,
+        )
+    except ValueError as e:
+        return HttpResponseBadRequest(str(e))
+    ReportGenerator().export_reports(target_ids)
+    return HttpResponse(
+        f'Reports for {len(target_ids)} events from {target_ids[0]} to {target_ids[-1]} '
+        'are generated to output folder.',
+        content_type='text/plain',
+    )
+
 def get_dummy_report(req: HttpRequest) -> HttpResponse:
     """For testing purposes."""
     csv_filename = 'test.csv'
@@ -41,9 +76,7 @@ def get_cash_report(req: HttpRequest) -> HttpResponse:
     if req.GET:
         target_id = req.GET.get('target_id')
         if target_id:
-            return ReportGenerator().generate_report(
-                int(target_id), report_type='cash_level_portfolio', to_http_response=True
-            )
+            return _report_response(req, int(target_id), 'cash_level_portfolio')
     return HttpResponseBadRequest
 
 def get_position_report(req: HttpRequest) -> HttpResponse:
@@ -51,9 +84,7 @@ def get_position_report(req: HttpRequest) -> HttpResponse:
     if req.GET:
         target_id = req.GET.get('target_id')
         if target_id:
-            return ReportGenerator().generate_report(
-                int(target_id), report_type='position_level_portfolio', to_http_response=True
-            )
+            return _report_response(req, int(target_id), 'position_level_portfolio')
     return HttpResponseBadRequest
 
 def get_bond_report(req: HttpRequest) -> HttpResponse:
@@ -61,9 +92,7 @@ def get_bond_report(req: HttpRequest) -> HttpResponse:
     if req.GET:
         target_id = req.GET.get('target_id')
         if target_id:
-            return ReportGenerator().generate_report(
-                int(target_id), report_type='bond_level_portfolio', to_http_response=True
-            )
+            return _report_response(req, int(target_id), 'bond_level_portfolio')
     return HttpResponseBadRequest
 
 def get_currency_report(req: HttpRequest) -> HttpResponse:
@@ -71,9 +100,7 @@ def get_currency_report(req: HttpRequest) -> HttpResponse:
     if req.GET:
         target_id = req.GET.get('target_id')
         if target_id:
-            return ReportGenerator().generate_report(
-                int(target_id), report_type='currency_level_portfolio', to_http_response=True
-            )
+            return _report_response(req, int(target_id), 'currency_level_portfolio')
     return HttpResponseBadRequest
 
 def get_exclusion_report(req: HttpRequest) -> HttpResponse:
@@ -81,11 +108,10 @@ def get_exclusion_report(req: HttpRequest) -> HttpResponse:
     if req.GET:
         target_id = req.GET.get('target_id')
         if target_id:
-            return ReportGenerator().generate_report(
-                int(target_id), report_type='exclusions', to_http_response=True
-            )
+            return _report_response(req, int(target_id), 'exclusions')
     return HttpResponseBadRequest
 
+@live_response
 def get_cash_level_data(req: HttpRequest) -> HttpResponse:
     """Generate cash level data for live portfolio UI."""
     return HttpResponse(
@@ -93,18 +119,45 @@ def get_cash_level_data(req: HttpRequest) -> HttpResponse:
         content_type='application/json',
     )
 
+@live_response
 def get_position_level_data(req: HttpRequest) -> HttpResponse:
     """Generate position level data for live portfolio UI."""
     return JsonResponse(PortfolioGenerator().generate_position_level_data(), safe=False)
 
+@live_response
 def get_bond_level_data(req: HttpRequest) -> HttpResponse:
-    """Generate bond level data for live portfolio UI."""
-    return JsonResponse(PortfolioGenerator().generate_bond_level_data(), safe=False)
+    """Generate bond level data for live portfolio UI.
+    Optionally filtered by `desk`, `trader` and `book`, and paginated by `offset` and `limit`.
+    Total number of matching records is in header `X-Total-Count` if paginated.
+    """
+    filters = {
+        'desk_id': req.GET.get('desk'),
+        'trader_id': req.GET.get('trader'),
+        'book_id': req.GET.get('book'),
+    }
+    try:
+        offset = int(req.GET.get('offset', 0))
+        limit = int(req.GET['limit']) if 'limit' in req.GET else None
+    except ValueError:
+        return HttpResponseBadRequest('`offset` and `limit` must be integers')
+    if offset < 0 or (limit is not None and limit < 0):
+        return HttpResponseBadRequest('`offset` and `limit` must not be negative')
+
+    portfolio_generator = PortfolioGenerator()
+    response = JsonResponse(
+        portfolio_generator.generate_bond_level_data(**filters, offset=offset, limit=limit),
+        safe=False,
+    )
+    if offset or limit is not None:
+        response['X-Total-Count'] = portfolio_generator.get_bond_records(**filters).count()
+    return response
 
+@live_response
 def get_currency_level_data(req: HttpRequest) -> HttpResponse:
     """Generate currency level data for live portfolio UI."""
     return JsonResponse(PortfolioGenerator().generate_currency_level_data(), safe=False)
 
+@live_response
 def get_exclusion_data(req: HttpRequest) -> HttpResponse:
     """Generate exclusions data for live portfolio UI."""
     return HttpResponse(
@@ -112,6 +165,7 @@ def get_exclusion_data(req: HttpRequest) -> HttpResponse:
         content_type='application/json',
     )
 
+@live_response
 def get_latest_event_id(req: HttpRequest) -> HttpResponse:
     """Gets latest event id for live portfolio UI."""
-    return HttpResponse(common_fns.get_largest_event_id())
\ No newline at end of file
+    return HttpResponse(EventHandler().get_latest_event_id())
\ No newline at end of file
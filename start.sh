@@ -26,6 +26,6 @@ rm -f db.sqlite3
 echo "Applying database migrations..."
 python3 manage.py migrate
 
-# start django server
+# start django server with ASGI, which also streams live updates to the client UI
 echo "Starting django server..."
-python3 manage.py runserver
\ No newline at end of file
+uvicorn PortfolioTracker.asgi:application --port 8000
\ No newline at end of file
@@ -1,4 +1,8 @@
+from decimal import Decimal
+from typing import List
+
 from api.models import EventLog, EventExceptionLog, FxEventLog, PriceEventLog
+from util.common_types import EVENT_TYPES
 
 def get_largest_event_id():
     """Get largest event ID."""
@@ -24,4 +28,68 @@ def get_largest_event_id():
     
     return max(
         max_trade_event, max_exception_event, max_fx_event, max_price_event,
-    )
\ No newline at end of file
+    )
+
+# Decimal places of all DecimalFields in `api/models.py`
+DB_DECIMAL_PLACES = 5
+
+def round_to_db_precision(value: Decimal) -> Decimal:
+    """Round value the same way the DB does when a DecimalField is saved."""
+    return value.quantize(Decimal(1).scaleb(-DB_DECIMAL_PLACES))
+
+
+def validate_event(event: dict) -> None:
+    """Check that event has a known type and all fields of that type.
+    Raises ValueError otherwise.
+    """
+    if not isinstance(event, dict):
+        raise ValueError(f'Event is not an object: {event}')
+    if event.get('EventType') not in EVENT_TYPES:
+        raise ValueError(f'Unknown event: {event}')
+    missing = [
+        field for field in EVENT_TYPES[event['EventType']].__annotations__
+        if field not in event
+    ]
+    if missing:
+        raise ValueError(f'Event is missing fields {missing}: {event}')
+    try:
+        int(event['EventID'])
+    except (TypeError, ValueError) as e:
+        raise ValueError(f'Invalid EventID: {event["EventID"]}') from e
+
+
+def parse_target_ids(spec: str, last_event_id: int, max_ids: int) -> List[int]:
+    """Parse comma separated event IDs and inclusive ranges `start-end[:step]`,
+    e.g. `5,100-1000:100`, into sorted unique event IDs.
+    Ranges end at `last_event_id` at the latest, as reports after it are all the same.
+    Raises ValueError if the spec is invalid, or has more than `max_ids` IDs.
+    """
+    target_ids = set()
+    for part in spec.split(','):
+        part = part.strip()
+        try:
+            if '-' in part:
+                bounds, _, step = part.partition(':')
+                start, end = (int(bound) for bound in bounds.split('-'))
+                step = int(step) if step else 1
+            else:
+                start = end = int(part)
+                step = 1
+        except ValueError as e:
+            raise ValueError(f'Invalid event IDs: {part}') from e
+        if start < 1:
+            raise ValueError(f'Event IDs must be positive: {part}')
+        if start > end or step < 1:
+            raise ValueError(f'Empty range of event IDs: {part}')
+        if start != end:
+            if start > last_event_id:
+                raise ValueError(
+                    f'Range of event IDs {part} starts after the latest event {last_event_id}'
+                )
+            end = min(end, last_event_id)
+        ids = range(start, end + 1, step)
+        # Counted before the IDs are added, so a huge range is never built
+        if len(target_ids) + len(ids) > max_ids:
+            raise ValueError(f'More than {max_ids} event IDs: {spec}')
+        target_ids.update(ids)
+    return sorted(target_ids)
@@ -48,3 +48,22 @@ class FXEvent(_BaseEvent):
 
 Event = Union[PriceEvent, TradeEvent, FXEvent]
 MarketEvent = Union[PriceEvent, FXEvent]
+
+# Maps value of `EventType` to its type definition
+EVENT_TYPES = {
+    'PriceEvent': PriceEvent,
+    'TradeEvent': TradeEvent,
+    'FXEvent': FXEvent,
+}
+
+class EventOutcome(TypedDict, total=False):
+    """TypedDict definition for outcome of handling an event
+    event_id: int
+    status: str  # `applied`, `excluded`, `queued`, `duplicate`, `rejected` or `error`
+    exclusion_type: str  # Only if status is `excluded`
+    error: str  # Only if status is `error`
+    """
+    event_id: int
+    status: str
+    exclusion_type: str
+    error: str
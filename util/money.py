@@ -0,0 +1,143 @@
+"""Module with a fixed-point type for cash, prices and FX rates."""
+
+from decimal import Decimal, ROUND_CEILING, ROUND_FLOOR, ROUND_HALF_EVEN
+from typing import Union
+
+from util.common_fns import DB_DECIMAL_PLACES
+
+# Number of units in 1, e.g. 1.5 is 150000 units
+SCALE = 10 ** DB_DECIMAL_PLACES
+
+
+def _round(quotient: int, remainder: int, divisor: int, rounding: str) -> int:
+    """Helper function to round quotient + remainder / divisor to an integer by `rounding`,
+    where 0 <= remainder < divisor.
+    """
+    if not remainder:
+        return quotient
+    if rounding == ROUND_HALF_EVEN:
+        remainder += remainder
+        if remainder > divisor or (remainder == divisor and quotient & 1):
+            return quotient + 1
+        return quotient
+    if rounding == ROUND_CEILING:
+        return quotient + 1
+    if rounding == ROUND_FLOOR:
+        return quotient
+    raise ValueError(f'Unsupported rounding: {rounding}')
+
+
+class Money:
+    """Fixed-point amount with `DB_DECIMAL_PLACES` decimal places, stored as an integer
+    number of units, the same precision as the DecimalFields of `api/models.py`.
+
+    Addition and subtraction are exact. Conversions from Decimal and from `TradeValue`
+    round to a whole unit with an explicit rounding mode, half to even by default,
+    which is how the DB rounds a Decimal when it is saved.
+    """
+    __slots__ = ('units', '_decimal')
+
+    def __init__(self, units: int):
+        self.units = units
+        self._decimal: Union[Decimal, None] = None
+
+    @classmethod
+    def from_decimal(
+        cls, value: Union[Decimal, int, str], rounding: str = ROUND_HALF_EVEN
+    ) -> 'Money':
+        """Create from a Decimal, int or str, rounded to a whole unit by `rounding`."""
+        value = Decimal(value)
+        if not value.is_finite():
+            raise ValueError(f'Amount is not finite: {value}')
+        # Denominator is positive
+        numerator, denominator = value.as_integer_ratio()
+        quotient, remainder = divmod(numerator * SCALE, denominator)
+        return cls(_round(quotient, remainder, denominator, rounding))
+
+    def to_decimal(self) -> Decimal:
+        """Convert to a Decimal with exactly `DB_DECIMAL_PLACES` decimal places.
+        The result is cached, as amounts are immutable.
+        """
+        if self._decimal is None:
+            self._decimal = Decimal(self.units).scaleb(-DB_DECIMAL_PLACES)
+        return self._decimal
+
+    def __add__(self, other: 'Money') -> 'Money':
+        return Money(self.units + other.units)
+
+    def __sub__(self, other: 'Money') -> 'Money':
+        return Money(self.units - other.units)
+
+    def __neg__(self) -> 'Money':
+        return Money(-self.units)
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, Money):
+            return NotImplemented
+        return self.units == other.units
+
+    def __lt__(self, other: 'Money') -> bool:
+        return self.units < other.units
+
+    def __le__(self, other: 'Money') -> bool:
+        return self.units <= other.units
+
+    def __gt__(self, other: 'Money') -> bool:
+        return self.units > other.units
+
+    def __ge__(self, other: 'Money') -> bool:
+        return self.units >= other.units
+
+    def __hash__(self) -> int:
+        return hash(self.units)
+
+    def __bool__(self) -> bool:
+        return self.units != 0
+
+    def __format__(self, format_spec: str) -> str:
+        # Formatted as the Decimal, e.g. `f'{cash:.2f}'` rounds half to even
+        return format(self.to_decimal(), format_spec)
+
+    def __str__(self) -> str:
+        return str(self.to_decimal())
+
+    def __repr__(self) -> str:
+        return f"Money('{self.to_decimal()}')"
+
+
+class TradeValue:
+    """Exact value in USX of `quantity` of a bond at `price` in a currency at `rate`,
+    i.e. quantity * price / rate, held as `units` + `remainder` / `divisor` units.
+    It is only rounded when converted to `Money`, and cash is adjusted by the exact value,
+    so that cash is rounded once per trade as when it was a Decimal saved to DB.
+    """
+    __slots__ = ('units', 'remainder', 'divisor')
+
+    def __init__(self, quantity: int, price: Money, rate: Money):
+        if rate.units <= 0:
+            raise ValueError(f'FX rate is not positive: {rate}')
+        self.divisor: int = rate.units
+        self.units, self.remainder = divmod(int(quantity) * price.units * SCALE, rate.units)
+
+    def rounded(self, rounding: str = ROUND_HALF_EVEN) -> Money:
+        """Round to `Money` by `rounding`."""
+        return Money(_round(self.units, self.remainder, self.divisor, rounding))
+
+    def exceeds(self, cash: Money) -> bool:
+        """Check if the exact value is more than `cash`."""
+        return self.units > cash.units or (self.units == cash.units and self.remainder != 0)
+
+    def add_to(self, cash: Money) -> Money:
+        """Get `cash` plus the exact value, rounded half to even."""
+        return Money(_round(
+            cash.units + self.units, self.remainder, self.divisor, ROUND_HALF_EVEN
+        ))
+
+    def subtract_from(self, cash: Money) -> Money:
+        """Get `cash` minus the exact value, rounded half to even."""
+        if not self.remainder:
+            return Money(cash.units - self.units)
+        return Money(_round(
+            cash.units - self.units - 1, self.divisor - self.remainder, self.divisor,
+            ROUND_HALF_EVEN,
+        ))